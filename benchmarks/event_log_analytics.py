@@ -0,0 +1,82 @@
+"""Measure /analytics query time over a large synthetic event log.
+
+Synthetic events spread over the last week are written straight into column
+segments, then the same aggregation /analytics runs is timed over the last
+24 hours and the whole week.
+
+Usage:
+    python -m benchmarks.event_log_analytics --events 2000000
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+from array import array
+
+from services.event_log import (
+    COLUMNS,
+    FUNNEL_STEPS,
+    KIND_COMMAND,
+    KIND_FUNNEL,
+    KIND_SCAN,
+    RISKS,
+    TIERS,
+    EventLog,
+)
+
+COMMANDS = ("start", "scan", "history", "dashboard", "balance", "help")
+
+
+def synthetic_columns(events: int, now: int, rng: random.Random, codes):
+    kinds = rng.choices((KIND_SCAN, KIND_COMMAND, KIND_FUNNEL), weights=(5, 4, 1), k=events)
+    start = now - 7 * 86400
+    step = 7 * 86400 / events
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    columns["ts"] = array("I", (int(start + i * step) for i in range(events)))
+    columns["kind"] = array("B", kinds)
+    columns["name"] = array("H", (
+        codes[rng.choice(COMMANDS)] if kind == KIND_COMMAND
+        else codes[rng.choice(FUNNEL_STEPS)] if kind == KIND_FUNNEL
+        else 0
+        for kind in kinds
+    ))
+    columns["tier"] = array("B", (rng.randrange(1, len(TIERS)) for _ in range(events)))
+    columns["risk"] = array("B", (rng.randrange(1, len(RISKS)) for _ in range(events)))
+    columns["user"] = array("I", (rng.randrange(50_000) for _ in range(events)))
+    columns["latency_ms"] = array("I", (rng.randrange(20, 900) for _ in range(events)))
+    return columns
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="event-log-bench-")
+    try:
+        log = EventLog(root)
+        codes = {name: log._intern(name) for name in (*COMMANDS, *FUNNEL_STEPS)}
+        await log.flush()
+        started = time.perf_counter()
+        columns = synthetic_columns(args.events, int(time.time()), random.Random(args.seed), codes)
+        log._write(columns, None)
+        print(f"wrote {args.events} events in {time.perf_counter() - started:.1f}s")
+
+        for hours in (24, 7 * 24):
+            result = await log.aggregate(hours)
+            print(
+                f"last {hours:>3}h: {result['events']:>9} events scanned "
+                f"in {result['query_ms']:7.1f} ms "
+                f"({result['events'] / max(result['query_ms'], 1e-3) / 1000:.1f} M events/s)"
+            )
+        print("funnel:", result["funnel"])
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
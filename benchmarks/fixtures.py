@@ -0,0 +1,110 @@
+"""Realistic backend payloads for the micro-benchmarks.
+
+Shapes follow the backend responses handled in ``services/api_service.py``:
+scan envelopes from ``POST /api/scan`` (small free-tier results up to very
+large MVP results with holder breakdowns), account overviews, scan history and
+admin user pages. Everything is generated from a fixed seed, so runs compare
+like with like.
+"""
+
+import json
+import random
+
+ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# name -> (risk factors, strengths, holders, ai summary paragraphs)
+SCAN_SIZES = {
+    "small": (3, 3, 0, 1),
+    "medium": (15, 10, 20, 3),
+    "large": (60, 40, 200, 8),
+    "mvp_xl": (250, 120, 2000, 25),
+}
+
+
+def address(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(44))
+
+
+def scan_envelope(size: str, seed: int = 7) -> dict:
+    factors, strengths, holders, paragraphs = SCAN_SIZES[size]
+    rng = random.Random(seed)
+    token = {
+        "address": address(rng),
+        "scan_type": "token",
+        "risk_score": 0.63,
+        "ai_summary": " ".join(
+            "Liquidity is concentrated in two pools and the mint authority was renounced recently."
+            for _ in range(paragraphs)
+        ),
+        "analysis": {
+            "risk_score": 0.63,
+            "risk_level": "high",
+            "risk_factors": [
+                {
+                    "name": f"factor_{i}",
+                    "severity": rng.choice(("low", "medium", "high")),
+                    "description": f"Top {i + 3} holders control {rng.randint(10, 90)}% of supply",
+                }
+                for i in range(factors)
+            ],
+            "strengths": [f"Verified metadata source #{i}" for i in range(strengths)],
+            "recommendations": ["Limit position size.", "Re-scan after the next liquidity event."],
+        },
+        "holders": [
+            {"owner": address(rng), "amount": rng.randint(1, 10**9), "share": rng.random()}
+            for _ in range(holders)
+        ],
+    }
+    return {
+        "success": True,
+        "scan_id": f"scan_{seed}",
+        "tier": "mvp" if size == "mvp_xl" else "premium",
+        "message": "Analysis complete.",
+        "data": {"token": token, "wallet": None},
+    }
+
+
+def scan_body(size: str) -> str:
+    return json.dumps(scan_envelope(size))
+
+
+def account_overview() -> dict:
+    return {
+        "profile": {
+            "email": "trader@example.com",
+            "username": "trader",
+            "subscription_tier": None,
+            "created_at": "2025-01-04T10:00:00Z",
+            "last_login": "2025-06-01T08:30:00Z",
+            "tdl_balance": 120.5,
+        },
+        "credits": {"free_credits": 2, "premium_credits": 5, "mvp_credits": 0},
+    }
+
+
+def scan_history(count: int = 10, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "address": address(rng),
+            "tier": rng.choice(("free", "premium", "mvp")),
+            "risk_score": round(rng.random(), 3),
+            "risk_level": rng.choice(("LOW", "MEDIUM", "HIGH")),
+            "created_at": f"2025-06-{1 + i % 28:02d}T12:00:00Z",
+        }
+        for i in range(count)
+    ]
+
+
+def users_page(count: int = 20, seed: int = 5) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            "username": f"user{i}",
+            "email": f"user{i}@example.com",
+            "tier": rng.choice(("free", "premium", "mvp")),
+            "total_spent_tdl": rng.randint(0, 500),
+            "credits": {"free": rng.randint(0, 3), "premium": rng.randint(0, 20), "mvp": rng.randint(0, 5)},
+        }
+        for i in range(count)
+    ]
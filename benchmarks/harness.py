@@ -0,0 +1,259 @@
+"""Shared pieces for end-to-end load runs: a fake backend, a stub Telegram
+session and helpers to run the real bot (``main.build_bot``) in-process.
+
+The fake backend serves every endpoint ``APIService`` calls, with log-normal
+latency (``median_ms`` and a p99/median ``tail`` ratio) and a per-endpoint
+error rate. The stub session answers every Bot API call locally, without a
+network round-trip, and still runs the session middlewares (outbound limiter,
+tracing). Updates are fed straight into ``Dispatcher.feed_update``, so a run
+measures the bot and its middlewares rather than Telegram.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Update
+
+from benchmarks.fixtures import account_overview, scan_body, scan_history
+from services.metrics import endpoint_label
+
+BOT_ID = 42
+TOKEN = f"{BOT_ID}:LOADTEST"
+
+# Scan payload size returned per requested tier
+TIER_PAYLOADS = {"free": "small", "premium": "medium", "mvp": "large"}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+# ----------------------------------------------------------------------
+# Fake SPL Shield API
+# ----------------------------------------------------------------------
+@dataclass
+class EndpointProfile:
+    median_ms: float = 30.0
+    tail: float = 4.0  # p99 / median
+    error_rate: float = 0.0
+    samples_ms: Optional[List[float]] = None  # observed latencies, drawn from instead when set
+
+    def delay(self, rng: random.Random) -> float:
+        if self.samples_ms:
+            return rng.choice(self.samples_ms) / 1000
+        sigma = math.log(max(self.tail, 1.0)) / 2.326
+        return self.median_ms * math.exp(rng.gauss(0, sigma)) / 1000
+
+
+class FakeBackend:
+    """aiohttp stand-in for the SPL Shield API."""
+
+    def __init__(self, profiles: Optional[Dict[str, EndpointProfile]] = None, seed: int = 1):
+        self.profiles = profiles or {}
+        self.default = self.profiles.get("default", EndpointProfile())
+        self.rng = random.Random(seed)
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._scan_bodies = {tier: scan_body(size) for tier, size in TIER_PAYLOADS.items()}
+        self._overview = account_overview()
+        self._history = json.dumps({"results": scan_history()})
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        return app
+
+    async def start(self) -> str:
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # noqa: SLF001
+        self.url = f"http://127.0.0.1:{port}"
+        return self.url
+
+    async def close(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    def _profile(self, route: str) -> EndpointProfile:
+        return self.profiles.get(route) or self.profiles.get(endpoint_label(route), self.default)
+
+    async def _respond(self, request: web.Request, route: str) -> Tuple[int, str]:
+        if route == "/api/auth/login":
+            form = await request.post()
+            email = form.get("email", "user@example.com")
+            return 200, json.dumps({"access_token": f"token-{email}", "user": {"username": email.split("@")[0]}})
+        if route == "/api/auth/register":
+            return 201, json.dumps({"message": "Registered"})
+        if route == "/api/users/me":
+            return 200, json.dumps(self._overview["profile"])
+        if route == "/api/payment/credits":
+            return 200, json.dumps({"credits": self._overview["credits"], "transactions": []})
+        if route == "/api/scan":
+            tier = (await request.json()).get("tier", "free")
+            return 200, self._scan_bodies.get(tier, self._scan_bodies["free"])
+        if route == "/api/scan/history":
+            return 200, self._history
+        if route == "/api/payment/purchase":
+            return 200, json.dumps({"message": "Payment processed"})
+        if route.startswith("/api/admin/"):
+            return 200, json.dumps({"data": [], "has_more": False})
+        return 404, json.dumps({"detail": "Not Found"})
+
+    async def handle(self, request: web.Request) -> web.Response:
+        route = request.path
+        self.calls[route] = self.calls.get(route, 0) + 1
+        profile = self._profile(route)
+        await asyncio.sleep(profile.delay(self.rng))
+        if profile.error_rate and self.rng.random() < profile.error_rate:
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return web.json_response({"detail": "Injected failure"}, status=500)
+        status, body = await self._respond(request, route)
+        return web.Response(status=status, text=body, content_type="application/json")
+
+
+# ----------------------------------------------------------------------
+# Telegram side
+# ----------------------------------------------------------------------
+class StubSession(BaseSession):
+    """Answers Bot API calls locally; session middlewares still run."""
+
+    def __init__(self, middleware=None):
+        super().__init__()
+        if middleware is not None:
+            self.middleware = middleware
+        self.requests = 0
+        self._message_id = 0
+
+    async def make_request(self, bot: Bot, method, timeout: Optional[int] = None):
+        self.requests += 1
+        returning = str(method.__returning__)
+        result: Any = True
+        if returning.startswith(("typing.List", "list")):
+            result = []
+        elif returning.endswith(".User'>"):
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "Bot", "username": "loadtest_bot"}
+        elif "Message" in returning:
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", None) or 0
+            result = {
+                "message_id": getattr(method, "message_id", None) or self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot"},
+                "text": getattr(method, "text", None) or "",
+            }
+        response = self.check_response(bot, method, 200, json.dumps({"ok": True, "result": result}))
+        return response.result
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class UpdateFactory:
+    """Builds private-chat message and callback updates."""
+
+    def __init__(self):
+        self.update_id = 0
+        self.message_id = 0
+
+    def _user(self, user_id: int) -> Dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Dict[str, Any]:
+        self.update_id += 1
+        self.message_id += 1
+        entities = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}] if text.startswith("/") else None
+        message = {
+            "message_id": self.message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if entities:
+            message["entities"] = entities
+        return {"update_id": self.update_id, "message": message}
+
+    def callback(self, user_id: int, data: str) -> Dict[str, Any]:
+        self.update_id += 1
+        self.message_id += 1
+        return {
+            "update_id": self.update_id,
+            "callback_query": {
+                "id": str(self.update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": self.message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": BOT_ID, "is_bot": True, "first_name": "Bot"},
+                    "text": "menu",
+                },
+            },
+        }
+
+
+class BotUnderTest:
+    """The production dispatcher wired to a backend URL, with a stub Telegram session."""
+
+    def __init__(self, backend_url: str, *, env: Optional[Dict[str, str]] = None):
+        self.workdir = tempfile.mkdtemp(prefix="splshield-load-")
+        os.environ.update({
+            "BOT_TOKEN": TOKEN,
+            "API_BASE_URL": backend_url,
+            "ADMIN_USER_IDS": "",
+            "FSM_STORAGE": "memory",
+            "EVENT_LOG_DIR": os.path.join(self.workdir, "events"),
+            "LEDGER_PATH": os.path.join(self.workdir, "ledger.jsonl"),
+            "TRACE_PATH": os.path.join(self.workdir, "traces.jsonl"),
+            "BROADCAST_CHECKPOINT_PATH": os.path.join(self.workdir, "broadcast.json"),
+            **(env or {}),
+        })
+        # Imported late so the settings above are in place
+        from config import get_settings
+        from main import build_bot
+
+        self.bot, self.dp, self.api_service = build_bot(get_settings())
+        self.session = StubSession(self.bot.session.middleware)
+        self.bot.session = self.session
+
+    async def start(self) -> None:
+        await self.dp.emit_startup(bot=self.bot)
+
+    async def log_in(self, user_ids: Iterable[int]) -> None:
+        """Give users a backend session without replaying a login."""
+        for user_id in user_ids:
+            await self.api_service.state.save_session(user_id, f"token-{user_id}")
+
+    async def feed(self, update: Dict[str, Any]) -> float:
+        """Handle one update to completion; returns its latency in seconds."""
+        started = time.perf_counter()
+        await self.dp.feed_update(self.bot, Update.model_validate(update, context={"bot": self.bot}))
+        return time.perf_counter() - started
+
+    async def close(self) -> None:
+        await self.dp.emit_shutdown(bot=self.bot)
+        await self.api_service.close()
+        await self.api_service.state.close()
@@ -0,0 +1,206 @@
+"""Micro-benchmarks for the bot's per-update hot functions, with baselines.
+
+Each case runs enough iterations to take ``--min-time`` seconds, repeated
+``--repeat`` times with the garbage collector off, and the best ns/op is
+compared with the stored baseline. A case over ``--tolerance`` (default 25%)
+is measured again to rule out noise. If it is still slow, the run exits with
+status 1. Baselines are only comparable on the
+machine that produced them: record them with ``--save`` on the CI runner and
+commit the JSON.
+
+Usage:
+    python -m benchmarks.hot_paths                 # compare with the baseline
+    python -m benchmarks.hot_paths --save          # record a new baseline
+    python -m benchmarks.hot_paths -k scan --tolerance 0.1
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.fixtures import SCAN_SIZES, account_overview, scan_body, scan_envelope, scan_history, users_page
+from handlers.admin import format_users_page
+from handlers.scanning import format_history, format_scan_result, is_valid_address
+from keyboards.admin_kb import get_users_page_keyboard
+from keyboards.user_kb import get_main_menu, get_payment_keyboard, get_scan_tier_keyboard
+from services.api_service import APIService
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "hot_paths.json")
+
+
+class _FakeResponse:
+    def __init__(self, status: int, body: str):
+        self.status = status
+        self._body = body
+
+    async def text(self) -> str:
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _FakeSession:
+    """Stands in for aiohttp.ClientSession so ``_request`` runs without a network."""
+
+    closed = False
+
+    def __init__(self, status: int, body: str):
+        self.response = _FakeResponse(status, body)
+
+    def request(self, method, url, **kwargs):
+        return self.response
+
+
+def _request_case(loop, status: int, body: str, batch: int = 100) -> Tuple[Callable[[], None], int]:
+    api = APIService("http://backend.local")
+    api.session = _FakeSession(status, body)
+
+    async def run():
+        for _ in range(batch):
+            await api._request("POST", "/api/scan", json={}, token="token")
+
+    return lambda: loop.run_until_complete(run()), batch
+
+
+def build_cases(loop) -> List[Tuple[str, Callable[[], None], int]]:
+    """``(name, fn, ops per call)`` for every benchmark case."""
+    api = APIService("http://backend.local")
+    cases = []
+    for size in SCAN_SIZES:
+        envelope = scan_envelope(size)
+        primary = api._select_primary_payload(envelope["data"])
+        normalised = api._normalise_analysis(primary)
+        body = scan_body(size)
+        cases += [
+            (f"select_primary_payload[{size}]", lambda d=envelope["data"]: api._select_primary_payload(d), 1),
+            (f"normalise_analysis[{size}]", lambda p=primary: api._normalise_analysis(p), 1),
+            (f"format_scan_result[{size}]", lambda n=normalised, a=primary["address"]: format_scan_result(n, a, "MVP"), 1),
+            (f"request_decode_ok[{size}]", *_request_case(loop, 200, body)),
+        ]
+    cases += [
+        ("request_decode_error", *_request_case(loop, 402, json.dumps({"detail": "Insufficient credits"}))),
+        ("request_decode_non_json", *_request_case(loop, 502, "<html>Bad Gateway</html>")),
+    ]
+    overview = account_overview()
+    history = scan_history()
+    users = users_page()
+    addresses = [entry["address"] for entry in scan_history(100)] + ["short", "x" * 60]
+    cases += [
+        ("compose_profile", lambda: api._compose_profile(overview), 1),
+        ("format_history[10]", lambda: format_history(history), 1),
+        ("format_users_page[20]", lambda: format_users_page(users, 3), 1),
+        ("is_valid_address[x102]", lambda: [is_valid_address(a) for a in addresses], len(addresses)),
+        ("keyboard_main_menu", get_main_menu, 1),
+        ("keyboard_scan_tier", get_scan_tier_keyboard, 1),
+        ("keyboard_payment", get_payment_keyboard, 1),
+        ("keyboard_users_page", lambda: get_users_page_keyboard(3, True), 1),
+    ]
+    return cases
+
+
+def measure(fn: Callable[[], None], ops: int, min_time: float, repeat: int) -> float:
+    """Best nanoseconds per operation over ``repeat`` timed runs."""
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(fn, ops, min_time, repeat)
+    finally:
+        gc.enable()
+
+
+def _measure(fn: Callable[[], None], ops: int, min_time: float, repeat: int) -> float:
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / (number * ops) * 1e9
+
+
+def _load_baseline(path: str) -> Dict[str, float]:
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh).get("results", {})
+    except FileNotFoundError:
+        return {}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", "--filter", default="", help="Only run cases whose name contains this")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    # Error paths log every call; measure the code, not the log handler
+    logging.disable(logging.CRITICAL)
+    loop = asyncio.new_event_loop()
+    baseline = _load_baseline(args.baseline)
+    results: Dict[str, float] = {}
+    regressions = []
+    try:
+        for name, fn, ops in build_cases(loop):
+            if args.filter not in name:
+                continue
+            ns = measure(fn, ops, args.min_time, args.repeat)
+            base = baseline.get(name)
+            if base and ns / base - 1 > args.tolerance and not args.save:
+                ns = min(ns, measure(fn, ops, args.min_time, args.repeat * 2))
+            results[name] = ns
+            change = ""
+            if base:
+                ratio = ns / base - 1
+                change = f"{ratio:+7.1%}"
+                if ratio > args.tolerance:
+                    regressions.append(name)
+                    change += "  REGRESSION"
+            print(f"{name:<36} {ns:>12,.0f} ns/op  {change}")
+    finally:
+        loop.close()
+
+    if args.save:
+        merged = {**baseline, **results}
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "results": {name: round(ns, 1) for name, ns in sorted(merged.items())},
+            }, fh, indent=2)
+            fh.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
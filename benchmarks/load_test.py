@@ -0,0 +1,225 @@
+"""End-to-end load test: the real dispatcher against a fake backend.
+
+Starts :class:`~benchmarks.harness.FakeBackend` on a local port, builds the
+bot with ``main.build_bot`` (memory FSM storage, all state files in a temp
+directory) and swaps in a stub Telegram session. Then, for each ``--users``
+level, that many virtual users run at once. Each one logs in and then loops
+for ``--duration`` seconds over a weighted mix of actions (scan, dashboard,
+history, balance) with exponential think time between them. Every step is an
+``Update`` fed to ``Dispatcher.feed_update`` and awaited to completion.
+
+Reported per level: updates/s and actions/s, update and per-action latency
+percentiles, backend errors injected, Telegram calls made, and process RSS and
+Python heap blocks after the level. The levels share one process, so memory
+columns show how state grows as more users have sessions.
+
+Replies go through the production outbound limiter, so by default throughput
+is capped by Telegram's flood limits (``TELEGRAM_GLOBAL_RATE``, one message per
+second per chat) just as in production. ``--unthrottled`` lifts them to measure
+the bot's own capacity.
+
+``feed_update`` runs handlers inline, so the per-chat executor's queueing is not
+part of the numbers. Virtual users send one update at a time, so ordering is
+preserved anyway.
+
+Usage:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --users 10 100 500 --duration 30 --unthrottled
+    python -m benchmarks.load_test --mix scan=1 --scan-mix free=0.5,mvp=0.5
+    python -m benchmarks.load_test --backend /api/scan=800:6:0.05 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from benchmarks.fixtures import address
+from benchmarks.harness import BotUnderTest, EndpointProfile, FakeBackend, UpdateFactory, percentile
+from services.memprof import read_rss
+
+# Backend latency when not overridden: median ms, p99/median, error rate
+DEFAULT_BACKEND = {
+    "default": EndpointProfile(30, 4),
+    "/api/auth/login": EndpointProfile(120, 3),
+    "/api/scan": EndpointProfile(400, 5, 0.01),
+}
+USER_ID_BASE = 1_000_000
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """``"scan=0.5,dashboard=0.5"`` -> ``{"scan": 0.5, "dashboard": 0.5}``"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = item.partition("=")
+        weights[name.strip()] = float(value or 1)
+    return weights
+
+
+def parse_backend(specs: List[str]) -> Dict[str, EndpointProfile]:
+    """``["/api/scan=800:6:0.05"]`` -> profiles merged over the defaults."""
+    profiles = dict(DEFAULT_BACKEND)
+    for spec in specs:
+        route, _, values = spec.partition("=")
+        parts = [float(part) for part in values.split(":")]
+        profiles[route] = EndpointProfile(*parts)
+    return profiles
+
+
+class VirtualUser:
+    def __init__(self, user_id: int, harness: BotUnderTest, factory: UpdateFactory, stats: "LevelStats", rng: random.Random):
+        self.user_id = user_id
+        self.harness = harness
+        self.factory = factory
+        self.stats = stats
+        self.rng = rng
+
+    async def _message(self, text: str) -> None:
+        await self._feed(self.factory.message(self.user_id, text))
+
+    async def _callback(self, data: str) -> None:
+        await self._feed(self.factory.callback(self.user_id, data))
+
+    async def _feed(self, update) -> None:
+        try:
+            self.stats.updates.append(await self.harness.feed(update))
+        except Exception:  # noqa: BLE001
+            self.stats.failed += 1
+
+    async def action(self, name: str, tiers: Dict[str, float]) -> None:
+        started = time.perf_counter()
+        if name == "login":
+            await self._message("/start")
+            await self._message("/login")
+            await self._message(f"user{self.user_id}@example.com")
+            await self._message("correct-horse-battery")
+        elif name == "scan":
+            tier = self.rng.choices(list(tiers), weights=list(tiers.values()))[0]
+            await self._message("/scan")
+            await self._message(address(self.rng))
+            await self._callback(f"scan_tier:{tier}")
+            name = f"scan:{tier}"
+        else:
+            await self._message(f"/{name}")
+        self.stats.actions[name].append(time.perf_counter() - started)
+
+    async def run(self, deadline: float, mix: Dict[str, float], tiers: Dict[str, float], think: float) -> None:
+        await asyncio.sleep(self.rng.uniform(0, think))  # stagger arrivals
+        await self.action("login", tiers)
+        names, weights = list(mix), list(mix.values())
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(1 / think) if think > 0 else 0)
+            await self.action(self.rng.choices(names, weights=weights)[0], tiers)
+
+
+class LevelStats:
+    def __init__(self):
+        self.updates: List[float] = []
+        self.actions: Dict[str, List[float]] = defaultdict(list)
+        self.failed = 0
+
+
+async def run_level(harness: BotUnderTest, backend: FakeBackend, users: int, args, first_id: int) -> dict:
+    stats = LevelStats()
+    factory = UpdateFactory()
+    sent_before = harness.session.requests
+    errors_before = sum(backend.errors.values())
+    deadline = time.perf_counter() + args.duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        VirtualUser(first_id + i, harness, factory, stats, random.Random(args.seed + first_id + i)).run(
+            deadline, args.mix, args.scan_mix, args.think,
+        )
+        for i in range(users)
+    ))
+    elapsed = time.perf_counter() - started
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "updates": len(stats.updates),
+        "updates_per_s": round(len(stats.updates) / elapsed, 1),
+        "actions_per_s": round(sum(len(v) for v in stats.actions.values()) / elapsed, 1),
+        "failed_updates": stats.failed,
+        "backend_errors": sum(backend.errors.values()) - errors_before,
+        "telegram_calls": harness.session.requests - sent_before,
+        "update_ms": _percentiles(stats.updates),
+        "action_ms": {name: {"n": len(values), **_percentiles(values)} for name, values in sorted(stats.actions.items())},
+        "rss_mb": round(read_rss() / 2**20, 1),
+        "heap_blocks": sys.getallocatedblocks(),
+    }
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {f"p{int(q * 100)}": round(percentile(values, q) * 1000, 1) for q in (0.5, 0.95, 0.99)}
+
+
+def print_level(result: dict) -> None:
+    latency = result["update_ms"]
+    print(
+        f"\n== {result['users']} users, {result['seconds']}s: "
+        f"{result['updates_per_s']} updates/s, {result['actions_per_s']} actions/s, "
+        f"RSS {result['rss_mb']} MB, {result['heap_blocks']:,} heap blocks"
+    )
+    print(
+        f"   updates {result['updates']:,} (failed {result['failed_updates']}), "
+        f"backend errors {result['backend_errors']}, telegram calls {result['telegram_calls']:,}"
+    )
+    print(f"   {'update':<16} {'':>6} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}")
+    for name, row in result["action_ms"].items():
+        print(f"   {name:<16} {row['n']:>6} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+
+
+async def run(args) -> List[dict]:
+    backend = FakeBackend(parse_backend(args.backend), seed=args.seed)
+    await backend.start()
+    env = {"TELEGRAM_GLOBAL_RATE": "1000000", "TELEGRAM_CHAT_RATE": "1000000"} if args.unthrottled else None
+    harness = BotUnderTest(backend.url, env=env)
+    await harness.start()
+    results = []
+    try:
+        first_id = USER_ID_BASE
+        print(f"{'':<19} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", end="")
+        for users in args.users:
+            result = await run_level(harness, backend, users, args, first_id)
+            first_id += users
+            print_level(result)
+            results.append(result)
+    finally:
+        await harness.close()
+        await backend.close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[10, 50, 200], help="Concurrent users per level")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per level")
+    parser.add_argument("--think", type=float, default=1.0, help="Mean think time between actions (seconds)")
+    parser.add_argument("--mix", type=parse_weights, default=parse_weights("scan=4,dashboard=2,history=2,balance=2"))
+    parser.add_argument("--scan-mix", type=parse_weights, default=parse_weights("free=6,premium=3,mvp=1"))
+    parser.add_argument(
+        "--backend", action="append", default=[], metavar="ROUTE=MEDIAN_MS:TAIL[:ERROR_RATE]",
+        help="Override a backend route's latency (route 'default' for all others)",
+    )
+    parser.add_argument("--unthrottled", action="store_true", help="Lift the outbound Telegram rate limits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(levelname)s %(name)s: %(message)s")
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "json"}, "levels": results}, fh, indent=2)
+            fh.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
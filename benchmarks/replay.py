@@ -0,0 +1,251 @@
+"""Replay recorded production traffic through the dispatcher and compare latency.
+
+Reads a recording made with ``TRAFFIC_RECORD_DIR`` (one ``.jsonl.gz`` file or
+a directory of them; see ``services/traffic_recorder.py``). It then:
+
+* starts :class:`~benchmarks.harness.FakeBackend` with each endpoint's
+  latency drawn from the recorded backend timings, and with the recorded
+  error rate (status 0 or >= 500);
+* gives every recorded user a backend session, since most were logged in
+  before the recording started;
+* feeds each update at its recorded time divided by ``--speed`` (1x-100x),
+  keeping each user's updates in order. A user's next update waits for the
+  previous one, as the per-chat executor does in production.
+
+The report compares handling latency per command / callback / text with the
+production latencies in the recording, and with an earlier replay when
+``--compare`` is given. "lag" is how late updates were scheduled against the
+recording; if it grows, the loop could not keep up at that speed.
+
+Usage:
+    python -m benchmarks.replay data/traffic
+    python -m benchmarks.replay data/traffic --speed 20 --unthrottled --json after.json
+    python -m benchmarks.replay data/traffic --speed 20 --unthrottled --compare before.json
+    python -m benchmarks.replay traffic.jsonl.gz --from 3600 --seconds 300   # one burst
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.harness import BotUnderTest, EndpointProfile, FakeBackend, UpdateFactory, percentile
+from services.memprof import read_rss
+from services.traffic_recorder import read_recording
+
+USER_ID_BASE = 2_000_000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def backend_profiles(records: List[Dict[str, Any]]) -> Dict[str, EndpointProfile]:
+    """Empirical latency and error rate per recorded endpoint path."""
+    timings: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    for record in records:
+        if record["kind"] != "backend":
+            continue
+        route = record["endpoint"].split(" ", 1)[-1]
+        timings[route].append(record["ms"])
+        if record["status"] == 0 or record["status"] >= 500:
+            errors[route] += 1
+    return {
+        route: EndpointProfile(
+            median_ms=percentile(values, 0.5),
+            error_rate=errors[route] / len(values),
+            samples_ms=values,
+        )
+        for route, values in timings.items()
+    }
+
+
+def select(records: List[Dict[str, Any]], start: float, seconds: Optional[float]) -> List[Dict[str, Any]]:
+    """Records from ``start`` seconds into the recording, for ``seconds`` (all when ``None``)."""
+    if not records:
+        return []
+    first = records[0]["t"] + start
+    last = first + seconds if seconds is not None else float("inf")
+    return [record for record in records if first <= record["t"] < last]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {f"p{int(q * 100)}": round(percentile(values, q), 1) for q in QUANTILES}
+
+
+class Replayer:
+    def __init__(self, harness: BotUnderTest, speed: float):
+        self.harness = harness
+        self.speed = speed
+        self.factory = UpdateFactory()
+        self.user_ids: Dict[Tuple[str, int], int] = {}
+        self.recorded: Dict[str, List[float]] = defaultdict(list)
+        self.replayed: Dict[str, List[float]] = defaultdict(list)
+        self.lag: List[float] = []
+        self.failed = 0
+        self.skipped = 0
+        self._last: Dict[int, asyncio.Task] = {}
+
+    def user_id(self, record: Dict[str, Any]) -> int:
+        key = (record["run"], record["user"])
+        user_id = self.user_ids.get(key)
+        if user_id is None:
+            user_id = self.user_ids[key] = USER_ID_BASE + len(self.user_ids)
+        return user_id
+
+    def _build(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        user_id = self.user_id(record)
+        if record["type"] == "message" and record.get("text"):
+            return self.factory.message(user_id, record["text"])
+        if record["type"] == "callback_query" and record.get("data") is not None:
+            return self.factory.callback(user_id, record["data"])
+        return None
+
+    async def _feed(self, record: Dict[str, Any], update: Dict[str, Any], due: float, previous: Optional[asyncio.Task]) -> None:
+        self.lag.append(max(0.0, time.perf_counter() - due) * 1000)
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            seconds = await self.harness.feed(update)
+        except Exception:  # noqa: BLE001
+            self.failed += 1
+            return
+        self.recorded[record["label"]].append(record["ms"])
+        self.replayed[record["label"]].append(seconds * 1000)
+
+    async def run(self, records: List[Dict[str, Any]]) -> float:
+        updates = [record for record in records if record["kind"] == "update"]
+        await self.harness.log_in(self.user_id(record) for record in updates)
+        if not updates:
+            return 0.0
+        origin = updates[0]["t"]
+        started = time.perf_counter()
+        for record in updates:
+            update = self._build(record)
+            if update is None:
+                self.skipped += 1
+                continue
+            due = started + (record["t"] - origin) / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            user_id = update.get("message", update.get("callback_query"))["from"]["id"]
+            self._last[user_id] = asyncio.create_task(self._feed(record, update, due, self._last.get(user_id)))
+        await asyncio.gather(*self._last.values(), return_exceptions=True)
+        return time.perf_counter() - started
+
+    def _row(self, recorded: List[float], replayed: List[float]) -> Dict[str, Any]:
+        return {"n": len(replayed), "recorded": _percentiles(recorded), "replay": _percentiles(replayed)}
+
+    def report(self, elapsed: float, recorded_span: float) -> Dict[str, Any]:
+        labels = {}
+        updates = sum(len(values) for values in self.replayed.values())
+        if updates:
+            labels["all"] = self._row(
+                [value for values in self.recorded.values() for value in values],
+                [value for values in self.replayed.values() for value in values],
+            )
+        for label in sorted(self.replayed, key=lambda label: len(self.replayed[label]), reverse=True):
+            labels[label] = self._row(self.recorded[label], self.replayed[label])
+        return {
+            "speed": self.speed,
+            "recorded_seconds": round(recorded_span, 1),
+            "replay_seconds": round(elapsed, 1),
+            "updates": updates,
+            "updates_per_s": round(updates / elapsed, 1) if elapsed else 0.0,
+            "users": len(self.user_ids),
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "lag_ms": {**_percentiles(self.lag), "max": round(max(self.lag, default=0.0), 1)},
+            "rss_mb": round(read_rss() / 2**20, 1),
+            "labels": labels,
+        }
+
+
+def _change(new: float, old: float) -> str:
+    return f"{new / old - 1:+7.0%}" if old else "      -"
+
+
+def print_report(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    lag = result["lag_ms"]
+    print(
+        f"Replayed {result['recorded_seconds']}s of traffic at {result['speed']}x in {result['replay_seconds']}s: "
+        f"{result['updates']:,} updates from {result['users']:,} users, {result['updates_per_s']} updates/s, "
+        f"{result['failed']} failed, {result['skipped']} skipped, RSS {result['rss_mb']} MB"
+    )
+    print(f"Schedule lag ms: p50 {lag['p50']}  p95 {lag['p95']}  p99 {lag['p99']}  max {lag['max']}\n")
+    header = f"{'':<18} {'n':>6} | {'recorded p50/p95/p99 ms':>24} | {'replay p50/p95/p99 ms':>24} | {'p95 vs rec':>10}"
+    if previous:
+        header += f" | {'p95 vs prev':>11}"
+    print(header)
+    for label, row in result["labels"].items():
+        rec, rep = row["recorded"], row["replay"]
+        line = (
+            f"{label:<18} {row['n']:>6} | {rec['p50']:>8.1f}{rec['p95']:>8.1f}{rec['p99']:>8.1f} | "
+            f"{rep['p50']:>8.1f}{rep['p95']:>8.1f}{rep['p99']:>8.1f} | {_change(rep['p95'], rec['p95']):>10}"
+        )
+        if previous:
+            old = previous.get("labels", {}).get(label)
+            line += f" | {_change(rep['p95'], old['replay']['p95']) if old else '-':>11}"
+        print(line)
+
+
+async def run(args) -> Dict[str, Any]:
+    records = select(read_recording(args.recording), args.start, args.seconds)
+    if not any(record["kind"] == "update" for record in records):
+        raise SystemExit(f"No updates in {args.recording}")
+    updates = [record for record in records if record["kind"] == "update"]
+    recorded_span = updates[-1]["t"] - updates[0]["t"]
+
+    backend = FakeBackend(backend_profiles(records), seed=args.seed)
+    await backend.start()
+    env = {"TELEGRAM_GLOBAL_RATE": "1000000", "TELEGRAM_CHAT_RATE": "1000000"} if args.unthrottled else None
+    harness = BotUnderTest(backend.url, env=env)
+    await harness.start()
+    try:
+        replayer = Replayer(harness, args.speed)
+        elapsed = await replayer.run(records)
+    finally:
+        await harness.close()
+        await backend.close()
+    return replayer.report(elapsed, recorded_span)
+
+
+def _speed(value: str) -> float:
+    speed = float(value)
+    if not 0 < speed <= 1000:
+        raise argparse.ArgumentTypeError("speed must be in (0, 1000]")
+    return speed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("recording", help="Recording file (.jsonl.gz) or TRAFFIC_RECORD_DIR")
+    parser.add_argument("--speed", type=_speed, default=1.0, help="Replay speed-up, e.g. 1, 10, 100")
+    parser.add_argument("--from", dest="start", type=float, default=0.0, help="Start this many seconds into the recording")
+    parser.add_argument("--seconds", type=float, help="Replay only this many recorded seconds")
+    parser.add_argument("--unthrottled", action="store_true", help="Lift the outbound Telegram rate limits")
+    parser.add_argument("--compare", help="JSON report of an earlier replay to compare with")
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format="%(levelname)s %(name)s: %(message)s")
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as fh:
+            previous = json.load(fh)
+    result = asyncio.run(run(args))
+    print_report(result, previous)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(result, fh, indent=2)
+            fh.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
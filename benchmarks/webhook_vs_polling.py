@@ -0,0 +1,229 @@
+"""Compare end-to-end update latency for long polling vs webhook delivery.
+
+A local stand-in for the Telegram Bot API queues synthetic updates and records
+when the bot's reply (``sendMessage``) arrives. Latency is measured from the
+moment an update is created to the moment its reply reaches the stand-in, so
+it covers transport, dispatch and the outbound call.
+
+Usage:
+    python -m benchmarks.webhook_vs_polling --updates 500 --rate 100 --chats 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession, web
+from aiogram import Bot, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from services.update_executor import KeyedExecutor, OrderedDispatcher
+from services.webhook import build_webhook_app
+
+TOKEN = "42:BENCHMARK"
+SECRET = "benchmark-secret"
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegram:
+    """Minimal Bot API: getMe, getUpdates (long poll), sendMessage, webhooks."""
+
+    def __init__(self) -> None:
+        self.pending: List[dict] = []
+        self.new_updates = asyncio.Event()
+        self.created: Dict[str, float] = {}
+        self.replied: Dict[str, float] = {}
+        self.all_replied = asyncio.Event()
+        self.expected = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    def make_update(self, update_id: int, chat_id: int) -> dict:
+        text = f"ping-{update_id}"
+        self.created[text] = time.perf_counter()
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+                "text": text,
+            },
+        }
+
+    def push(self, update: dict) -> None:
+        self.pending.append(update)
+        self.new_updates.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        form = await request.post()
+
+        if method == "getme":
+            return web.json_response({"ok": True, "result": BOT_USER})
+        if method in {"deletewebhook", "setwebhook"}:
+            return web.json_response({"ok": True, "result": True})
+        if method == "getupdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(form)})
+        if method == "sendmessage":
+            text = form.get("text", "")
+            self.replied[text] = time.perf_counter()
+            if len(self.replied) >= self.expected:
+                self.all_replied.set()
+            return web.json_response({
+                "ok": True,
+                "result": {
+                    "message_id": len(self.replied),
+                    "date": int(time.time()),
+                    "chat": {"id": int(form.get("chat_id", 0)), "type": "private"},
+                    "from": BOT_USER,
+                    "text": text,
+                },
+            })
+        return web.json_response({"ok": False, "error_code": 404, "description": "Not Found"}, status=404)
+
+    async def _get_updates(self, form) -> List[dict]:
+        offset = int(form.get("offset", 0) or 0)
+        timeout = float(form.get("timeout", 0) or 0)
+        self.pending = [u for u in self.pending if u["update_id"] >= offset]
+        if not self.pending and timeout:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.pending[:100]
+
+    def latencies(self) -> List[float]:
+        return [
+            (self.replied[text] - created) * 1000
+            for text, created in self.created.items()
+            if text in self.replied
+        ]
+
+
+def build_dispatcher() -> OrderedDispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message) -> None:
+        await message.answer(message.text)
+
+    dp = OrderedDispatcher(executor=KeyedExecutor(max_in_flight=256))
+    dp.include_router(router)
+    return dp
+
+
+async def start_site(app: web.Application) -> tuple:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # noqa: SLF001
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def inject(args: argparse.Namespace, fake: FakeTelegram, deliver) -> None:
+    for update_id in range(1, args.updates + 1):
+        chat_id = random.randint(1, args.chats)
+        await deliver(fake.make_update(update_id, chat_id))
+        await asyncio.sleep(random.expovariate(args.rate))
+
+
+async def run_mode(mode: str, args: argparse.Namespace) -> List[float]:
+    fake = FakeTelegram()
+    fake.expected = args.updates
+    api_runner, api_url = await start_site(fake.app())
+    bot = Bot(TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+    dp = build_dispatcher()
+
+    try:
+        if mode == "polling":
+            async def deliver(update: dict) -> None:
+                fake.push(update)
+
+            polling = asyncio.create_task(
+                dp.start_polling(bot, handle_as_tasks=False, handle_signals=False, polling_timeout=10)
+            )
+            await inject(args, fake, deliver)
+            await asyncio.wait_for(fake.all_replied.wait(), args.timeout)
+            await dp.stop_polling()
+            await polling
+        else:
+            hook_runner, hook_url = await start_site(
+                build_webhook_app(dp, bot, path="/webhook", secret_token=SECRET)
+            )
+            async with ClientSession() as client:
+                async def deliver(update: dict) -> None:
+                    async with client.post(
+                        f"{hook_url}/webhook",
+                        data=json.dumps(update),
+                        headers={
+                            "Content-Type": "application/json",
+                            "X-Telegram-Bot-Api-Secret-Token": SECRET,
+                        },
+                    ) as response:
+                        response.raise_for_status()
+
+                await inject(args, fake, deliver)
+                await asyncio.wait_for(fake.all_replied.wait(), args.timeout)
+            await hook_runner.cleanup()
+    finally:
+        await bot.session.close()
+        await api_runner.cleanup()
+
+    return fake.latencies()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def report(mode: str, latencies: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "mode": mode,
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=100.0, help="mean updates per second")
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = [report(mode, await run_mode(mode, args)) for mode in ("polling", "webhook")]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<8} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for row in results:
+        print(
+            f"{row['mode']:<8} {row['count']:>6} {row['mean_ms']:>8.2f} {row['p50_ms']:>8.2f} "
+            f"{row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
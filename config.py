@@ -1,8 +1,26 @@
 # === config.py ===
-"""Configuration settings for SPL Shield Bot"""
+"""Configuration settings for SPL Shield Bot
 
+Settings are loaded once into an immutable snapshot held by ``SettingsStore``;
+``get_settings()`` returns the current snapshot without touching the disk. On
+SIGHUP or when ``.env`` changes, the store loads and validates a new snapshot
+and swaps it in whole, keeping the old one if validation fails.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from contextlib import suppress
+from functools import cached_property
+from pydantic import ValidationError, field_validator, model_validator
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Callable, Dict, FrozenSet, List, Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+# Read per request through get_settings(); every other field is wired in at start-up
+RELOADABLE = frozenset({"ADMIN_USER_IDS"})
 
 class Settings(BaseSettings):
     # Bot Configuration
@@ -15,22 +33,238 @@ class Settings(BaseSettings):
     # Admin Users (comma-separated Telegram user IDs)
     ADMIN_USER_IDS: str = ""
     
+    # Update processing (per-chat ordered, globally bounded)
+    UPDATE_MAX_IN_FLIGHT: int = 256
+    UPDATE_SLOW_WAIT_SECONDS: float = 5.0
+    BOT_WORKERS: int = 1  # >1 runs a supervisor routing updates to N shard processes by chat id
+    
+    # Outbound Telegram flood limits
+    TELEGRAM_GLOBAL_RATE: float = 30.0  # messages per second across all chats
+    TELEGRAM_CHAT_RATE: float = 1.0  # messages per second per private chat
+    TELEGRAM_GROUP_PER_MINUTE: float = 20.0  # messages per minute per group
+    
+    # Admin broadcasts
+    BROADCAST_CHECKPOINT_PATH: str = "data/broadcast.json"
+    
+    # Admin dashboard snapshot (shared stale-while-revalidate cache)
+    DASHBOARD_FRESH_SECONDS: float = 30.0  # Older snapshots are served while refreshing
+    DASHBOARD_MAX_AGE_SECONDS: float = 600.0  # Older snapshots are dropped
+    DASHBOARD_PIN_INTERVAL_SECONDS: float = 60.0  # Edit interval of /admin pin
+    
+    # Local mirrors of admin lists, synced incrementally in the background
+    USER_DIRECTORY_SYNC_SECONDS: float = 60.0
+    LEDGER_SYNC_SECONDS: float = 60.0
+    LEDGER_PATH: str = "data/ledger.jsonl"  # Append-only, replayed on start-up
+    
+    # Columnar event log behind /analytics
+    EVENT_LOG_DIR: str = "data/events"
+    
+    # Health checks: GET /livez (event loop) and /readyz (Telegram, backend); 0 disables
+    HEALTH_HOST: str = "0.0.0.0"
+    HEALTH_PORT: int = 8081
+    
+    # Backend connection pool, warmed at start-up so the first scans skip connection setup
+    BACKEND_WARM_CONNECTIONS: int = 4
+    BACKEND_KEEPALIVE_SECONDS: float = 60.0  # Idle pooled connections are kept this long
+    
+    # Prometheus /metrics endpoint (0 disables; shard N listens on METRICS_PORT + 1 + N)
+    METRICS_HOST: str = "127.0.0.1"  # No auth on /metrics; set 0.0.0.0 only behind a firewall or private network
+    METRICS_PORT: int = 9090
+    
+    # In-chat latency report (/perf)
+    PERF_SLOW_HANDLER_MS: float = 1000.0  # Handlers slower than this log a warning
+    
+    # Event-loop lag watchdog
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.1  # Heartbeat period
+    LOOP_STALL_THRESHOLD_MS: float = 250.0  # Blocked longer than this logs the blocking stack
+    LOOP_SLOW_CALLBACK_MS: float = 0.0  # >0 enables asyncio debug mode flagging slower callbacks
+    
+    # Update traces (correlation ids sent to the backend as traceparent / X-Request-ID)
+    TRACE_PATH: str = "data/traces.jsonl"  # Tail-sampled spans, one JSON object per line
+    TRACE_KEEP_SLOWEST: int = 20  # Slowest traces kept per export window (failed ones are always kept)
+    TRACE_SAMPLE_RATE: float = 0.01  # Share of the remaining traces kept at random
+    TRACE_EXPORT_SECONDS: float = 10.0
+    
+    # RSS / heap samples for /metrics and /memprof
+    MEMORY_SAMPLE_SECONDS: float = 30.0
+    
+    # Anonymised traffic recording for benchmarks/replay.py (empty disables)
+    TRAFFIC_RECORD_DIR: str = ""
+    TRAFFIC_RECORD_MAX_MB: float = 64.0  # Per file, compressed; the newest 20 files are kept
+    
+    # Shared state (FSM, sessions, scan cache, locks); set REDIS_URL to run several replicas
+    REDIS_URL: str | None = None
+    SESSION_TTL_SECONDS: int = 86400
+    SCAN_DEDUPE_TTL_SECONDS: float = 60.0
+    
+    # Local FSM storage (ignored when REDIS_URL is set)
+    FSM_STORAGE: Literal["memory", "sqlite"] = "sqlite"
+    FSM_SQLITE_PATH: str = "data/fsm.sqlite3"
+    FSM_DEFAULT_TTL_SECONDS: float = 3600.0
+    FSM_STATE_TTLS: str = "RegisterStates=900,LoginStates=300,ScanStates=1800"  # Per state group
+    FSM_SENSITIVE_FIELDS: str = "password,confirm_password"  # Kept in memory only, never persisted
+    
+    # Update transport: "polling" or "webhook"
+    BOT_MODE: Literal["polling", "webhook"] = "polling"
+    WEBHOOK_BASE_URL: str = ""  # Public HTTPS URL Telegram can reach
+    WEBHOOK_PATH: str = "/telegram/webhook"
+    WEBHOOK_SECRET: str = ""  # Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    
     # Environment
     ENVIRONMENT: str = "production"
     DEBUG: bool = False
     LOG_LEVEL: str = "INFO"  # Added this field
+    SETTINGS_WATCH_SECONDS: float = 5.0  # How often .env is checked for changes (0 disables; SIGHUP always reloads)
+    
+    # Logging: records are queued and written by a background thread
+    LOG_FORMAT: Literal["json", "text"] = "json"  # One JSON object per line, or the classic text line
+    LOG_QUEUE_SIZE: int = 10000  # Records past this backlog are dropped, never blocking the loop
+    LOG_RATE_PER_SECOND: float = 10.0  # Per log call site, after the burst (0 disables; CRITICAL is never limited)
+    LOG_RATE_BURST: int = 50
     
     class Config:
         env_file = ".env"
         case_sensitive = True
         extra = "ignore"  # Added this to ignore extra fields
+        frozen = True  # Snapshots are shared between requests; reload swaps the whole object
+    
+    @field_validator("ADMIN_USER_IDS")
+    @classmethod
+    def check_admin_ids(cls, value: str) -> str:
+        """Reject a malformed list at load time rather than on the next admin command"""
+        for part in filter(None, (part.strip() for part in value.split(","))):
+            if not part.lstrip("-").isdigit():
+                raise ValueError(f"ADMIN_USER_IDS: {part!r} is not a Telegram user id")
+        return value
+    
+    @field_validator("FSM_STATE_TTLS")
+    @classmethod
+    def check_state_ttls(cls, value: str) -> str:
+        """Every entry must be "Group=seconds" with a positive number of seconds"""
+        for item in filter(None, (part.strip() for part in value.split(","))):
+            group, sep, seconds = item.partition("=")
+            try:
+                valid = bool(sep and group.strip()) and float(seconds) > 0
+            except ValueError:
+                valid = False
+            if not valid:
+                raise ValueError(f"FSM_STATE_TTLS: {item!r} is not Group=seconds")
+        return value
+    
+    @model_validator(mode="after")
+    def check_webhook(self) -> "Settings":
+        """Webhook mode needs a public URL and a secret token"""
+        if self.BOT_MODE == "webhook" and not (self.WEBHOOK_BASE_URL and self.WEBHOOK_SECRET):
+            raise ValueError("BOT_MODE=webhook requires WEBHOOK_BASE_URL and WEBHOOK_SECRET")
+        return self
+    
+    @cached_property
+    def admin_ids(self) -> FrozenSet[int]:
+        """Parse admin IDs from string (once per snapshot)"""
+        return frozenset(int(id.strip()) for id in self.ADMIN_USER_IDS.split(",") if id.strip())
+    
+    @property
+    def fsm_state_ttls(self) -> Dict[str, float]:
+        """Parse "Group=seconds" pairs from FSM_STATE_TTLS"""
+        ttls = {}
+        for item in filter(None, (part.strip() for part in self.FSM_STATE_TTLS.split(","))):
+            group, _, seconds = item.partition("=")
+            ttls[group.strip()] = float(seconds)
+        return ttls
     
     @property
-    def admin_ids(self) -> List[int]:
-        """Parse admin IDs from string"""
-        if not self.ADMIN_USER_IDS:
-            return []
-        return [int(id.strip()) for id in self.ADMIN_USER_IDS.split(",")]
+    def fsm_sensitive_fields(self) -> List[str]:
+        """Parse FSM field names that must never be persisted"""
+        return [name.strip() for name in self.FSM_SENSITIVE_FIELDS.split(",") if name.strip()]
+
+
+class SettingsStore:
+    """Holds the current settings snapshot and reloads it on SIGHUP or .env changes"""
+    
+    def __init__(self, factory: Callable[[], Settings] = Settings, env_file: str = ".env"):
+        self._factory = factory
+        self.env_file = env_file
+        # Swapped by a single assignment, so readers see the old or the new snapshot, never a mix
+        self.current = factory()
+        self.reloads = 0
+        self.failed_reloads = 0
+        self._mtime = self._env_mtime()
+        self._task: Optional[asyncio.Task] = None
+        self._signal = False
+    
+    def _env_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.env_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def reload(self) -> bool:
+        """Load and validate a new snapshot; keep the current one if it is invalid"""
+        self._mtime = self._env_mtime()
+        try:
+            new = self._factory()
+        except ValidationError as exc:
+            self.failed_reloads += 1
+            logger.error("Settings reload rejected, keeping the current settings: %s", exc)
+            return False
+        except Exception:
+            # An unreadable .env must not end the watch task
+            self.failed_reloads += 1
+            logger.exception("Settings reload failed, keeping the current settings")
+            return False
+        old, self.current = self.current, new
+        self.reloads += 1
+        changed = [name for name in type(new).model_fields if getattr(old, name) != getattr(new, name)]
+        logger.info("Settings reloaded; changed: %s", ", ".join(changed) or "nothing")
+        restart = [name for name in changed if name not in RELOADABLE]
+        if restart:
+            logger.warning("These settings take effect after a restart: %s", ", ".join(restart))
+        return True
+    
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self._env_mtime()
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self.reload()
+    
+    def start(self, interval: float = 5.0, on_sighup: Optional[Callable[[], None]] = None) -> None:
+        """Reload on SIGHUP (or call ``on_sighup``), and when .env changes (checked every ``interval`` seconds; 0 disables)"""
+        loop = asyncio.get_running_loop()
+        if not self._signal and hasattr(signal, "SIGHUP"):
+            with suppress(NotImplementedError, RuntimeError):
+                loop.add_signal_handler(signal.SIGHUP, on_sighup or self.reload)
+                self._signal = True
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._watch(interval))
+    
+    async def close(self) -> None:
+        if self._signal:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+            self._signal = False
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def stats(self) -> Dict[str, int]:
+        return {"reloads": self.reloads, "failed_reloads": self.failed_reloads}
+
+
+_store: Optional[SettingsStore] = None
+
+
+def settings_store() -> SettingsStore:
+    """The process-wide settings store, created on first use"""
+    global _store
+    if _store is None:
+        _store = SettingsStore()
+    return _store
+
 
 def get_settings() -> Settings:
-    return Settings()
+    """Current settings snapshot (no disk I/O after the first call)"""
+    return settings_store().current
@@ -2,66 +2,127 @@
 """Admin command handlers"""
 
 import logging
-from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+import os
+import time
+from aiogram import Router, F, html
+from aiogram import Bot
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, BufferedInputFile, FSInputFile
 from config import get_settings
+from keyboards.admin_kb import get_users_page_keyboard
+from services.export import EXPORT_FORMATS, EXPORT_RESOURCES, ExportError
+from services.perf import KIND_BACKEND, KIND_HANDLER, KIND_LOOP
+from services.profiler import ProfilerBusy
+from services.tracing import detached_task
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 
 def is_admin(user_id: int) -> bool:
-    """Check if user is admin"""
-    settings = get_settings()
-    return user_id in settings.admin_ids
+    """Check if user is admin (against the cached settings snapshot)"""
+    return user_id in get_settings().admin_ids
+
+
+def format_updated(updated_at: float) -> str:
+    """Stamp showing when a dashboard snapshot was taken"""
+    age = int(time.time() - updated_at)
+    stamp = time.strftime("%H:%M:%S UTC", time.gmtime(updated_at))
+    return f"🕒 Updated {stamp} ({age}s ago)"
+
+
+def format_loop_health(loop) -> str:
+    """One-line event-loop lag summary from the watchdog"""
+    line = f"• Loop lag (5 min): p50 {loop['p50_ms']:.0f} ms, p99 {loop['p99_ms']:.0f} ms, max {loop['max_ms']:.0f} ms"
+    last = loop["last_stall"]
+    if last:
+        stamp = time.strftime("%H:%M:%S UTC", time.gmtime(last["at"]))
+        line += f"\n• Stalls: {loop['stalls']} (last {last['lag_ms']:.0f} ms at {stamp})"
+    return line
+
+
+def format_admin_panel(snapshot, loop=None) -> str:
+    """Render the admin panel from a dashboard snapshot and optional loop health"""
+    stats_overview, updated_at = snapshot
+    users = stats_overview.get("users", {})
+    revenue = stats_overview.get("revenue", {})
+    usage = stats_overview.get("usage", {})
+
+    return (
+        f"🛡️ <b>SPL Shield Admin Panel</b>\n\n"
+        f"<b>System Stats:</b>\n"
+        f"• Total Users: {users.get('total', 0)}\n"
+        f"• Verified Users: {users.get('verified', 0)} ({users.get('verification_rate', 0):.1f}%)\n"
+        f"• New Users Today: {users.get('new_today', 0)}\n\n"
+        f"<b>Revenue:</b>\n"
+        f"• Total TDL: {revenue.get('total_tdl', 0)}\n"
+        f"• Today: {revenue.get('today_tdl', 0)}\n"
+        f"• Confirmed Transactions: {revenue.get('total_transactions', 0)}\n"
+        f"• Pending Transactions: {revenue.get('pending_transactions', 0)}\n\n"
+        f"<b>API Usage (24h):</b>\n"
+        f"• Requests: {usage.get('requests_24h', 0)}\n"
+        f"• Success Rate: {usage.get('success_rate', 0):.1f}%\n"
+        f"• Unique Users: {usage.get('unique_users_24h', 0)}\n"
+        f"• Avg req / hour: {usage.get('avg_requests_per_hour', 0):.1f}\n\n"
+        + (f"<b>Bot Health:</b>\n{format_loop_health(loop)}\n\n" if loop else "")
+        + f"Use /stats, /users, /transactions for details.\n"
+        f"{format_updated(updated_at)}"
+    )
 
 
 @router.message(Command("admin"))
-async def cmd_admin(message: Message, api_service):
-    """Show admin panel (admin only)"""
+async def cmd_admin(message: Message, command: CommandObject, bot: Bot, dashboard, loop_watchdog):
+    """Show admin panel (admin only); `/admin pin` keeps a pinned copy up to date"""
     if not is_admin(message.from_user.id):
         await message.answer("❌ This command is for admins only.")
         return
     
+    action = (command.args or "").strip().lower()
+    if action == "unpin":
+        message_id = dashboard.unpin(message.chat.id)
+        if message_id is None:
+            await message.answer("ℹ️ No pinned dashboard in this chat.")
+            return
+        try:
+            await bot.unpin_chat_message(message.chat.id, message_id=message_id)
+        except TelegramBadRequest:
+            pass
+        await message.answer("📌 Pinned dashboard stopped.")
+        return
+    
     try:
-        stats_overview = await api_service.get_admin_stats()
-        users = stats_overview.get("users", {})
-        revenue = stats_overview.get("revenue", {})
-        usage = stats_overview.get("usage", {})
-
-        await message.answer(
-            f"🛡️ <b>SPL Shield Admin Panel</b>\n\n"
-            f"<b>System Stats:</b>\n"
-            f"• Total Users: {users.get('total', 0)}\n"
-            f"• Verified Users: {users.get('verified', 0)} ({users.get('verification_rate', 0):.1f}%)\n"
-            f"• New Users Today: {users.get('new_today', 0)}\n\n"
-            f"<b>Revenue:</b>\n"
-            f"• Total TDL: {revenue.get('total_tdl', 0)}\n"
-            f"• Today: {revenue.get('today_tdl', 0)}\n"
-            f"• Confirmed Transactions: {revenue.get('total_transactions', 0)}\n"
-            f"• Pending Transactions: {revenue.get('pending_transactions', 0)}\n\n"
-            f"<b>API Usage (24h):</b>\n"
-            f"• Requests: {usage.get('requests_24h', 0)}\n"
-            f"• Success Rate: {usage.get('success_rate', 0):.1f}%\n"
-            f"• Unique Users: {usage.get('unique_users_24h', 0)}\n"
-            f"• Avg req / hour: {usage.get('avg_requests_per_hour', 0):.1f}\n\n"
-            f"Use /stats, /users, /transactions for details."
-        )
+        snapshot = await dashboard.get(message.from_user.id)
+        if snapshot is None:
+            await message.answer("❌ Failed to load admin panel.")
+            return
+        def render(snapshot):
+            return format_admin_panel(snapshot, loop_watchdog.summary())
+        
+        panel = await message.answer(render(snapshot))
+        
+        if action == "pin":
+            await bot.pin_chat_message(message.chat.id, panel.message_id, disable_notification=True)
+            dashboard.pin(bot, message.chat.id, panel.message_id, message.from_user.id, render)
+            logger.info("Dashboard pinned by admin %s in chat %s", message.from_user.id, message.chat.id)
     except Exception as e:
-        logger.error(f"Admin panel error: {e}")
+        logger.error("Admin panel error: %s", e)
         await message.answer("❌ Failed to load admin panel.")
 
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message, api_service):
+async def cmd_stats(message: Message, dashboard):
     """Show detailed statistics (admin only)"""
     if not is_admin(message.from_user.id):
         await message.answer("❌ This command is for admins only.")
         return
     
     try:
-        stats = await api_service.get_detailed_stats()
+        snapshot = await dashboard.get(message.from_user.id)
+        if snapshot is None:
+            await message.answer("❌ Failed to load statistics.")
+            return
+        stats, updated_at = snapshot
         credits = stats.get("credits", {})
         tier_breakdown = credits.get("tier_breakdown", {})
 
@@ -72,13 +133,71 @@ async def cmd_stats(message: Message, api_service):
             f"• Free Tier Users: {tier_breakdown.get('free', 0)}\n"
             f"• Premium Tier Users: {tier_breakdown.get('premium', 0)}\n"
             f"• MVP Tier Users: {tier_breakdown.get('mvp', 0)}\n\n"
-            f"Use /users for user list, /transactions for payment activity."
+            f"Use /users for user list, /transactions for payment activity.\n"
+            f"{format_updated(updated_at)}"
         )
     except Exception as e:
-        logger.error(f"Stats error: {e}")
+        logger.error("Stats error: %s", e)
         await message.answer("❌ Failed to load statistics.")
 
 
+USERS_PAGE_SIZE = 20
+
+# Background prefetches of neighbouring pages (kept referenced until done)
+_prefetch_tasks = set()
+
+
+def format_users_page(users, page: int) -> str:
+    """Render one page of the admin user list"""
+    lines = [f"👥 <b>User Management</b> • page {page}\n"]
+    for user in users:
+        username = user.get('username', 'Unknown')
+        email = user.get('email', '—')
+        tier = user.get('tier', 'free')
+        total_spent = user.get('total_spent_tdl', 0)
+        credits = user.get('credits', {})
+
+        lines.append(f"• {username} ({email})")
+        lines.append(f"  Tier: {tier.upper()} | Spent: {total_spent} TDL")
+        if credits:
+            lines.append(
+                f"  Credits - Free: {credits.get('free', 0)}, "
+                f"Premium: {credits.get('premium', 0)}, MVP: {credits.get('mvp', 0)}"
+            )
+        lines.append("")
+    if not users:
+        lines.append("No users on this page.")
+    return "\n".join(lines)
+
+
+def prefetch_users_pages(api_service, page: int, telegram_id: int):
+    """Warm the cache for the pages an admin is likely to open next"""
+    for neighbour in (page + 1, page - 1):
+        if neighbour < 1:
+            continue
+        task = detached_task(api_service.get_users_page_cached(
+            page=neighbour,
+            limit=USERS_PAGE_SIZE,
+            telegram_id=telegram_id,
+        ))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+
+
+async def render_users_page(api_service, page: int, telegram_id: int):
+    """Return text and keyboard for a user list page, or None if it failed to load"""
+    result = await api_service.get_users_page_cached(
+        page=page,
+        limit=USERS_PAGE_SIZE,
+        telegram_id=telegram_id,
+    )
+    if result is None:
+        return None
+    users, has_more = result
+    prefetch_users_pages(api_service, page, telegram_id)
+    return format_users_page(users, page), get_users_page_keyboard(page, has_more)
+
+
 @router.message(Command("users"))
 async def cmd_users(message: Message, api_service):
     """Manage users (admin only)"""
@@ -87,50 +206,482 @@ async def cmd_users(message: Message, api_service):
         return
     
     try:
-        users = await api_service.get_all_users()
-        
-        user_list = "👥 <b>User Management</b>\n\n"
-        for user in users[:20]:  # Show first 20
-            username = user.get('username', 'Unknown')
-            email = user.get('email', '—')
-            tier = user.get('tier', 'free')
-            total_spent = user.get('total_spent_tdl', 0)
-            credits = user.get('credits', {})
-
-            user_list += f"• {username} ({email})\n"
-            user_list += f"  Tier: {tier.upper()} | Spent: {total_spent} TDL\n"
-            if credits:
-                user_list += (
-                    f"  Credits - Free: {credits.get('free', 0)}, "
-                    f"Premium: {credits.get('premium', 0)}, MVP: {credits.get('mvp', 0)}\n"
-                )
-            user_list += "\n"
-        
-        await message.answer(user_list)
+        rendered = await render_users_page(api_service, 1, message.from_user.id)
+        if rendered is None:
+            await message.answer("❌ Failed to load users.")
+            return
+        text, keyboard = rendered
+        await message.answer(text, reply_markup=keyboard)
     except Exception as e:
-        logger.error(f"User management error: {e}")
+        logger.error("User management error: %s", e)
         await message.answer("❌ Failed to load users.")
 
 
+@router.callback_query(F.data.startswith("users:"))
+async def callback_users_page(callback: CallbackQuery, api_service):
+    """Flip between user list pages (admin only)"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer("❌ Admins only.", show_alert=True)
+        return
+    
+    try:
+        page = max(1, int(callback.data.split(":")[1]))
+        rendered = await render_users_page(api_service, page, callback.from_user.id)
+        if rendered is None:
+            await callback.answer("❌ Failed to load users.", show_alert=True)
+            return
+        text, keyboard = rendered
+        await callback.message.edit_text(text, reply_markup=keyboard)
+        await callback.answer()
+    except TelegramBadRequest:
+        # Same page tapped again: the message is unchanged
+        await callback.answer()
+    except Exception as e:
+        logger.error("User page error: %s", e)
+        await callback.answer("❌ Failed to load users.", show_alert=True)
+
+
 @router.message(Command("transactions"))
-async def cmd_transactions(message: Message, api_service):
-    """View transaction history (admin only)"""
+async def cmd_transactions(message: Message, ledger):
+    """View transaction totals and recent payments (admin only)"""
     if not is_admin(message.from_user.id):
         await message.answer("❌ This command is for admins only.")
         return
     
     try:
-        transactions = await api_service.get_transactions()
-        if not transactions:
-            await message.answer("ℹ️ Transaction metrics are not yet exposed by the API.")
+        if not await ledger.ensure_synced(message.from_user.id):
+            await message.answer("❌ Failed to load transactions.")
+            return
+        summary = ledger.summary()
+        if not summary["transactions"]:
+            await message.answer("ℹ️ No transactions recorded yet.")
             return
-
-        tx_list = "💳 <b>Recent Transactions</b>\n\n"
-        for tx in transactions[:15]:  # Show last 15
-            tx_list += f"• {tx.get('user', 'Unknown')} - {tx.get('amount', 0)} TDL\n"
-            tx_list += f"  Type: {tx.get('type', 'N/A')} | {tx.get('timestamp', 'N/A')}\n\n"
         
-        await message.answer(tx_list)
+        confirmed, pending = summary["confirmed"], summary["pending"]
+        lines = [
+            "💳 <b>Transactions</b>\n",
+            f"• Confirmed: {confirmed['count']} ({confirmed['tdl']:.2f} TDL)",
+            f"• Pending: {pending['count']} ({pending['tdl']:.2f} TDL)",
+            f"• Today: {summary['today']:.2f} TDL",
+            f"• Last 24h: {summary['last_24h']:.2f} TDL",
+            f"• Last 7 days: {summary['last_7d']:.2f} TDL",
+        ]
+        if summary["by_tier"]:
+            tiers = ", ".join(f"{tier.upper()} {tdl:.2f}" for tier, tdl in sorted(summary["by_tier"].items()))
+            lines.append(f"• By tier: {tiers}")
+        
+        lines.append("\n<b>Recent</b>")
+        for tx in ledger.recent:
+            lines.append(f"• {tx.get('user', tx.get('username', 'Unknown'))} - {tx.get('amount', tx.get('amount_tdl', 0))} TDL")
+            lines.append(f"  {tx.get('tier', 'N/A')} | {tx.get('status', 'N/A')} | {tx.get('created_at', tx.get('timestamp', 'N/A'))}")
+        
+        await message.answer("\n".join(lines))
     except Exception as e:
-        logger.error(f"Transactions error: {e}")
+        logger.error("Transactions error: %s", e)
         await message.answer("❌ Failed to load transactions.")
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject, bot: Bot, broadcaster):
+    """Send a message to every user (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    args = (command.args or "").strip()
+    if not args:
+        await message.answer(
+            "📣 <b>Broadcast</b>\n\n"
+            "<code>/broadcast &lt;text&gt;</code> – send to all users\n"
+            "<code>/broadcast status</code> – show progress\n"
+            "<code>/broadcast cancel</code> – stop (can be resumed)\n"
+            "<code>/broadcast resume</code> – continue an interrupted broadcast"
+        )
+        return
+    
+    action = args.lower()
+    checkpoint = broadcaster.load_checkpoint()
+    
+    if action == "cancel":
+        if await broadcaster.cancel():
+            await message.answer("⏸️ Broadcast stopping. Use /broadcast resume to continue.")
+        elif checkpoint and await broadcaster.discard():
+            await message.answer("🗑️ Interrupted broadcast discarded.")
+        else:
+            await message.answer("ℹ️ No broadcast is running.")
+        return
+    
+    if action == "status":
+        if checkpoint is None:
+            await message.answer("ℹ️ No broadcast is running.")
+        else:
+            state = "running" if await broadcaster.active() else "interrupted"
+            await message.answer(f"📣 Broadcast {checkpoint.broadcast_id} is {state}: {broadcaster.summary(checkpoint)}")
+        return
+    
+    already_running = "⚠️ A broadcast is already running. Use /broadcast status or /broadcast cancel."
+    if await broadcaster.active():
+        await message.answer(already_running)
+        return
+    
+    if action == "resume":
+        if checkpoint is None:
+            await message.answer("ℹ️ There is no interrupted broadcast to resume.")
+            return
+        if checkpoint.admin_chat_id != message.chat.id:
+            # Progress goes to the resuming admin, whose backend session this shard holds
+            checkpoint.admin_id = message.from_user.id
+            checkpoint.admin_chat_id = message.chat.id
+            checkpoint.progress_message_id = None
+        if not await broadcaster.start(bot, checkpoint):
+            await message.answer(already_running)
+            return
+        await message.answer(f"▶️ Resuming broadcast {checkpoint.broadcast_id} from page {checkpoint.page}.")
+        return
+    
+    if checkpoint is not None:
+        await message.answer(
+            f"⚠️ Broadcast {checkpoint.broadcast_id} was interrupted. "
+            "Use /broadcast resume to finish it or /broadcast cancel to discard it first."
+        )
+        return
+    
+    error = await broadcaster.preview(bot, message.chat.id, args)
+    if error is not None:
+        await message.answer(
+            f"❌ Broadcast not started: the preview could not be sent ({html.quote(error)}). "
+            "If this is a formatting error, escape <code>&lt;</code>, <code>&gt;</code> and "
+            "<code>&amp;</code> or fix the HTML tags."
+        )
+        return
+    
+    try:
+        if not await broadcaster.start(bot, broadcaster.new_checkpoint(args, message.from_user.id, message.chat.id)):
+            await message.answer(already_running)
+            return
+        logger.info("Broadcast started by admin %s", message.from_user.id)
+    except Exception as e:
+        logger.error("Broadcast error: %s", e)
+        await message.answer("❌ Failed to start broadcast.")
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, exporter):
+    """Export users, scans or transactions as a compressed file (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    args = (command.args or "").lower().split()
+    resource = args[0] if args else ""
+    fmt = args[1] if len(args) > 1 else "csv"
+    if resource not in EXPORT_RESOURCES or fmt not in EXPORT_FORMATS:
+        await message.answer(
+            "📦 <b>Export</b>\n\n"
+            "<code>/export users|scans|transactions [csv|jsonl]</code>\n"
+            "The file is sent gzip-compressed; CSV is the default."
+        )
+        return
+    
+    status = await message.answer(f"⏳ Exporting {resource}...")
+    result = None
+    try:
+        result = await exporter.export(resource, fmt, telegram_id=message.from_user.id)
+        await message.answer_document(
+            FSInputFile(result.path, filename=result.filename),
+            caption=f"📦 {result.rows} {resource} ({result.pages} pages, {result.elapsed:.1f}s)",
+        )
+        await status.delete()
+    except ExportError as e:
+        logger.error("Export error: %s", e)
+        await status.edit_text(f"❌ Export failed: {e}.")
+    except Exception as e:
+        logger.error("Export error: %s", e)
+        await status.edit_text("❌ Export failed.")
+    finally:
+        if result is not None:
+            os.remove(result.path)
+
+
+def format_user_entry(user) -> str:
+    """One user in /user search results"""
+    credits = user.get('credits') or {}
+    lines = [
+        f"• <b>{user.get('username', 'Unknown')}</b> ({user.get('email', '—')})",
+        f"  Tier: {str(user.get('tier', 'free')).upper()} | Spent: {user.get('total_spent_tdl', 0)} TDL",
+    ]
+    if credits:
+        lines.append(
+            f"  Credits - Free: {credits.get('free', 0)}, "
+            f"Premium: {credits.get('premium', 0)}, MVP: {credits.get('mvp', 0)}"
+        )
+    if user.get('telegram_id'):
+        lines.append(f"  Telegram ID: <code>{user['telegram_id']}</code>")
+    return "\n".join(lines)
+
+
+@router.message(Command("user"))
+async def cmd_user(message: Message, command: CommandObject, user_directory):
+    """Look up users by username, email prefix or Telegram ID (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔎 Usage: <code>/user &lt;username, email prefix or Telegram ID&gt;</code>")
+        return
+    
+    try:
+        if not await user_directory.ensure_synced(message.from_user.id):
+            await message.answer("❌ User directory is not available yet.")
+            return
+        matches = user_directory.search(query, limit=10)
+        if not matches:
+            await message.answer(f"🔎 No users match <code>{html.quote(query)}</code>.")
+            return
+        entries = "\n\n".join(format_user_entry(user) for user in matches)
+        await message.answer(f"🔎 <b>Users matching</b> <code>{html.quote(query)}</code>\n\n{entries}")
+    except Exception as e:
+        logger.error("User lookup error: %s", e)
+        await message.answer("❌ Failed to search users.")
+
+
+def format_analytics(result, hours: float) -> str:
+    """Render /analytics aggregates"""
+    lines = [
+        f"📈 <b>Analytics</b> • last {hours:g}h\n",
+        f"Events: {result['events']} (query {result['query_ms']:.0f} ms)\n",
+        "<b>Scans by tier:</b>",
+    ]
+    lines.extend(f"• {tier.upper()}: {count}" for tier, count in result["scans_by_tier"].items())
+    
+    lines.append("\n<b>Risk distribution:</b>")
+    total_risk = sum(result["risks"].values()) or 1
+    lines.extend(
+        f"• {risk.upper()}: {count} ({count / total_risk:.0%})"
+        for risk, count in result["risks"].items()
+    )
+    
+    lines.append("\n<b>Funnel (unique users):</b>")
+    first = result["funnel"][0][1] or 1
+    lines.extend(f"• {step}: {users} ({users / first:.0%})" for step, users in result["funnel"])
+    
+    lines.append("\n<b>Top commands:</b>")
+    lines.extend(f"• /{name}: {count}" for name, count in list(result["commands"].items())[:8])
+    
+    hourly = {}
+    for (hour_ts, _tier), count in result["scans_by_hour"].items():
+        hourly[hour_ts] = hourly.get(hour_ts, 0) + count
+    if hourly:
+        lines.append("\n<b>Scans per hour (latest 12):</b>")
+        for hour_ts in sorted(hourly)[-12:]:
+            per_tier = ", ".join(
+                f"{tier} {count}"
+                for (ts, tier), count in result["scans_by_hour"].items()
+                if ts == hour_ts
+            )
+            lines.append(f"• {time.strftime('%m-%d %H:00', time.gmtime(hour_ts))}: {hourly[hour_ts]} ({per_tier})")
+    
+    return "\n".join(lines)
+
+
+@router.message(Command("analytics"))
+async def cmd_analytics(message: Message, command: CommandObject, event_log):
+    """Usage analytics from the local event log (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    try:
+        hours = float(command.args) if command.args else 24.0
+    except ValueError:
+        await message.answer("Usage: <code>/analytics [hours]</code>")
+        return
+    hours = min(max(hours, 1.0), 24.0 * 90)
+    
+    try:
+        result = await event_log.aggregate(hours)
+        await message.answer(format_analytics(result, hours))
+    except Exception as e:
+        logger.error("Analytics error: %s", e)
+        await message.answer("❌ Failed to load analytics.")
+
+
+PERF_WINDOWS = (1, 5, 60)
+
+
+def format_perf(perf, minutes: int) -> str:
+    """Render /perf percentile tables for handlers and backend endpoints"""
+    lines = [f"⏱️ <b>Latency</b> • last {minutes} min (p50 / p95 / p99, ms)"]
+    for kind, title in ((KIND_HANDLER, "Handlers"), (KIND_BACKEND, "Backend calls"), (KIND_LOOP, "Event loop")):
+        rows = perf.report(minutes, kind)
+        lines.append(f"\n<b>{title}:</b>")
+        if not rows:
+            lines.append("• no samples")
+        for name, count, (p50, p95, p99) in rows:
+            lines.append(
+                f"• <code>{html.quote(name)}</code> ×{count}: "
+                f"{p50 * 1000:.0f} / {p95 * 1000:.0f} / {p99 * 1000:.0f}"
+            )
+    other = " ".join(f"/perf {window}" for window in PERF_WINDOWS if window != minutes)
+    lines.append(f"\nAlso: {other}")
+    return "\n".join(lines)
+
+
+@router.message(Command("perf"))
+async def cmd_perf(message: Message, command: CommandObject, perf):
+    """Handler and backend latency percentiles (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    try:
+        minutes = int(command.args) if command.args else 5
+    except ValueError:
+        minutes = 0
+    if minutes not in PERF_WINDOWS:
+        await message.answer("Usage: <code>/perf [1|5|60]</code>")
+        return
+    
+    try:
+        await message.answer(format_perf(perf, minutes))
+    except Exception as e:
+        logger.error("Perf report error: %s", e)
+        await message.answer("❌ Failed to build the latency report.")
+
+
+PROFILE_MAX_SECONDS = 60
+
+
+def format_profile(result, limit: int = 12) -> str:
+    """Render the hot-function summary of a sampling profile"""
+    busy = result.loop_samples - result.idle_samples
+    lines = [
+        f"🔬 <b>Profile</b> • {result.seconds:g}s at {1 / result.interval:.0f} Hz\n",
+        f"Loop samples: {result.loop_samples} ({busy / max(result.loop_samples, 1):.0%} busy, "
+        f"{result.idle_samples} idle)\n",
+        "<b>Hot functions (self / total samples):</b>",
+    ]
+    if not busy:
+        lines.append("• the event loop was idle")
+    for name, self_count, total_count in result.top(limit):
+        lines.append(
+            f"• <code>{html.quote(name)}</code> {self_count} "
+            f"({self_count / busy:.0%}) / {total_count}"
+        )
+    lines.append("\nAttached: collapsed stacks for flamegraph.pl or speedscope.")
+    return "\n".join(lines)
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject, profiler):
+    """Sample the live process and send a flamegraph-ready profile (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    try:
+        seconds = float(command.args) if command.args else 10.0
+    except ValueError:
+        await message.answer(f"Usage: <code>/profile [seconds]</code> (max {PROFILE_MAX_SECONDS})")
+        return
+    seconds = min(max(seconds, 1.0), PROFILE_MAX_SECONDS)
+    
+    if profiler.running:
+        await message.answer("⏳ A profile is already running.")
+        return
+    
+    await message.answer(f"🔬 Profiling for {seconds:g}s...")
+    try:
+        result = await profiler.profile(seconds)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        await message.answer_document(
+            BufferedInputFile(result.collapsed(), filename=f"profile-{stamp}.folded"),
+            caption=f"{result.samples} samples over {seconds:g}s",
+        )
+        await message.answer(format_profile(result))
+        logger.info("Profile (%gs) taken by admin %s", seconds, message.from_user.id)
+    except ProfilerBusy:
+        await message.answer("⏳ A profile is already running.")
+    except Exception as e:
+        logger.error("Profile error: %s", e)
+        await message.answer("❌ Failed to profile the bot.")
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count"""
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def format_memprof(memprof, subsystems, diff) -> str:
+    """Render /memprof: RSS trend, subsystem sizes and tracemalloc growth"""
+    lines = ["🧠 <b>Memory</b>\n"]
+    if memprof.samples:
+        latest, first = memprof.samples[-1], memprof.samples[0]
+        minutes = (latest["at"] - first["at"]) / 60
+        lines.append(
+            f"RSS: {format_bytes(latest['rss'])} "
+            f"({format_bytes(latest['rss'] - first['rss'])} over {minutes:.0f} min, "
+            f"peak {format_bytes(max(sample['rss'] for sample in memprof.samples))})"
+        )
+        lines.append(f"Heap blocks: {latest['blocks']:,} • Tasks: {latest['tasks']}")
+    
+    lines.append("\n<b>By subsystem (approx.):</b>")
+    lines.extend(
+        f"• {name}: {format_bytes(size)} ({objects:,} objects)"
+        for name, size, objects in subsystems
+    )
+    
+    if diff is None:
+        lines.append("\ntracemalloc is off. <code>/memprof start</code> takes a baseline.")
+        return "\n".join(lines)
+    
+    age = int(time.time() - diff["since"])
+    lines.append(
+        f"\n<b>Growth since baseline ({age}s ago):</b> {format_bytes(diff['growth'])} "
+        f"(traced {format_bytes(diff['traced'])}, peak {format_bytes(diff['peak'])})"
+    )
+    if not diff["top"]:
+        lines.append("• nothing grew")
+    lines.extend(
+        f"• <code>{html.quote(stat['site'])}</code> +{format_bytes(stat['size_diff'])} "
+        f"(+{stat['count_diff']} blocks, {format_bytes(stat['size'])} total)"
+        for stat in diff["top"]
+    )
+    lines.append("\n<code>/memprof reset</code> new baseline • <code>/memprof stop</code> ends tracing")
+    return "\n".join(lines)
+
+
+@router.message(Command("memprof"))
+async def cmd_memprof(message: Message, command: CommandObject, memprof):
+    """Memory by subsystem and allocation growth since a baseline (admin only)"""
+    if not is_admin(message.from_user.id):
+        await message.answer("❌ This command is for admins only.")
+        return
+    
+    action = (command.args or "").strip().lower()
+    try:
+        if action in ("start", "reset"):
+            await memprof.start_tracing()
+            await message.answer("🧠 tracemalloc baseline taken. Run <code>/memprof</code> later to see growth.")
+            return
+        if action == "stop":
+            memprof.stop_tracing()
+            await message.answer("🧠 tracemalloc stopped.")
+            return
+        if action:
+            await message.answer("Usage: <code>/memprof [start|reset|stop]</code>")
+            return
+        
+        memprof.sample()
+        subsystems = await memprof.subsystems()
+        diff = await memprof.diff()
+        await message.answer(format_memprof(memprof, subsystems, diff))
+    except Exception as e:
+        logger.error("Memprof error: %s", e)
+        await message.answer("❌ Failed to read memory usage.")
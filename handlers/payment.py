@@ -4,10 +4,11 @@
 import logging
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, User
 
 from utils.messages import PRICING_MESSAGE, ERROR_NOT_LOGGED_IN
 from keyboards.user_kb import get_main_menu
+from services.event_log import KIND_FUNNEL
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -20,10 +21,10 @@ async def cmd_pricing(message: Message):
 
 
 @router.message(Command("balance"))
-async def cmd_balance(message: Message, api_service):
+async def cmd_balance(message: Message, api_service, event_from_user: User):
     """Show TDL balance"""
     try:
-        user_data = await api_service.get_user_profile(telegram_id=message.from_user.id)
+        user_data = await api_service.get_user_profile(telegram_id=event_from_user.id)
         
         if not user_data:
             await message.answer(ERROR_NOT_LOGGED_IN)
@@ -40,7 +41,7 @@ async def cmd_balance(message: Message, api_service):
             "Need more? Use /buy_credits or /pricing."
         )
     except Exception as e:
-        logger.error(f"Balance check error: {e}")
+        logger.error("Balance check error: %s", e)
         await message.answer("❌ Failed to check balance.")
 
 
@@ -72,7 +73,7 @@ async def cmd_upgrade(message: Message):
 
 
 @router.message(Command("verify_payment"))
-async def cmd_verify_payment(message: Message, api_service):
+async def cmd_verify_payment(message: Message, api_service, event_log):
     """Verify a TDL payment transaction signature."""
     parts = message.text.strip().split()
     if len(parts) < 2:
@@ -88,16 +89,21 @@ async def cmd_verify_payment(message: Message, api_service):
         await message.answer("Tier must be either <b>premium</b> or <b>mvp</b>.")
         return
 
-    result = await api_service.verify_payment(tx_signature=tx_signature, tier=tier)
+    result = await api_service.verify_payment(
+        tx_signature=tx_signature,
+        tier=tier,
+        telegram_id=message.from_user.id,
+    )
     if result.get("success"):
         await message.answer(f"✅ {result.get('message')}", reply_markup=get_main_menu())
+        event_log.record(KIND_FUNNEL, "paid", user_id=message.from_user.id, tier=tier)
     else:
         await message.answer(f"❌ Payment verification failed: {result.get('error')}")
 
 
 @router.callback_query(F.data == "balance")
 async def callback_balance(callback: CallbackQuery, api_service):
-    await cmd_balance(callback.message, api_service)
+    await cmd_balance(callback.message, api_service, callback.from_user)
     await callback.answer()
 
 
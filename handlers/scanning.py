@@ -2,9 +2,10 @@
 """Scanning command handlers"""
 
 import logging
+import time
 from aiogram import Router, F
 from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, User
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
@@ -13,6 +14,7 @@ from utils.messages import (
     ERROR_NOT_LOGGED_IN, ERROR_INVALID_ADDRESS, ERROR_SCAN_LIMIT
 )
 from keyboards.user_kb import get_scan_tier_keyboard, get_cancel_keyboard
+from services.event_log import KIND_FUNNEL, KIND_SCAN
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -23,6 +25,65 @@ class ScanStates(StatesGroup):
     selecting_tier = State()
 
 
+def is_valid_address(address: str) -> bool:
+    """Basic Solana address validation (32-44 chars)"""
+    return 32 <= len(address) <= 44
+
+
+def risk_label(risk_score: float) -> str:
+    """Emoji and level for a 0-1 risk score"""
+    if risk_score < 0.25:
+        return "🟢 LOW"
+    elif risk_score < 0.5:
+        return "🟡 MEDIUM"
+    elif risk_score < 0.75:
+        return "🟠 HIGH"
+    return "🔴 CRITICAL"
+
+
+def format_scan_result(scan_data, address: str, tier_used: str) -> str:
+    """Render a normalised scan result"""
+    risk_score = scan_data.get('risk_score', 0)
+    risk_factors = scan_data.get('risk_factors', [])
+    safe_indicators = scan_data.get('safe_indicators', [])
+    
+    risk_factors_text = '\n'.join([f"• {factor}" for factor in risk_factors]) or "None detected"
+    safe_indicators_text = '\n'.join([f"• {indicator}" for indicator in safe_indicators]) or "None found"
+    
+    return SCAN_RESULT_TEMPLATE.format(
+        address=f"{address[:8]}...{address[-8:]}",
+        type=f"{scan_data.get('type', 'Unknown')} ({tier_used})",
+        risk_score=f"{risk_score:.2f}",
+        risk_level=scan_data.get('risk_level', 'UNKNOWN'),
+        risk_emoji=risk_label(risk_score),
+        analysis_summary=scan_data.get("message") or "Analysis complete.",
+        risk_factors=risk_factors_text,
+        safe_indicators=safe_indicators_text,
+        ai_summary=scan_data.get('ai_summary', 'No AI insights available'),
+        recommendation=scan_data.get('recommendation', 'Proceed with caution')
+    )
+
+
+def format_history(history) -> str:
+    """Render the last 10 scans"""
+    history_text = "📜 <b>Your Recent Scans</b>\n\n"
+    
+    for idx, scan in enumerate(history[:10], 1):  # Show last 10
+        if isinstance(scan, dict):
+            address = scan.get('address', 'N/A')
+            tier = scan.get('tier', 'free').upper()
+            risk_score_value = scan.get('risk_score')
+            risk_score = f"{float(risk_score_value):.2f}" if isinstance(risk_score_value, (int, float)) else scan.get('risk_score', 'N/A')
+            risk_level = scan.get('risk_level', 'UNKNOWN')
+            created_at = scan.get('created_at') or scan.get('timestamp', 'N/A')
+            history_text += (
+                f"{idx}. <code>{address[:8]}...{address[-8:]}</code>\n"
+                f"   Tier: {tier} | Risk: {risk_score} ({risk_level})\n"
+                f"   {created_at}\n\n"
+            )
+    return history_text
+
+
 @router.callback_query(F.data == "scan")
 async def callback_scan(callback: CallbackQuery, state: FSMContext):
     """Kick off scanning from inline keyboard."""
@@ -45,8 +106,7 @@ async def process_scan_address(message: Message, state: FSMContext):
     """Process the address to scan"""
     address = message.text.strip()
     
-    # Basic Solana address validation (32-44 chars, base58)
-    if len(address) < 32 or len(address) > 44:
+    if not is_valid_address(address):
         await message.answer(ERROR_INVALID_ADDRESS)
         return
     
@@ -54,7 +114,7 @@ async def process_scan_address(message: Message, state: FSMContext):
     await state.update_data(address=address)
     await state.set_state(ScanStates.selecting_tier)
     
-    logger.info(f"Address stored in state: {address}")
+    logger.debug("Address stored in state: %s", address)
     
     await message.answer(
         "✅ Address validated!\n\n💎 Select scan tier:",
@@ -63,13 +123,13 @@ async def process_scan_address(message: Message, state: FSMContext):
 
 
 @router.callback_query(F.data.startswith("scan_tier:"))
-async def process_scan_tier(callback: CallbackQuery, state: FSMContext, api_service):
+async def process_scan_tier(callback: CallbackQuery, state: FSMContext, api_service, event_log):
     """Process tier selection and execute scan"""
     tier = callback.data.split(":")[1]
     data = await state.get_data()
     address = data.get('address')
     
-    logger.info(f"Processing scan - Tier: {tier}, Address: {address}")
+    logger.info("Processing scan - Tier: %s, Address: %s", tier, address)
     
     if not address:
         await callback.message.answer("❌ Error: Address not found. Please try /scan again.")
@@ -84,54 +144,31 @@ async def process_scan_tier(callback: CallbackQuery, state: FSMContext, api_serv
     
     try:
         # Call API to scan
-        logger.info(f"Calling scan_address with: address={address}, tier={tier}, telegram_id={callback.from_user.id}")
+        logger.debug("Calling scan_address with: address=%s, tier=%s, telegram_id=%s", address, tier, callback.from_user.id)
         
+        started = time.monotonic()
         result = await api_service.scan_address(
             address=address,
             tier=tier,
             telegram_id=callback.from_user.id,
         )
+        scan_latency = time.monotonic() - started
         
-        logger.info(f"Scan result received: {result}")
+        logger.debug("Scan result received: %s", result)
         
         if result.get('success'):
             scan_data = result.get('data', {})
-            risk_score = scan_data.get('risk_score', 0)
-            risk_level = scan_data.get('risk_level', 'UNKNOWN')
-            risk_factors = scan_data.get('risk_factors', [])
-            safe_indicators = scan_data.get('safe_indicators', [])
-            ai_summary = scan_data.get('ai_summary', 'No AI insights available')
-            recommendation = scan_data.get('recommendation', 'Proceed with caution')
-            
-            risk_factors_text = '\n'.join([f"• {factor}" for factor in risk_factors]) or "None detected"
-            safe_indicators_text = '\n'.join([f"• {indicator}" for indicator in safe_indicators]) or "None found"
-
-            if risk_score < 0.25:
-                risk_emoji = "🟢 LOW"
-            elif risk_score < 0.5:
-                risk_emoji = "🟡 MEDIUM"
-            elif risk_score < 0.75:
-                risk_emoji = "🟠 HIGH"
-            else:
-                risk_emoji = "🔴 CRITICAL"
-
             tier_used = scan_data.get("tier_used", tier).upper()
-            header_note = scan_data.get("message") or "Analysis complete."
-
-            await processing_msg.edit_text(
-                SCAN_RESULT_TEMPLATE.format(
-                    address=f"{address[:8]}...{address[-8:]}",
-                    type=f"{scan_data.get('type', 'Unknown')} ({tier_used})",
-                    risk_score=f"{risk_score:.2f}",
-                    risk_level=risk_level,
-                    risk_emoji=risk_emoji,
-                    analysis_summary=header_note,
-                    risk_factors=risk_factors_text,
-                    safe_indicators=safe_indicators_text,
-                    ai_summary=ai_summary,
-                    recommendation=recommendation
-                )
+            event_log.record(
+                KIND_SCAN,
+                user_id=callback.from_user.id,
+                tier=tier_used,
+                risk=risk_label(scan_data.get('risk_score', 0)).split()[-1],
+                latency=scan_latency,
             )
+            event_log.record(KIND_FUNNEL, "scanned", user_id=callback.from_user.id)
+            
+            await processing_msg.edit_text(format_scan_result(scan_data, address, tier_used))
         else:
             error_msg = result.get('error', 'Unknown error')
             await processing_msg.edit_text(
@@ -139,7 +176,7 @@ async def process_scan_tier(callback: CallbackQuery, state: FSMContext, api_serv
             )
     
     except Exception as e:
-        logger.error(f"Scan error: {e}")
+        logger.error("Scan error: %s", e)
         await processing_msg.edit_text("❌ Scan failed. Please try again.")
     
     await state.clear()
@@ -149,38 +186,22 @@ async def process_scan_tier(callback: CallbackQuery, state: FSMContext, api_serv
 @router.callback_query(F.data == "history")
 async def callback_history(callback: CallbackQuery, api_service):
     """Show scan history from inline button."""
-    await cmd_history(callback.message, api_service)
+    await cmd_history(callback.message, api_service, callback.from_user)
     await callback.answer()
 
 
 @router.message(Command("history"))
-async def cmd_history(message: Message, api_service):
+async def cmd_history(message: Message, api_service, event_from_user: User):
     """Show scan history"""
     try:
-        history = await api_service.get_scan_history(telegram_id=message.from_user.id)
+        history = await api_service.get_scan_history(telegram_id=event_from_user.id)
         
         if not history or len(history) == 0:
             await message.answer("📭 No scan history found.")
             return
         
-        history_text = "📜 <b>Your Recent Scans</b>\n\n"
-        
-        for idx, scan in enumerate(history[:10], 1):  # Show last 10
-            if isinstance(scan, dict):
-                address = scan.get('address', 'N/A')
-                tier = scan.get('tier', 'free').upper()
-                risk_score_value = scan.get('risk_score')
-                risk_score = f"{float(risk_score_value):.2f}" if isinstance(risk_score_value, (int, float)) else scan.get('risk_score', 'N/A')
-                risk_level = scan.get('risk_level', 'UNKNOWN')
-                created_at = scan.get('created_at') or scan.get('timestamp', 'N/A')
-                history_text += (
-                    f"{idx}. <code>{address[:8]}...{address[-8:]}</code>\n"
-                    f"   Tier: {tier} | Risk: {risk_score} ({risk_level})\n"
-                    f"   {created_at}\n\n"
-                )
-        
-        await message.answer(history_text)
+        await message.answer(format_history(history))
         
     except Exception as e:
-        logger.error(f"History error: {e}")
+        logger.error("History error: %s", e)
         await message.answer("❌ Failed to load history.")
@@ -4,7 +4,7 @@
 import logging
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, User
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
@@ -15,6 +15,7 @@ from utils.messages import (
     ERROR_NOT_LOGGED_IN, SUCCESS_LOGOUT
 )
 from keyboards.user_kb import get_main_menu, get_cancel_keyboard
+from services.event_log import KIND_FUNNEL
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -35,8 +36,9 @@ class LoginStates(StatesGroup):
 
 # === /start Command ===
 @router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, event_log):
     """Handle /start command - Welcome message"""
+    event_log.record(KIND_FUNNEL, "start", user_id=message.from_user.id)
     await message.answer(
         WELCOME_MESSAGE,
         reply_markup=get_main_menu()
@@ -120,7 +122,7 @@ async def process_register_confirm_password(message: Message, state: FSMContext)
 
 
 @router.message(RegisterStates.waiting_for_username)
-async def process_register_username(message: Message, state: FSMContext, api_service):
+async def process_register_username(message: Message, state: FSMContext, api_service, event_log):
     """Complete registration process"""
     username = message.text.strip()
     
@@ -134,6 +136,12 @@ async def process_register_username(message: Message, state: FSMContext, api_ser
     password = data.get('password')
     confirm_password = data.get('confirm_password')
     
+    # Passwords are never persisted, so they are gone after a restart or expiry
+    if not password or not confirm_password:
+        await state.clear()
+        await message.answer("⌛ Registration session expired. Please start again with /register.")
+        return
+    
     # Call API to register with all required fields
     try:
         result = await api_service.register(
@@ -151,12 +159,13 @@ async def process_register_username(message: Message, state: FSMContext, api_ser
             )
             await message.answer(success_message, reply_markup=get_main_menu())
             await state.clear()
+            event_log.record(KIND_FUNNEL, "registered", user_id=message.from_user.id)
         else:
             error_msg = result.get('error', 'Unknown error')
             await message.answer(f"❌ Registration failed: {error_msg}")
             
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         await message.answer("❌ Registration failed. Please try again later.")
 
 
@@ -185,7 +194,7 @@ async def process_login_email(message: Message, state: FSMContext):
 
 
 @router.message(LoginStates.waiting_for_password)
-async def process_login_password(message: Message, state: FSMContext, api_service):
+async def process_login_password(message: Message, state: FSMContext, api_service, event_log):
     """Complete login process"""
     password = message.text.strip()
     data = await state.get_data()
@@ -219,6 +228,7 @@ async def process_login_password(message: Message, state: FSMContext, api_servic
                 reply_markup=get_main_menu()
             )
             await state.clear()
+            event_log.record(KIND_FUNNEL, "logged_in", user_id=message.from_user.id, tier=tier)
         else:
             error = result.get('error', 'Invalid credentials')
             # Check for email verification error
@@ -239,7 +249,7 @@ async def process_login_password(message: Message, state: FSMContext, api_servic
             await state.clear()
             
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         await message.answer(
             "❌ Login failed. If you just registered, please verify your email first.\n\n"
             "Check your email inbox for the verification link."
@@ -255,23 +265,23 @@ async def cmd_logout(message: Message, api_service):
         result = await api_service.logout(telegram_id=message.from_user.id)
         await message.answer(SUCCESS_LOGOUT)
     except Exception as e:
-        logger.error(f"Logout error: {e}")
+        logger.error("Logout error: %s", e)
         await message.answer("❌ Logout failed.")
 
 
 # === /dashboard Command ===
 @router.message(Command("dashboard"))
-async def cmd_dashboard(message: Message, api_service):
+async def cmd_dashboard(message: Message, api_service, event_from_user: User):
     """Show user dashboard"""
     try:
-        user_data = await api_service.get_user_profile(telegram_id=message.from_user.id)
+        user_data = await api_service.get_user_profile(telegram_id=event_from_user.id)
         credits = (user_data or {}).get("credits", {}) if user_data else {}
         scans_remaining = user_data.get("scans_remaining") if user_data else None
         tier = (user_data or {}).get("tier", "free").lower()
 
         daily_limit = "Unlimited" if tier in {"premium", "mvp"} else (scans_remaining if scans_remaining is not None else "5")
         scans_today = scans_remaining if scans_remaining is not None else "—"
-        total_scans = len(await api_service.get_scan_history(telegram_id=message.from_user.id, limit=100)) if user_data else 0
+        total_scans = len(await api_service.get_scan_history(telegram_id=event_from_user.id, limit=100)) if user_data else 0
 
         if not user_data:
             await message.answer(ERROR_NOT_LOGGED_IN)
@@ -301,7 +311,7 @@ async def cmd_dashboard(message: Message, api_service):
         )
         
     except Exception as e:
-        logger.error(f"Dashboard error: {e}")
+        logger.error("Dashboard error: %s", e)
         await message.answer("❌ Failed to load dashboard.")
 
 
@@ -348,5 +358,5 @@ async def callback_main_menu(callback: CallbackQuery):
 @router.callback_query(F.data == "dashboard")
 async def callback_dashboard(callback: CallbackQuery, api_service):
     """Show dashboard from inline keyboard."""
-    await cmd_dashboard(callback.message, api_service)
+    await cmd_dashboard(callback.message, api_service, callback.from_user)
     await callback.answer()
@@ -0,0 +1,14 @@
+"""Admin keyboard layouts"""
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+
+def get_users_page_keyboard(page: int, has_more: bool):
+    """Prev/next navigation for the paginated user list"""
+    row = []
+    if page > 1:
+        row.append(InlineKeyboardButton(text="⬅️ Prev", callback_data=f"users:{page - 1}"))
+    row.append(InlineKeyboardButton(text=f"· {page} ·", callback_data=f"users:{page}"))
+    if has_more:
+        row.append(InlineKeyboardButton(text="Next ➡️", callback_data=f"users:{page + 1}"))
+    return InlineKeyboardMarkup(inline_keyboard=[row])
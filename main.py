@@ -3,71 +3,461 @@ SPL Shield Telegram Bot - Main Entry Point
 Connects to backend API at localhost:8000
 """
 
+import time
+
+# Start-up phases are timed from here, so the imports below are included
+_STARTED = time.perf_counter()
+
 import asyncio
 import logging
+import signal
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramUnauthorizedError
+from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import get_settings
+from config import get_settings, settings_store
 from handlers import user, admin, payment, scanning
 from middleware.auth import AuthMiddleware
+from middleware.events import EventLogMiddleware
+from middleware.metrics import UpdateMetricsMiddleware
+from middleware.perf import PerfMiddleware
+from middleware.recording import TrafficRecorderMiddleware
+from middleware.tracing import TracingMiddleware
 from services.api_service import APIService
+from services.broadcast import Broadcaster
+from services.dashboard import DashboardCache
+from services.event_log import EventLog
+from services.export import Exporter
+from services.fsm_sqlite import SQLiteStorage
+from services.health import HealthServer, StartupTimer, TelegramProbe
+from services.ledger import Ledger
+from services.loop_watchdog import LoopWatchdog
+from services.log_pipeline import start_logging
+from services.memprof import MemoryProfiler
+from services.metrics import REGISTRY, register_stats, start_metrics_server
+from services.perf import PERF
+from services.profiler import SamplingProfiler
+from services.outbound import OutboundLimiter
+from services.shared_state import create_backends
+from services.sharding import ShardSupervisor, serve_shard, shard_path
+from services.tracing import JsonlSpanExporter, Tracer, TracingRequestMiddleware
+from services.traffic_recorder import TrafficRecorder
+from services.update_executor import KeyedExecutor, OrderedDispatcher
+from services.user_directory import UserDirectory
+from services.webhook import run_webhook
+
+_IMPORTED = time.perf_counter()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logging is configured by start_logging() in each process entry point
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Main bot entry point"""
-    
-    # Load settings
-    settings = get_settings()
-    
-    logger.info(f"🤖 Starting SPL Shield Bot...")
-    logger.info(f"📡 Backend API: {settings.API_BASE_URL}")
-    logger.info(f"👥 Admin IDs: {settings.admin_ids}")
-    
-    # Initialize bot and dispatcher
+def build_bot(settings, shard=None):
+    """Create the bot, dispatcher and API service with all routers registered"""
     bot = Bot(
         token=settings.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
-    
+    # Every outbound call is scheduled within Telegram's flood limits;
+    # shard processes split the global budget between them
+    limiter = OutboundLimiter(
+        global_rate=settings.TELEGRAM_GLOBAL_RATE / max(1, settings.BOT_WORKERS),
+        private_rate=settings.TELEGRAM_CHAT_RATE,
+        group_per_minute=settings.TELEGRAM_GROUP_PER_MINUTE,
+    )
+    # Telegram calls become spans of the update's trace (including limiter waits)
+    bot.session.middleware(TracingRequestMiddleware())
+    bot.session.middleware(limiter)
+
+    # FSM storage and shared state live in Redis when REDIS_URL is set
+    storage, events_isolation, shared_state = create_backends(settings, shard)
+    executor = KeyedExecutor(
+        max_in_flight=settings.UPDATE_MAX_IN_FLIGHT,
+        slow_wait=settings.UPDATE_SLOW_WAIT_SECONDS,
+    )
+    dp = OrderedDispatcher(storage=storage, events_isolation=events_isolation, executor=executor)
+
+    # One trace per update, tail-sampled into TRACE_PATH
+    tracer = Tracer(
+        JsonlSpanExporter(shard_path(settings.TRACE_PATH, shard)),
+        keep_slowest=settings.TRACE_KEEP_SLOWEST,
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        interval=settings.TRACE_EXPORT_SECONDS,
+    )
+    dp.update.outer_middleware(TracingMiddleware(tracer))
+    dp.startup.register(tracer.start)
+    dp.shutdown.register(tracer.close)
+
+    # Prometheus metrics: update counts and component stats (handler timings come from PerfMiddleware)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    register_stats(
+        "splshield_outbound", "Outbound Telegram calls", limiter.stats,
+        counters=("sent", "retried", "merged_edits"),
+    )
+    register_stats(
+        "splshield_executor", "Update executor", executor.stats,
+        counters=("submitted", "completed", "failed"),
+    )
+    register_stats("splshield_traces", "Update traces", tracer.stats, counters=("finished", "exported"))
+    if hasattr(storage, "stats"):
+        register_stats("splshield_fsm", "FSM storage entries", storage.stats)
+
+    # Optional anonymised recording of updates and backend timings for replay
+    recorder = None
+    if settings.TRAFFIC_RECORD_DIR:
+        recorder = TrafficRecorder(
+            settings.TRAFFIC_RECORD_DIR,
+            writer="main" if shard is None else f"shard{shard}",
+            max_bytes=int(settings.TRAFFIC_RECORD_MAX_MB * 1024 * 1024),
+        )
+        dp.update.outer_middleware(TrafficRecorderMiddleware(recorder))
+        dp.startup.register(recorder.start)
+        dp.shutdown.register(recorder.close)
+        register_stats("splshield_traffic_recorder", "Traffic recorder", recorder.stats, counters=("recorded", "dropped"))
+
     # Initialize API service
     api_service = APIService(
         base_url=settings.API_BASE_URL,
         host_header=getattr(settings, "API_HOST_HEADER", None),
+        state=shared_state,
+        scan_dedupe_ttl=settings.SCAN_DEDUPE_TTL_SECONDS,
+        recorder=recorder,
+        keepalive=settings.BACKEND_KEEPALIVE_SECONDS,
     )
-    
+
     # Register middleware with api_service
     dp.message.middleware(AuthMiddleware(api_service))
     dp.callback_query.middleware(AuthMiddleware(api_service))
-    
-    # Include routers
+    # Handler timings, measured once for /perf percentiles and the Prometheus histogram
+    slow_handler = settings.PERF_SLOW_HANDLER_MS / 1000
+    dp.message.middleware(PerfMiddleware(PERF, slow_handler))
+    dp.callback_query.middleware(PerfMiddleware(PERF, slow_handler))
+    # Commands, button presses, scans and funnel steps for /analytics
+    event_log = EventLog(settings.EVENT_LOG_DIR, writer="main" if shard is None else f"shard{shard}")
+    dp.message.middleware(EventLogMiddleware(event_log))
+    dp.callback_query.middleware(EventLogMiddleware(event_log))
+    dp.shutdown.register(event_log.close)
+
+    # Admin broadcasts, injected into handlers as `broadcaster`
+    broadcaster = Broadcaster(api_service, settings.BROADCAST_CHECKPOINT_PATH)
+    dp["broadcaster"] = broadcaster
+    # Stop a running broadcast on shutdown; its checkpoint allows /broadcast resume
+    dp.shutdown.register(broadcaster.cancel)
+    # Admin exports, injected into handlers as `exporter`
+    dp["exporter"] = Exporter(api_service)
+    # Shared dashboard snapshot for /admin and /stats, plus pinned auto-refresh
+    dashboard = DashboardCache(
+        api_service,
+        fresh_for=settings.DASHBOARD_FRESH_SECONDS,
+        max_age=settings.DASHBOARD_MAX_AGE_SECONDS,
+        pin_interval=settings.DASHBOARD_PIN_INTERVAL_SECONDS,
+    )
+    dp["dashboard"] = dashboard
+    dp.shutdown.register(dashboard.close)
+    # Searchable local copy of the user list for /user
+    user_directory = UserDirectory(api_service, interval=settings.USER_DIRECTORY_SYNC_SECONDS)
+    dp["user_directory"] = user_directory
+    # Transaction ledger with precomputed revenue aggregates for /transactions
+    ledger = Ledger(api_service, shard_path(settings.LEDGER_PATH, shard), interval=settings.LEDGER_SYNC_SECONDS)
+    dp["ledger"] = ledger
+
+    async def start_syncs():
+        await ledger.load()
+        user_directory.start(sorted(settings.admin_ids))
+        ledger.start(sorted(settings.admin_ids))
+
+    dp.startup.register(start_syncs)
+
+    # Event-loop lag for /metrics, /perf and the admin panel
+    loop_watchdog = LoopWatchdog(
+        interval=settings.LOOP_LAG_INTERVAL_SECONDS,
+        threshold=settings.LOOP_STALL_THRESHOLD_MS / 1000,
+        slow_callback=settings.LOOP_SLOW_CALLBACK_MS / 1000,
+    )
+    dp["loop_watchdog"] = loop_watchdog
+    # On-demand sampling profiler for /profile
+    dp["profiler"] = SamplingProfiler()
+    # Memory samples for /metrics and /memprof, plus the structures worth sizing
+    memprof = MemoryProfiler(interval=settings.MEMORY_SAMPLE_SECONDS)
+    if isinstance(storage, SQLiteStorage):
+        memprof.register("fsm storage", storage.memory_targets)
+    elif isinstance(storage, MemoryStorage):
+        memprof.register("fsm storage", lambda: storage.storage)
+    memprof.register("shared state", shared_state.memory_targets)
+    memprof.register("user directory", user_directory.memory_targets)
+    memprof.register("ledger", ledger.memory_targets)
+    memprof.register("event log buffer", event_log.memory_targets)
+    memprof.register("latency histograms", PERF.memory_targets)
+    if recorder is not None:
+        memprof.register("traffic recorder", recorder.memory_targets)
+    dp["memprof"] = memprof
+    dp.startup.register(memprof.start)
+    dp.shutdown.register(memprof.close)
+    dp.startup.register(loop_watchdog.start)
+    dp.shutdown.register(loop_watchdog.close)
+    dp.shutdown.register(user_directory.close)
+    dp.shutdown.register(ledger.close)
+
+    include_routers(dp)
+
+    return bot, dp, api_service
+
+
+def include_routers(dp):
+    """Register every handler router on the dispatcher"""
     dp.include_router(user.router)
     dp.include_router(scanning.router)
     dp.include_router(payment.router)
     dp.include_router(admin.router)
-    
-    logger.info("✅ SPL Shield Bot is ready!")
-    logger.info("🚀 Starting polling...")
-    
+
+
+async def warm_up(bot, api_service, settings, timer):
+    """Warm the backend connection pool and validate the bot token concurrently"""
+    jobs = []
+    if api_service is not None and settings.BACKEND_WARM_CONNECTIONS > 0:
+        jobs.append(timer.timed("warm_backend", api_service.warm_up(settings.BACKEND_WARM_CONNECTIONS)))
+    if bot is not None:
+        jobs.append(timer.timed("validate_token", bot.get_me()))
+    for result in await asyncio.gather(*jobs, return_exceptions=True):
+        if isinstance(result, TelegramUnauthorizedError):
+            logger.critical("❌ BOT_TOKEN was rejected by Telegram")
+            raise result
+        if isinstance(result, BaseException):
+            # Polling and the first requests retry on their own; don't block start-up
+            logger.warning(f"Start-up check failed: {result!r}")
+
+
+def time_dispatcher_startup(dp, timer):
+    """Record the dispatcher's startup hooks as a phase (registered last, so it runs last)"""
+    began = time.perf_counter()
+
+    async def startup_done():
+        timer.record("dispatcher_startup", time.perf_counter() - began)
+
+    dp.startup.register(startup_done)
+
+
+async def main():
+    """Main bot entry point"""
+    timer = StartupTimer(_STARTED)
+    timer.record("imports", _IMPORTED - _STARTED)
+
+    # Load settings
+    settings = get_settings()
+
+    logger.info(f"🤖 Starting SPL Shield Bot...")
+    logger.info(f"📡 Backend API: {settings.API_BASE_URL}")
+    logger.info(f"👥 Admin IDs: {settings.admin_ids}")
+
+    if settings.BOT_WORKERS > 1:
+        await run_supervisor(settings, timer)
+        return
+
+    with timer.phase("build"):
+        bot, dp, api_service = build_bot(settings)
+    register_stats("splshield_settings", "Settings reloads", settings_store().stats, counters=("reloads", "failed_reloads"))
+
+    # Liveness follows the loop watchdog; readiness needs a working update source and backend
+    telegram_probe = TelegramProbe(on_ready=timer.ready)
+    bot.session.middleware(telegram_probe)
+    health = HealthServer(loop_watchdog=dp["loop_watchdog"])
+    health.add_check("telegram", telegram_probe.check)
+    health.add_check("backend", api_service.ping)
+    if settings.HEALTH_PORT:
+        await health.start(settings.HEALTH_HOST, settings.HEALTH_PORT)
+
+    metrics = None
+    if settings.METRICS_PORT:
+        metrics = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+
+    try:
+        # SIGHUP or an edited .env swaps in a new settings snapshot
+        settings_store().start(settings.SETTINGS_WATCH_SECONDS)
+        await warm_up(bot, api_service, settings, timer)
+        logger.info("✅ SPL Shield Bot is ready!")
+        time_dispatcher_startup(dp, timer)
+        if settings.BOT_MODE == "webhook":
+            logger.info("🌐 Starting webhook server...")
+            await run_webhook(
+                dp,
+                bot,
+                base_url=settings.WEBHOOK_BASE_URL,
+                path=settings.WEBHOOK_PATH,
+                secret_token=settings.WEBHOOK_SECRET,
+                host=settings.WEBHOOK_HOST,
+                port=settings.WEBHOOK_PORT,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+        else:
+            logger.info("🚀 Starting polling...")
+            # The executor runs handlers, so polling only waits for a free slot
+            await bot.delete_webhook()
+            await dp.start_polling(
+                bot,
+                handle_as_tasks=False,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+    finally:
+        await settings_store().close()
+        await health.close()
+        if metrics is not None:
+            await metrics.cleanup()
+        await bot.session.close()
+        await api_service.close()
+        await api_service.state.close()
+
+
+# === Sharded mode (BOT_WORKERS > 1) ===
+def shard_worker(shard: int, inbox, stats_queue):
+    """Worker process entry point: run one bot shard fed by the supervisor"""
+    # Ctrl+C reaches the whole process group; the supervisor decides when we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Forwarded SIGHUP (settings reload) must not kill a shard before its reload handler is installed
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    logs = start_logging(get_settings())
     try:
-        # Start polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        asyncio.run(_run_shard(shard, inbox, stats_queue))
     finally:
+        logs.stop()
+
+
+async def _run_shard(shard: int, inbox, stats_queue):
+    timer = StartupTimer(_STARTED)
+    settings = get_settings()
+    with timer.phase("build"):
+        bot, dp, api_service = build_bot(settings, shard=shard)
+    register_stats("splshield_settings", "Settings reloads", settings_store().stats, counters=("reloads", "failed_reloads"))
+    metrics = None
+    if settings.METRICS_PORT:
+        metrics = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + 1 + shard)
+    try:
+        # Each shard keeps its own settings snapshot; the supervisor forwards SIGHUP
+        settings_store().start(settings.SETTINGS_WATCH_SECONDS)
+        # The supervisor validates the token; shards only warm their own backend pool
+        await warm_up(None, api_service, settings, timer)
+        logger.info(f"✅ Shard {shard} ready")
+        timer.ready()
+        await serve_shard(dp, bot, shard, inbox, stats_queue)
+    finally:
+        await settings_store().close()
+        if metrics is not None:
+            await metrics.cleanup()
         await bot.session.close()
         await api_service.close()
+        await api_service.state.close()
+
+
+async def run_supervisor(settings, timer):
+    """Receive updates and route them to BOT_WORKERS shard processes by chat id"""
+    supervisor = ShardSupervisor(
+        settings.BOT_WORKERS,
+        shard_worker,
+        queue_size=settings.UPDATE_MAX_IN_FLIGHT,
+    )
+    supervisor.start()
+    # Only the handlers' update types are needed here; the shards build the real bot
+    routing = Dispatcher()
+    include_routers(routing)
+    allowed_updates = routing.resolve_used_update_types()
+    bot = Bot(token=settings.BOT_TOKEN)
+    telegram_probe = TelegramProbe(on_ready=timer.ready)
+    bot.session.middleware(telegram_probe)
+
+    # The supervisor exposes routing stats; each shard serves its own /metrics
+    REGISTRY.callback(
+        "splshield_shard_routed_total", "Updates routed to each shard.", "counter",
+        lambda: {(str(shard),): routed for shard, routed in enumerate(supervisor.routed)},
+        ["shard"],
+    )
+    REGISTRY.callback(
+        "splshield_shard_restarts_total", "Shard process restarts.", "counter",
+        lambda: {(str(shard),): restarts for shard, restarts in enumerate(supervisor.restarts)},
+        ["shard"],
+    )
+    # Executor counters reported by each shard every few seconds
+    for field, kind, documentation in (
+        ("received", "counter", "Updates received by each shard."),
+        ("submitted", "counter", "Updates submitted to each shard's executor."),
+        ("completed", "counter", "Updates each shard finished handling."),
+        ("failed", "counter", "Updates whose handling failed, per shard."),
+        ("in_flight", "gauge", "Updates being handled by each shard."),
+    ):
+        REGISTRY.callback(
+            f"splshield_shard_{field}_total" if kind == "counter" else f"splshield_shard_{field}",
+            documentation, kind,
+            lambda field=field: supervisor.shard_values(field),
+            ["shard"],
+        )
+    metrics = None
+    if settings.METRICS_PORT:
+        metrics = await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT)
+    # Shards serve no health endpoint; the supervisor reports whether they are all running
+    health = HealthServer()
+    health.add_check("telegram", telegram_probe.check)
+    health.add_check("shards", supervisor.check)
+    if settings.HEALTH_PORT:
+        await health.start(settings.HEALTH_HOST, settings.HEALTH_PORT)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    runner = None
+    tasks = [asyncio.create_task(supervisor.watch())]
+
+    def reload_settings():
+        settings_store().reload()
+        supervisor.signal_shards(signal.SIGHUP)
+
+    try:
+        settings_store().start(settings.SETTINGS_WATCH_SECONDS, on_sighup=reload_settings)
+        await warm_up(bot, None, settings, timer)
+        if settings.BOT_MODE == "webhook":
+            logger.info(f"🌐 Routing webhook updates to {settings.BOT_WORKERS} shards...")
+            runner = web.AppRunner(
+                supervisor.webhook_app(settings.WEBHOOK_PATH, settings.WEBHOOK_SECRET),
+                access_log=None,
+            )
+            await runner.setup()
+            await web.TCPSite(runner, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT).start()
+            await bot.set_webhook(
+                url=f"{settings.WEBHOOK_BASE_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+                secret_token=settings.WEBHOOK_SECRET,
+                allowed_updates=allowed_updates,
+            )
+        else:
+            logger.info(f"🚀 Polling and routing to {settings.BOT_WORKERS} shards...")
+            await bot.delete_webhook()
+            tasks.append(asyncio.create_task(
+                supervisor.poll(
+                    settings.BOT_TOKEN,
+                    allowed_updates=allowed_updates,
+                    on_poll=telegram_probe.poll_succeeded,
+                )
+            ))
+        await stop.wait()
+    finally:
+        logger.info("Stopping shards...")
+        for task in tasks:
+            task.cancel()
+        if runner is not None:
+            await runner.cleanup()
+        await settings_store().close()
+        await health.close()
+        if metrics is not None:
+            await metrics.cleanup()
+        await supervisor.close()
+        await bot.session.close()
+        logger.info(f"Shard stats: {supervisor.stats()['totals']}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logs = start_logging(get_settings())
+    try:
+        asyncio.run(main())
+    finally:
+        logs.stop()
@@ -1,4 +1,9 @@
 # === middleware/__init__.py ===
 from .auth import AuthMiddleware
+from .events import EventLogMiddleware
+from .metrics import UpdateMetricsMiddleware
+from .perf import PerfMiddleware
+from .recording import TrafficRecorderMiddleware
+from .tracing import TracingMiddleware
 
-__all__ = ['AuthMiddleware']
\ No newline at end of file
+__all__ = ['AuthMiddleware', 'EventLogMiddleware', 'PerfMiddleware', 'TracingMiddleware', 'TrafficRecorderMiddleware', 'UpdateMetricsMiddleware']
\ No newline at end of file
@@ -0,0 +1,43 @@
+# === middleware/events.py ===
+"""Event log middleware"""
+
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from services.event_log import KIND_CALLBACK, KIND_COMMAND
+
+
+class EventLogMiddleware(BaseMiddleware):
+    """Middleware to inject the event log and record commands and button presses"""
+    
+    def __init__(self, event_log):
+        self.event_log = event_log
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data['event_log'] = self.event_log
+        
+        if isinstance(event, CallbackQuery):
+            kind, name = KIND_CALLBACK, (event.data or "").split(":", 1)[0]
+        elif event.text and event.text.startswith("/"):
+            kind, name = KIND_COMMAND, event.text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+        else:
+            return await handler(event, data)
+        
+        started = time.monotonic()
+        try:
+            return await handler(event, data)
+        finally:
+            self.event_log.record(
+                kind,
+                name,
+                user_id=event.from_user.id if event.from_user else 0,
+                latency=time.monotonic() - started,
+            )
@@ -0,0 +1,22 @@
+# === middleware/metrics.py ===
+"""Metrics middleware"""
+
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import UPDATES
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware counting incoming updates by type"""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        UPDATES.labels(event.event_type).inc()
+        return await handler(event, data)
+
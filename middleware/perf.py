@@ -0,0 +1,52 @@
+# === middleware/perf.py ===
+"""Handler timing middleware"""
+
+import logging
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+
+from services.metrics import HANDLER_SECONDS
+from services.perf import KIND_HANDLER
+
+logger = logging.getLogger(__name__)
+
+
+class PerfMiddleware(BaseMiddleware):
+    """Middleware timing each handler once, for /perf and /metrics, and warning about slow handlers"""
+    
+    def __init__(self, recorder, slow_threshold: float):
+        self.recorder = recorder
+        self.slow_threshold = slow_threshold
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message | CallbackQuery,
+        data: Dict[str, Any]
+    ) -> Any:
+        data['perf'] = self.recorder
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            callback = getattr(data.get("handler"), "callback", None)
+            module = getattr(callback, "__module__", "unknown")
+            function = getattr(callback, "__name__", "unknown")
+            HANDLER_SECONDS.observe(elapsed, module, function)
+            name = f"{module.rsplit('.', 1)[-1]}.{function}"
+            self.recorder.record(KIND_HANDLER, name, elapsed)
+            if elapsed >= self.slow_threshold:
+                user = event.from_user
+                logger.warning(
+                    "slow_handler handler=%s duration_ms=%.0f threshold_ms=%.0f event=%s user_id=%s chat_id=%s",
+                    name,
+                    elapsed * 1000,
+                    self.slow_threshold * 1000,
+                    type(event).__name__,
+                    user.id if user else None,
+                    getattr(getattr(event, "chat", None), "id", None),
+                )
@@ -0,0 +1,37 @@
+# === middleware/recording.py ===
+"""Traffic recording middleware"""
+
+import time
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+class TrafficRecorderMiddleware(BaseMiddleware):
+    """Outer update middleware recording each update and its handling time for replay"""
+    
+    def __init__(self, recorder):
+        self.recorder = recorder
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        inner = event.event
+        user = getattr(inner, "from_user", None)
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.recorder.update(
+                event.event_type,
+                user.id if user else None,
+                text=getattr(inner, "text", None),
+                data=getattr(inner, "data", None),
+                seconds=time.perf_counter() - started,
+                started=started_at,
+            )
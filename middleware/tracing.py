@@ -0,0 +1,38 @@
+# === middleware/tracing.py ===
+"""Tracing middleware"""
+
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware opening one trace per update"""
+    
+    def __init__(self, tracer):
+        self.tracer = tracer
+        super().__init__()
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        inner = event.event
+        user = getattr(inner, "from_user", None)
+        chat = getattr(inner, "chat", None) or getattr(getattr(inner, "message", None), "chat", None)
+        attributes = {
+            "update_id": event.update_id,
+            "update_type": event.event_type,
+            "user_id": user.id if user else None,
+            "chat_id": chat.id if chat else None,
+        }
+        text = getattr(inner, "text", None)
+        if text and text.startswith("/"):
+            attributes["command"] = text.split(maxsplit=1)[0]
+        elif getattr(inner, "data", None):
+            attributes["callback"] = inner.data.split(":", 1)[0]
+        
+        with self.tracer.trace(f"update.{event.event_type}", **attributes):
+            return await handler(event, data)
@@ -1,4 +1,5 @@
 # === services/__init__.py ===
 from .api_service import APIService
+from .update_executor import KeyedExecutor, OrderedDispatcher
 
-__all__ = ['APIService']
\ No newline at end of file
+__all__ = ['APIService', 'KeyedExecutor', 'OrderedDispatcher']
\ No newline at end of file
@@ -1,23 +1,46 @@
 # === services/api_service.py ===
 """Async client for interacting with the SPL Shield backend API."""
 
+import asyncio
 import json
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 import aiohttp
 
+from services.metrics import BACKEND_REQUESTS, BACKEND_SECONDS, endpoint_label
+from services.perf import KIND_BACKEND, PERF
+from services.shared_state import SharedState
+from services.tracing import outbound_headers, start_span
+from services.traffic_recorder import TrafficRecorder
+
 logger = logging.getLogger(__name__)
 
 
 class APIService:
     """Wrapper around aiohttp to communicate with the backend."""
 
-    def __init__(self, base_url: str, host_header: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: str,
+        host_header: Optional[str] = None,
+        state: Optional[SharedState] = None,
+        scan_dedupe_ttl: float = 60.0,
+        recorder: Optional[TrafficRecorder] = None,
+        keepalive: float = 60.0,
+    ):
         self.base_url = base_url.rstrip("/")
         self.session: Optional[aiohttp.ClientSession] = None
-        self.access_token: Optional[str] = None
         self.host_header = host_header
+        # Per-user access tokens, cached scan results and single-flight locks
+        self.state = state or SharedState()
+        self.scan_dedupe_ttl = scan_dedupe_ttl
+        # Optional anonymised traffic recording (backend timings) for replay
+        self.recorder = recorder
+        # Idle pooled connections survive this long, so warmed ones are still there for the first users
+        self.keepalive = keepalive
+        self.last_response = 0.0
 
     # ------------------------------------------------------------------
     # Session / request helpers
@@ -25,17 +48,65 @@ class APIService:
     async def _get_session(self) -> aiohttp.ClientSession:
         if self.session is None or self.session.closed:
             timeout = aiohttp.ClientTimeout(total=30)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            connector = aiohttp.TCPConnector(keepalive_timeout=self.keepalive)
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
         return self.session
 
+    async def _probe(self, session: aiohttp.ClientSession, timeout: float) -> int:
+        """Status of a bare ``GET /`` (any status proves the backend answers)."""
+        async with session.get(f"{self.base_url}/", headers=self._with_auth(), timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            await response.read()
+            return response.status
+
+    async def warm_up(self, connections: int = 4, timeout: float = 5.0) -> int:
+        """Open ``connections`` pooled connections (DNS, TCP, TLS) before the first user needs one.
+
+        Returns how many succeeded; failures are logged, not raised.
+        """
+        session = await self._get_session()
+        results = await asyncio.gather(
+            *(self._probe(session, timeout) for _ in range(connections)),
+            return_exceptions=True,
+        )
+        failed = [result for result in results if isinstance(result, BaseException)]
+        if failed:
+            logger.warning("Backend warm-up: %d/%d connections failed: %s", len(failed), connections, failed[0])
+        else:
+            self.last_response = time.monotonic()
+        return connections - len(failed)
+
+    async def ping(self, fresh_for: float = 30.0, timeout: float = 3.0) -> Tuple[bool, str]:
+        """Readiness: a backend response within ``fresh_for`` seconds, else a probe."""
+        age = time.monotonic() - self.last_response
+        if self.last_response and age < fresh_for:
+            return True, f"last response {age:.1f}s ago"
+        try:
+            status = await self._probe(await self._get_session(), timeout)
+        except Exception as exc:  # noqa: BLE001
+            return False, f"unreachable: {type(exc).__name__}: {exc}"
+        self.last_response = time.monotonic()
+        return True, f"probe answered HTTP {status}"
+
     async def close(self) -> None:
         if self.session and not self.session.closed:
             await self.session.close()
 
-    def _with_auth(self, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    async def _token(self, telegram_id: Optional[int]) -> Optional[str]:
+        if telegram_id is None:
+            return None
+        return await self.state.get_session(telegram_id)
+
+    async def first_logged_in(self, telegram_ids: Iterable[int]) -> Optional[int]:
+        """First of ``telegram_ids`` with a live backend session (for background admin jobs)."""
+        for telegram_id in telegram_ids:
+            if await self.state.get_session(telegram_id):
+                return telegram_id
+        return None
+
+    def _with_auth(self, headers: Optional[Dict[str, str]] = None, token: Optional[str] = None) -> Dict[str, str]:
         merged = dict(headers or {})
-        if self.access_token and "Authorization" not in merged:
-            merged["Authorization"] = f"Bearer {self.access_token}"
+        if token and "Authorization" not in merged:
+            merged["Authorization"] = f"Bearer {token}"
         if self.host_header:
             merged.setdefault("Host", self.host_header)
         return merged
@@ -46,18 +117,27 @@ class APIService:
         endpoint: str,
         *,
         expected_status: Optional[List[int]] = None,
+        token: Optional[str] = None,
         **kwargs: Any,
     ) -> Dict[str, Any]:
         session = await self._get_session()
         url = f"{self.base_url}{endpoint}"
         expected = set(expected_status or [200, 201])
 
+        endpoint_name = endpoint_label(endpoint)
+        span = start_span(f"backend {method.upper()} {endpoint_name}", method=method.upper(), endpoint=endpoint_name)
         headers = kwargs.pop("headers", None)
-        kwargs["headers"] = self._with_auth(headers)
+        kwargs["headers"] = self._with_auth(headers, token)
+        kwargs["headers"].update(outbound_headers(span))
 
+        started = time.perf_counter()
+        status = 0
+        error = None
         try:
             logger.debug("%s %s", method.upper(), url)
             async with session.request(method, url, **kwargs) as response:
+                status = response.status
+                self.last_response = time.monotonic()
                 text = await response.text()
                 logger.debug("Response %s: %s", response.status, text[:600])
 
@@ -92,7 +172,18 @@ class APIService:
                 }
         except Exception as exc:  # noqa: BLE001
             logger.exception("Request failed: %s %s", method.upper(), url)
+            error = exc
             return {"ok": False, "status": 0, "data": None, "error": str(exc)}
+        finally:
+            elapsed = time.perf_counter() - started
+            if span is not None:
+                span.set(status=status)
+                span.end(error or (f"HTTP {status}" if status >= 500 else None))
+            BACKEND_SECONDS.observe(elapsed, method.upper(), endpoint_name)
+            PERF.record(KIND_BACKEND, f"{method.upper()} {endpoint_name}", elapsed)
+            BACKEND_REQUESTS.labels(method.upper(), endpoint_name, str(status)).inc()
+            if self.recorder is not None:
+                self.recorder.backend(f"{method.upper()} {endpoint_name}", status, elapsed)
 
     # ------------------------------------------------------------------
     # Authentication
@@ -131,7 +222,7 @@ class APIService:
         *,
         email: str,
         password: str,
-        telegram_id: int,  # noqa: ARG002 - future use
+        telegram_id: int,
     ) -> Dict[str, Any]:
         form = aiohttp.FormData()
         form.add_field("email", email)
@@ -144,9 +235,9 @@ class APIService:
         payload = result["data"] or {}
         token = payload.get("access_token")
         if token:
-            self.access_token = token
+            await self.state.save_session(telegram_id, token)
 
-        overview = await self.fetch_account_overview()
+        overview = await self.fetch_account_overview(token=token)
         logger.debug("Login overview payload: %s", overview)
 
         user_info = self._compose_profile(overview, fallback_email=email)
@@ -173,17 +264,19 @@ class APIService:
             "message": payload.get("message", "Login successful"),
         }
 
-    async def logout(self, telegram_id: int) -> Dict[str, Any]:  # noqa: ARG002
-        self.access_token = None
+    async def logout(self, telegram_id: int) -> Dict[str, Any]:
+        await self.state.drop_session(telegram_id)
         return {"success": True, "message": "Logged out"}
 
     # ------------------------------------------------------------------
     # Account helpers
     # ------------------------------------------------------------------
-    async def fetch_account_overview(self) -> Dict[str, Any]:
+    async def fetch_account_overview(self, *, token: Optional[str]) -> Dict[str, Any]:
         """Fetch profile + credit summary for the authenticated user."""
-        profile_resp = await self._request("GET", "/api/users/me")
-        credits_resp = await self._request("GET", "/api/payment/credits")
+        profile_resp, credits_resp = await asyncio.gather(
+            self._request("GET", "/api/users/me", token=token),
+            self._request("GET", "/api/payment/credits", token=token),
+        )
 
         profile_payload = {}
         if profile_resp["ok"]:
@@ -231,8 +324,8 @@ class APIService:
             "scans_remaining": scans_remaining,
         }
 
-    async def get_user_profile(self, telegram_id: int) -> Optional[Dict[str, Any]]:  # noqa: ARG002
-        overview = await self.fetch_account_overview()
+    async def get_user_profile(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        overview = await self.fetch_account_overview(token=await self._token(telegram_id))
         logger.debug("Profile overview payload: %s", overview)
         return self._compose_profile(overview)
 
@@ -283,14 +376,23 @@ class APIService:
 
         return None
 
-    async def scan_address(self, *, address: str, tier: str, telegram_id: int) -> Dict[str, Any]:  # noqa: ARG002
+    async def scan_address(self, *, address: str, tier: str, telegram_id: int) -> Dict[str, Any]:
+        """Scan an address; repeated taps by the same user share one backend scan."""
+        return await self.state.single_flight(
+            f"scan:{telegram_id}:{tier}:{address}",
+            lambda: self._scan_address(address=address, tier=tier, telegram_id=telegram_id),
+            ttl=self.scan_dedupe_ttl,
+            should_cache=lambda result: bool(result.get("success")),
+        )
+
+    async def _scan_address(self, *, address: str, tier: str, telegram_id: int) -> Dict[str, Any]:
         payload = {
             "address": address,
             "scan_type": "auto",
             "tier": tier,
         }
 
-        result = await self._request("POST", "/api/scan", json=payload)
+        result = await self._request("POST", "/api/scan", json=payload, token=await self._token(telegram_id))
         if not result["ok"]:
             error_text = result.get("error") or "Scan failed"
             if result["status"] == 402:
@@ -313,10 +415,11 @@ class APIService:
 
         return {"success": True, "data": normalised}
 
-    async def get_scan_history(self, *, telegram_id: int, limit: int = 10) -> List[Dict[str, Any]]:  # noqa: ARG002
+    async def get_scan_history(self, *, telegram_id: int, limit: int = 10) -> List[Dict[str, Any]]:
         result = await self._request(
             "GET",
             f"/api/scan/history?limit={limit}",
+            token=await self._token(telegram_id),
         )
 
         if not result["ok"]:
@@ -331,12 +434,17 @@ class APIService:
     # ------------------------------------------------------------------
     # Payments / credits
     # ------------------------------------------------------------------
-    async def verify_payment(self, *, tx_signature: str, tier: str) -> Dict[str, Any]:
+    async def verify_payment(self, *, tx_signature: str, tier: str, telegram_id: Optional[int] = None) -> Dict[str, Any]:
         form = aiohttp.FormData()
         form.add_field("tier", tier)
         form.add_field("transaction_signature", tx_signature)
 
-        result = await self._request("POST", "/api/payment/purchase", data=form)
+        result = await self._request(
+            "POST",
+            "/api/payment/purchase",
+            data=form,
+            token=await self._token(telegram_id),
+        )
         if result["ok"]:
             payload = result.get("data") or {}
             return {
@@ -352,25 +460,93 @@ class APIService:
     # ------------------------------------------------------------------
     # Admin utilities
     # ------------------------------------------------------------------
-    async def get_admin_stats(self) -> Dict[str, Any]:
-        result = await self._request("GET", "/api/admin/dashboard/dashboard-overview")
+    async def get_admin_stats(self, telegram_id: Optional[int] = None) -> Dict[str, Any]:
+        result = await self._request(
+            "GET",
+            "/api/admin/dashboard/dashboard-overview",
+            token=await self._token(telegram_id),
+        )
         if not result["ok"]:
             return {}
         payload = result.get("data") or {}
         return payload.get("overview", payload)
 
-    async def get_detailed_stats(self) -> Dict[str, Any]:
-        return await self.get_admin_stats()
+    async def get_detailed_stats(self, telegram_id: Optional[int] = None) -> Dict[str, Any]:
+        return await self.get_admin_stats(telegram_id)
 
-    async def get_all_users(self) -> List[Dict[str, Any]]:
-        result = await self._request("GET", "/api/admin/dashboard/users")
+    async def get_all_users(self, telegram_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        result = await self._request(
+            "GET",
+            "/api/admin/dashboard/users",
+            token=await self._token(telegram_id),
+        )
         if not result["ok"]:
             return []
         data = result.get("data") or {}
         return data.get("users", data.get("results", [])) or []
 
-    async def get_transactions(self) -> List[Dict[str, Any]]:
-        result = await self._request("GET", "/api/payment/credits")
+    async def get_admin_page(
+        self,
+        resource: str,
+        *,
+        page: int,
+        limit: int,
+        telegram_id: Optional[int] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """Fetch one page of an admin list (``users``, ``scans``, ``transactions``) as ``(rows, has_more)``; ``None`` on error."""
+        result = await self._request(
+            "GET",
+            f"/api/admin/dashboard/{resource}",
+            params={**(params or {}), "page": page, "limit": limit},
+            token=await self._token(telegram_id),
+        )
+        if not result["ok"]:
+            return None
+        data = result.get("data") or {}
+        rows = data.get(resource, data.get("results", [])) or []
+        pages = data.get("pages") or data.get("total_pages")
+        has_more = page < int(pages) if pages else len(rows) >= limit
+        return rows, has_more
+
+    async def get_users_page(
+        self,
+        *,
+        page: int,
+        limit: int,
+        telegram_id: Optional[int] = None,
+    ) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """Fetch one page of the admin user list as ``(users, has_more)``; ``None`` on error."""
+        return await self.get_admin_page("users", page=page, limit=limit, telegram_id=telegram_id)
+
+    async def get_users_page_cached(
+        self,
+        *,
+        page: int,
+        limit: int,
+        telegram_id: Optional[int] = None,
+        ttl: float = 30.0,
+    ) -> Optional[Tuple[List[Dict[str, Any]], bool]]:
+        """Like :meth:`get_users_page`, shared briefly between admins and prefetches."""
+
+        async def fetch() -> Optional[Dict[str, Any]]:
+            result = await self.get_users_page(page=page, limit=limit, telegram_id=telegram_id)
+            if result is None:
+                return None
+            return {"users": result[0], "has_more": result[1]}
+
+        cached = await self.state.single_flight(
+            f"users_page:{limit}:{page}",
+            fetch,
+            ttl=ttl,
+            should_cache=lambda result: result is not None,
+        )
+        if cached is None:
+            return None
+        return cached["users"], cached["has_more"]
+
+    async def get_transactions(self, telegram_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        result = await self._request("GET", "/api/payment/credits", token=await self._token(telegram_id))
         if result["ok"]:
             data = result.get("data") or {}
             txs = data.get("transactions")
@@ -0,0 +1,368 @@
+"""Admin broadcasts: stream recipients page by page and send at the safe rate.
+
+With ``BOT_WORKERS`` > 1 every shard shares the checkpoint file, so any admin
+chat can see, resume or cancel a broadcast. A lock file next to the
+checkpoint (``flock``, released by the kernel if the process dies) ensures
+only one process sends at a time. A shard that does not own the running
+broadcast stops it by creating a cancel marker, which the owner checks after
+every chunk.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+
+from services.outbound import bulk_sends
+from services.tracing import detached_task
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastCheckpoint:
+    """Everything needed to resume a broadcast after an interruption."""
+
+    broadcast_id: str
+    text: str
+    admin_id: int
+    admin_chat_id: int
+    progress_message_id: Optional[int] = None
+    page: int = 1
+    offset: int = 0  # recipients of ``page`` already handled
+    sent: int = 0
+    blocked: int = 0
+    failed: int = 0
+    skipped: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished: bool = False
+
+
+class Broadcaster:
+    """Runs at most one broadcast at a time, checkpointing progress to disk.
+
+    Recipients are fetched one backend page at a time and sent in chunks of
+    ``concurrency``, so memory use does not depend on the size of the user
+    base. Send rate and 429 handling come from the bot's outbound limiter;
+    broadcast sends use the bulk lane so interactive replies go first.
+    """
+
+    def __init__(
+        self,
+        api_service,
+        checkpoint_path: str,
+        *,
+        page_size: int = 500,
+        concurrency: int = 30,
+        progress_interval: float = 3.0,
+    ):
+        self.api_service = api_service
+        self.checkpoint_path = checkpoint_path
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self.lock_path = f"{checkpoint_path}.lock"
+        self.cancel_path = f"{checkpoint_path}.cancel"
+        self._task: Optional[asyncio.Task] = None
+        self._lock_fd: Optional[int] = None
+
+    # ------------------------------------------------------------------
+    # Cross-process lock
+    # ------------------------------------------------------------------
+    def _try_lock(self) -> Optional[int]:
+        """Take the broadcast lock without blocking; returns its fd, ``None`` if held elsewhere."""
+        directory = os.path.dirname(self.lock_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+        return fd
+
+    def _acquire(self) -> bool:
+        fd = self._try_lock()
+        if fd is None:
+            return False
+        self._lock_fd = fd
+        # A stop requested for an earlier broadcast must not cancel this one
+        with suppress(FileNotFoundError):
+            os.remove(self.cancel_path)
+        return True
+
+    def _release(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # closing drops the flock
+            self._lock_fd = None
+
+    def _held_elsewhere(self) -> bool:
+        if self.running:
+            return False
+        fd = self._try_lock()
+        if fd is None:
+            return True
+        os.close(fd)
+        return False
+
+    async def active(self) -> bool:
+        """Whether a broadcast is running in this process or any other shard."""
+        return self.running or await asyncio.to_thread(self._held_elsewhere)
+
+    def _cancel_requested(self) -> bool:
+        return os.path.exists(self.cancel_path)
+
+    def _request_cancel(self) -> None:
+        with open(self.cancel_path, "w", encoding="utf-8"):
+            pass
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def load_checkpoint(self) -> Optional[BroadcastCheckpoint]:
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as fh:
+                checkpoint = BroadcastCheckpoint(**json.load(fh))
+        except FileNotFoundError:
+            return None
+        except (ValueError, TypeError):
+            logger.exception("Ignoring unreadable broadcast checkpoint %s", self.checkpoint_path)
+            return None
+        return None if checkpoint.finished else checkpoint
+
+    def _save_checkpoint(self, checkpoint: BroadcastCheckpoint) -> None:
+        directory = os.path.dirname(self.checkpoint_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(asdict(checkpoint), fh)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def _checkpoint(self, checkpoint: BroadcastCheckpoint) -> None:
+        await asyncio.to_thread(self._save_checkpoint, checkpoint)
+
+    def discard_checkpoint(self) -> None:
+        try:
+            os.remove(self.checkpoint_path)
+        except FileNotFoundError:
+            pass
+
+    async def discard(self) -> bool:
+        """Delete an interrupted broadcast's checkpoint; ``False`` if a broadcast is running."""
+        if self.running or not await asyncio.to_thread(self._acquire):
+            return False
+        try:
+            await asyncio.to_thread(self.discard_checkpoint)
+        finally:
+            self._release()
+        return True
+
+    # ------------------------------------------------------------------
+    # Control
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def new_checkpoint(self, text: str, admin_id: int, admin_chat_id: int) -> BroadcastCheckpoint:
+        return BroadcastCheckpoint(
+            broadcast_id=uuid.uuid4().hex[:8],
+            text=text,
+            admin_id=admin_id,
+            admin_chat_id=admin_chat_id,
+        )
+
+    async def preview(self, bot: Bot, chat_id: int, text: str) -> Optional[str]:
+        """Send ``text`` to the admin first; returns Telegram's error if it is rejected.
+
+        Every recipient gets the same text, so markup Telegram cannot parse
+        would fail each send of the broadcast.
+        """
+        try:
+            await bot.send_message(chat_id, text)
+        except TelegramBadRequest as exc:
+            return exc.message
+        except (TelegramAPIError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            return f"{type(exc).__name__}: {exc}"
+        return None
+
+    async def start(self, bot: Bot, checkpoint: BroadcastCheckpoint) -> bool:
+        """Start or resume ``checkpoint``; ``False`` if a broadcast is already running in any shard."""
+        if self.running or not await asyncio.to_thread(self._acquire):
+            return False
+        try:
+            await self._checkpoint(checkpoint)
+        except BaseException:
+            self._release()
+            raise
+        self._task = detached_task(self._run(bot, checkpoint))
+        return True
+
+    async def cancel(self) -> bool:
+        """Stop the running broadcast, keeping its checkpoint for /broadcast resume.
+
+        A broadcast owned by another shard stops after its current chunk.
+        """
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            return True
+        if await asyncio.to_thread(self._held_elsewhere):
+            await asyncio.to_thread(self._request_cancel)
+            return True
+        return False
+
+    # ------------------------------------------------------------------
+    # Sending
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _chat_id(user: Dict[str, Any]) -> Optional[int]:
+        """The user's Telegram chat id, or ``None`` when missing or malformed."""
+        try:
+            return int(user.get("telegram_id")) or None
+        except (TypeError, ValueError):
+            return None
+
+    async def _send_one(self, bot: Bot, chat_id: int, text: str) -> str:
+        try:
+            await bot.send_message(chat_id, text)
+            return "sent"
+        except TelegramForbiddenError:
+            return "blocked"
+        except (TelegramAPIError, aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            # One recipient must never abort the chunk: its offset is not saved yet
+            logger.info("Broadcast to %s failed: %r", chat_id, exc)
+            return "failed"
+
+    def _progress_text(self, checkpoint: BroadcastCheckpoint, done: bool = False) -> str:
+        elapsed = max(time.time() - checkpoint.started_at, 1e-6)
+        delivered = checkpoint.sent + checkpoint.blocked + checkpoint.failed
+        title = "✅ <b>Broadcast finished</b>" if done else "📣 <b>Broadcast in progress</b>"
+        return (
+            f"{title} <code>{checkpoint.broadcast_id}</code>\n\n"
+            f"• Sent: {checkpoint.sent}\n"
+            f"• Blocked bot: {checkpoint.blocked}\n"
+            f"• Failed: {checkpoint.failed}\n"
+            f"• No valid Telegram ID: {checkpoint.skipped}\n"
+            f"• Page: {checkpoint.page}\n"
+            f"• Rate: {delivered / elapsed:.1f} msg/s\n"
+            f"• Elapsed: {int(elapsed)}s"
+        )
+
+    async def _report(self, bot: Bot, checkpoint: BroadcastCheckpoint, done: bool = False) -> None:
+        text = self._progress_text(checkpoint, done)
+        try:
+            if checkpoint.progress_message_id is None:
+                message = await bot.send_message(checkpoint.admin_chat_id, text)
+                checkpoint.progress_message_id = message.message_id
+            else:
+                await bot.edit_message_text(
+                    text,
+                    chat_id=checkpoint.admin_chat_id,
+                    message_id=checkpoint.progress_message_id,
+                )
+        except TelegramBadRequest as exc:
+            logger.debug("Broadcast progress update skipped: %s", exc)
+
+    async def _fetch_page(self, checkpoint: BroadcastCheckpoint, attempts: int = 3):
+        for attempt in range(attempts):
+            page = await self.api_service.get_users_page(
+                page=checkpoint.page,
+                limit=self.page_size,
+                telegram_id=checkpoint.admin_id,
+            )
+            if page is not None:
+                return page
+            await asyncio.sleep(2 ** attempt)
+        return None
+
+    async def _run(self, bot: Bot, checkpoint: BroadcastCheckpoint) -> None:
+        try:
+            await self._broadcast(bot, checkpoint)
+        except asyncio.CancelledError:
+            logger.info("Broadcast %s cancelled at page %d", checkpoint.broadcast_id, checkpoint.page)
+            raise
+        except Exception:  # noqa: BLE001
+            logger.exception("Broadcast %s crashed; checkpoint kept for resume", checkpoint.broadcast_id)
+        finally:
+            self._release()
+
+    async def _broadcast(self, bot: Bot, checkpoint: BroadcastCheckpoint) -> None:
+        logger.info("Broadcast %s started at page %d", checkpoint.broadcast_id, checkpoint.page)
+        await self._report(bot, checkpoint)
+        last_report = time.monotonic()
+        with bulk_sends():
+            while True:
+                page = await self._fetch_page(checkpoint)
+                if page is None:
+                    logger.error("Broadcast %s paused: user list unavailable", checkpoint.broadcast_id)
+                    await bot.send_message(
+                        checkpoint.admin_chat_id,
+                        "⚠️ Broadcast paused: could not load the user list. Use /broadcast resume to retry.",
+                    )
+                    return
+                users, has_more = page
+                recipients = users[checkpoint.offset:]
+                for start in range(0, len(recipients), self.concurrency):
+                    chunk = recipients[start:start + self.concurrency]
+                    # Ids are parsed up front so a malformed one cannot abort the chunk
+                    chat_ids = [self._chat_id(user) for user in chunk]
+                    outcomes = await asyncio.gather(*(
+                        self._send_one(bot, chat_id, checkpoint.text)
+                        for chat_id in chat_ids
+                        if chat_id is not None
+                    ))
+                    checkpoint.skipped += chat_ids.count(None)
+                    for outcome in outcomes:
+                        setattr(checkpoint, outcome, getattr(checkpoint, outcome) + 1)
+                    checkpoint.offset += len(chunk)
+                    await self._checkpoint(checkpoint)
+                    if await asyncio.to_thread(self._cancel_requested):
+                        logger.info("Broadcast %s stopped from another shard at page %d", checkpoint.broadcast_id, checkpoint.page)
+                        await self._report(bot, checkpoint)
+                        return
+
+                    if time.monotonic() - last_report >= self.progress_interval:
+                        last_report = time.monotonic()
+                        await self._report(bot, checkpoint)
+
+                if not has_more:
+                    break
+                checkpoint.page += 1
+                checkpoint.offset = 0
+                await self._checkpoint(checkpoint)
+
+        checkpoint.finished = True
+        await self._checkpoint(checkpoint)
+        await self._report(bot, checkpoint, done=True)
+        logger.info("Broadcast %s finished: %s", checkpoint.broadcast_id, self.summary(checkpoint))
+
+    @staticmethod
+    def summary(checkpoint: BroadcastCheckpoint) -> Dict[str, Any]:
+        return {
+            "sent": checkpoint.sent,
+            "blocked": checkpoint.blocked,
+            "failed": checkpoint.failed,
+            "skipped": checkpoint.skipped,
+            "page": checkpoint.page,
+        }
@@ -0,0 +1,157 @@
+"""Shared stale-while-revalidate cache for the admin dashboard overview.
+
+The overview endpoint runs heavy aggregation queries, so the bot keeps one
+snapshot in the shared state (Redis when configured) for every admin and
+replica. A snapshot older than ``fresh_for`` is still served straight away,
+and a single background refresh replaces it. Callers only wait for the
+backend when no snapshot exists or the last one is older than ``max_age``.
+Pinned dashboards are edited on a fixed interval from the same snapshot.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+
+from services.metrics import CACHE_LOOKUPS
+from services.outbound import bulk_sends
+from services.tracing import detached_task
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = "dashboard:overview"
+REFRESH_KEY = "dashboard:refresh"
+
+Snapshot = Tuple[Dict[str, Any], float]
+
+
+@dataclass
+class _Pin:
+    chat_id: int
+    message_id: int
+    admin_id: int
+    task: Optional[asyncio.Task] = None
+
+
+class DashboardCache:
+    """Serves the latest overview snapshot and keeps it fresh in the background."""
+
+    def __init__(
+        self,
+        api_service,
+        *,
+        fresh_for: float = 30.0,
+        max_age: float = 600.0,
+        pin_interval: float = 60.0,
+    ):
+        self.api_service = api_service
+        self.fresh_for = fresh_for
+        self.max_age = max_age
+        self.pin_interval = pin_interval
+        self._refreshes: Set[asyncio.Task] = set()
+        self._pins: Dict[int, _Pin] = {}
+
+    @property
+    def state(self):
+        return self.api_service.state
+
+    # ------------------------------------------------------------------
+    # Snapshot
+    # ------------------------------------------------------------------
+    async def _fetch(self, telegram_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        overview = await self.api_service.get_admin_stats(telegram_id)
+        if not overview:
+            return None
+        snapshot = {"overview": overview, "updated_at": time.time()}
+        await self.state.set_cached(SNAPSHOT_KEY, snapshot, self.max_age)
+        return snapshot
+
+    async def _revalidate(self, telegram_id: Optional[int]) -> None:
+        # The refresh marker is cached for `fresh_for`, so one replica refreshes per period
+        try:
+            await self.state.single_flight(
+                REFRESH_KEY,
+                lambda: self._fetch(telegram_id),
+                ttl=self.fresh_for,
+                should_cache=lambda result: result is not None,
+            )
+        except Exception:  # noqa: BLE001
+            logger.exception("Dashboard refresh failed; serving the previous snapshot")
+
+    def _schedule_refresh(self, telegram_id: Optional[int]) -> None:
+        if self._refreshes:
+            return
+        task = detached_task(self._revalidate(telegram_id))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def get(self, telegram_id: Optional[int] = None) -> Optional[Snapshot]:
+        """Return ``(overview, updated_at)``, or ``None`` if the backend has nothing."""
+        snapshot = await self.state.get_cached(SNAPSHOT_KEY)
+        if snapshot is None:
+            CACHE_LOOKUPS.labels("dashboard_snapshot", "miss").inc()
+            snapshot = await self.state.single_flight(
+                REFRESH_KEY,
+                lambda: self._fetch(telegram_id),
+                ttl=self.fresh_for,
+                should_cache=lambda result: result is not None,
+            )
+            if snapshot is None:
+                return None
+        elif time.time() - snapshot["updated_at"] >= self.fresh_for:
+            CACHE_LOOKUPS.labels("dashboard_snapshot", "stale").inc()
+            self._schedule_refresh(telegram_id)
+        else:
+            CACHE_LOOKUPS.labels("dashboard_snapshot", "hit").inc()
+        return snapshot["overview"], snapshot["updated_at"]
+
+    # ------------------------------------------------------------------
+    # Pinned dashboards
+    # ------------------------------------------------------------------
+    def pin(self, bot: Bot, chat_id: int, message_id: int, admin_id: int, render: Callable[[Snapshot], str]) -> None:
+        """Edit ``message_id`` with a fresh rendering every ``pin_interval`` seconds."""
+        self.unpin(chat_id)
+        pin = _Pin(chat_id=chat_id, message_id=message_id, admin_id=admin_id)
+        pin.task = detached_task(self._run_pin(bot, pin, render))
+        self._pins[chat_id] = pin
+
+    def unpin(self, chat_id: int) -> Optional[int]:
+        """Stop refreshing the chat's pinned dashboard; returns its message id."""
+        pin = self._pins.pop(chat_id, None)
+        if pin is None:
+            return None
+        if pin.task is not None:
+            pin.task.cancel()
+        return pin.message_id
+
+    async def _run_pin(self, bot: Bot, pin: _Pin, render: Callable[[Snapshot], str]) -> None:
+        # The panel shows the snapshot's age, so every interval is a real edit
+        while True:
+            await asyncio.sleep(self.pin_interval)
+            try:
+                snapshot = await self.get(pin.admin_id)
+                if snapshot is None:
+                    continue
+                with bulk_sends():
+                    await bot.edit_message_text(render(snapshot), chat_id=pin.chat_id, message_id=pin.message_id)
+            except TelegramBadRequest as exc:
+                if "not modified" in str(exc):
+                    continue
+                logger.info("Stopping pinned dashboard in chat %s: %s", pin.chat_id, exc)
+                if self._pins.get(pin.chat_id) is pin:
+                    del self._pins[pin.chat_id]
+                return
+            except Exception:  # noqa: BLE001
+                logger.exception("Pinned dashboard refresh failed in chat %s", pin.chat_id)
+
+    async def close(self) -> None:
+        tasks = [pin.task for pin in self._pins.values() if pin.task is not None]
+        self._pins.clear()
+        for task in tasks:
+            task.cancel()
+        tasks.extend(self._refreshes)
+        await asyncio.gather(*tasks, return_exceptions=True)
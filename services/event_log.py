@@ -0,0 +1,367 @@
+"""Append-only columnar event log for bot-side analytics.
+
+Events (commands, callbacks, scans, funnel steps) are buffered in ``array``
+columns and appended in batches to fixed-width column files, one directory per
+segment. Readers memory-map the columns and aggregate them with C-level
+iteration (``itertools.compress``, ``map``, ``Counter``), so queries over
+millions of events avoid per-event Python code.
+
+Layout::
+
+    <root>/<writer>/names.json           interned command / step names
+    <root>/<writer>/seg-000001/<col>.col one file per column
+
+Each process writes under its own ``writer`` directory (``main``,
+``shard0``...), and queries read all of them.
+"""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import compress
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("ts", "I"),  # unix seconds
+    ("kind", "B"),
+    ("name", "H"),  # interned name code
+    ("tier", "B"),
+    ("risk", "B"),
+    ("user", "I"),  # crc32 of the Telegram user id
+    ("latency_ms", "I"),
+)
+
+KIND_COMMAND = 1
+KIND_CALLBACK = 2
+KIND_SCAN = 3
+KIND_FUNNEL = 4
+
+TIERS = ("unknown", "free", "premium", "mvp")
+RISKS = ("unknown", "low", "medium", "high", "critical")
+FUNNEL_STEPS = ("start", "registered", "logged_in", "scanned", "paid")
+
+MAX_NAMES = 1024
+_OTHER = "other"
+
+
+def _code(values: Tuple[str, ...], value: Optional[str]) -> int:
+    try:
+        return values.index((value or "").lower())
+    except ValueError:
+        return 0
+
+
+def _mask(column: memoryview, value: int) -> bytes:
+    """Byte mask (1 where ``column == value``) for a uint8 column, built in C."""
+    table = bytearray(256)
+    table[value] = 1
+    return bytes(column).translate(table)
+
+
+class _Segment:
+    """Read-only, memory-mapped view of one segment's columns."""
+
+    def __init__(self, path: str):
+        self._maps: List[mmap.mmap] = []
+        self.columns: Dict[str, memoryview] = {}
+        rows = None
+        for name, typecode in COLUMNS:
+            col_path = os.path.join(path, f"{name}.col")
+            size = os.path.getsize(col_path) if os.path.exists(col_path) else 0
+            if not size:
+                rows = 0
+                break
+            with open(col_path, "rb") as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps.append(mm)
+            view = memoryview(mm).cast(typecode)
+            self.columns[name] = view
+            rows = len(view) if rows is None else min(rows, len(view))
+        self.rows = rows or 0
+        # A crash mid-flush can leave columns of different lengths
+        self.columns = {name: view[:self.rows] for name, view in self.columns.items()}
+
+    def since(self, ts: int) -> Dict[str, memoryview]:
+        """Column slices for events at or after ``ts`` (events are appended in time order)."""
+        if not self.rows:
+            return {}
+        start = bisect_left(self.columns["ts"], ts)
+        return {name: view[start:] for name, view in self.columns.items()}
+
+    def close(self) -> None:
+        for view in self.columns.values():
+            view.release()
+        self.columns = {}
+        for mm in self._maps:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # still referenced by a live slice; freed with it
+        self._maps = []
+
+
+class EventLog:
+    """Buffered writer and memory-mapped reader for the event log."""
+
+    def __init__(
+        self,
+        root: str,
+        *,
+        writer: str = "main",
+        batch_size: int = 4096,
+        flush_interval: float = 5.0,
+        segment_rows: int = 1 << 20,
+    ):
+        self.root = root
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.directory = os.path.join(root, writer)
+
+        self._buffer = self._new_buffer()
+        self._names: List[str] = []
+        self._name_codes: Dict[str, int] = {}
+        self._names_dirty = False
+        self._segment = 0
+        self._segment_rows = 0
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock = asyncio.Lock()
+        self.recorded = 0
+        self._open()
+
+    @staticmethod
+    def _new_buffer() -> Dict[str, array]:
+        return {name: array(typecode) for name, typecode in COLUMNS}
+
+    # ------------------------------------------------------------------
+    # Writer state on disk
+    # ------------------------------------------------------------------
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"seg-{segment:06d}")
+
+    def _open(self) -> None:
+        """Pick up names and the last segment, trimming a torn final batch."""
+        os.makedirs(self.directory, exist_ok=True)
+        names_path = os.path.join(self.directory, "names.json")
+        if os.path.exists(names_path):
+            with open(names_path, "r", encoding="utf-8") as fh:
+                self._names = json.load(fh)
+        if not self._names:
+            self._names = [""]
+            self._names_dirty = True
+        self._name_codes = {name: code for code, name in enumerate(self._names)}
+
+        segments = sorted(entry for entry in os.listdir(self.directory) if entry.startswith("seg-"))
+        if not segments:
+            self._segment = 1
+            return
+        self._segment = int(segments[-1][4:])
+        path = self._segment_path(self._segment)
+        lengths = []
+        for name, typecode in COLUMNS:
+            col_path = os.path.join(path, f"{name}.col")
+            size = os.path.getsize(col_path) if os.path.exists(col_path) else 0
+            lengths.append(size // array(typecode).itemsize)
+        self._segment_rows = min(lengths)
+        for name, typecode in COLUMNS:
+            col_path = os.path.join(path, f"{name}.col")
+            if os.path.exists(col_path):
+                os.truncate(col_path, self._segment_rows * array(typecode).itemsize)
+
+    def _write(self, buffer: Dict[str, array], names: Optional[List[str]]) -> None:
+        if names is not None:
+            tmp_path = os.path.join(self.directory, "names.json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as fh:
+                json.dump(names, fh)
+            os.replace(tmp_path, os.path.join(self.directory, "names.json"))
+
+        total = len(buffer["ts"])
+        offset = 0
+        while offset < total:
+            if self._segment_rows >= self.segment_rows:
+                self._segment += 1
+                self._segment_rows = 0
+            take = min(total - offset, self.segment_rows - self._segment_rows)
+            path = self._segment_path(self._segment)
+            os.makedirs(path, exist_ok=True)
+            for name, column in buffer.items():
+                with open(os.path.join(path, f"{name}.col"), "ab") as fh:
+                    column[offset:offset + take].tofile(fh)
+            self._segment_rows += take
+            offset += take
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+    def _intern(self, name: str) -> int:
+        code = self._name_codes.get(name)
+        if code is None:
+            if len(self._names) >= MAX_NAMES:
+                name = _OTHER
+                code = self._name_codes.get(name)
+            if code is None:
+                code = len(self._names)
+                self._names.append(name)
+                self._name_codes[name] = code
+                self._names_dirty = True
+        return code
+
+    def record(
+        self,
+        kind: int,
+        name: str = "",
+        *,
+        user_id: int = 0,
+        tier: Optional[str] = None,
+        risk: Optional[str] = None,
+        latency: float = 0.0,
+    ) -> None:
+        """Buffer one event; it reaches disk with the next batch."""
+        buffer = self._buffer
+        buffer["ts"].append(int(time.time()))
+        buffer["kind"].append(kind)
+        buffer["name"].append(self._intern(name))
+        buffer["tier"].append(_code(TIERS, tier))
+        buffer["risk"].append(_code(RISKS, risk))
+        buffer["user"].append(zlib.crc32(str(user_id).encode()) if user_id else 0)
+        buffer["latency_ms"].append(min(int(latency * 1000), 0xFFFFFFFF))
+        self.recorded += 1
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if len(buffer["ts"]) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _flush_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("Event log flush failed")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            buffer, self._buffer = self._buffer, self._new_buffer()
+            names = list(self._names) if self._names_dirty else None
+            self._names_dirty = False
+            if not buffer["ts"] and names is None:
+                return
+            await asyncio.get_running_loop().run_in_executor(None, self._write, buffer, names)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """The unflushed buffer and the name dictionary."""
+        return self._buffer, self._names, self._name_codes
+
+    # ------------------------------------------------------------------
+    # Queries (run on a worker thread)
+    # ------------------------------------------------------------------
+    def _segments(self) -> Iterator[Tuple[List[str], _Segment]]:
+        if not os.path.isdir(self.root):
+            return
+        for writer in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, writer)
+            names_path = os.path.join(directory, "names.json")
+            if not os.path.isfile(names_path):
+                continue
+            with open(names_path, "r", encoding="utf-8") as fh:
+                names = json.load(fh)
+            for entry in sorted(os.listdir(directory)):
+                if entry.startswith("seg-"):
+                    segment = _Segment(os.path.join(directory, entry))
+                    try:
+                        yield names, segment
+                    finally:
+                        segment.close()
+
+    def _aggregate(self, since: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        events = 0
+        scans: Counter = Counter()  # (hour, tier code) -> scans
+        risks: Counter = Counter()
+        commands: Counter = Counter()
+        funnel_users: Dict[str, set] = {step: set() for step in FUNNEL_STEPS}
+
+        for names, segment in self._segments():
+            columns = segment.since(since)
+            if not columns or not len(columns["ts"]):
+                continue
+            events += len(columns["ts"])
+
+            ts = columns["ts"]
+            scan_mask = _mask(columns["kind"], KIND_SCAN)
+            # Events are in time order, so each hour is a contiguous slice
+            start = 0
+            for hour in range(ts[0] // 3600, ts[-1] // 3600 + 1):
+                end = bisect_left(ts, (hour + 1) * 3600, start)
+                if end > start:
+                    tiers = bytes(compress(columns["tier"][start:end], scan_mask[start:end]))
+                    for code in range(len(TIERS)):
+                        count = tiers.count(code)
+                        if count:
+                            scans[hour, code] += count
+                start = end
+            scan_risks = bytes(compress(columns["risk"], scan_mask))
+            for code in range(len(RISKS)):
+                risks[code] += scan_risks.count(code)
+
+            command_mask = _mask(columns["kind"], KIND_COMMAND)
+            for code, count in Counter(compress(columns["name"], command_mask)).items():
+                commands[names[code] if code < len(names) else _OTHER] += count
+
+            funnel_mask = _mask(columns["kind"], KIND_FUNNEL)
+            funnel_names = array("H", compress(columns["name"], funnel_mask))
+            funnel_users_col = array("I", compress(columns["user"], funnel_mask))
+            for code in set(funnel_names):
+                step = names[code] if code < len(names) else _OTHER
+                if step in funnel_users:
+                    step_mask = bytes(map(code.__eq__, funnel_names))
+                    funnel_users[step].update(compress(funnel_users_col, step_mask))
+            del columns, ts
+
+        return {
+            "events": events,
+            "scans_by_hour": {
+                (hour * 3600, TIERS[tier]): count for (hour, tier), count in sorted(scans.items())
+            },
+            "scans_by_tier": {
+                TIERS[tier]: sum(count for (_, t), count in scans.items() if t == tier)
+                for tier in range(len(TIERS))
+                if any(t == tier for _, t in scans)
+            },
+            "risks": {RISKS[code]: count for code, count in sorted(risks.items()) if count},
+            "commands": dict(commands.most_common()),
+            "funnel": [(step, len(funnel_users[step])) for step in FUNNEL_STEPS],
+            "query_ms": (time.perf_counter() - started) * 1000,
+        }
+
+    async def aggregate(self, hours: float = 24.0) -> Dict[str, Any]:
+        """Scans per tier per hour, risk distribution, command usage and funnel."""
+        await self.flush()
+        since = int(time.time() - hours * 3600)
+        return await asyncio.get_running_loop().run_in_executor(None, self._aggregate, since)
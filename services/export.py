@@ -0,0 +1,133 @@
+"""Admin exports: page through a backend list into a gzip-compressed file.
+
+Pages are fetched with a bounded lookahead, so several requests are in flight
+while earlier pages are written, and at most ``lookahead`` pages are held in
+memory. Rows are written as soon as their page arrives, in page order, which
+keeps memory use independent of the number of rows.
+"""
+
+import asyncio
+import csv
+import gzip
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, TextIO
+
+from services.shared_state import compact_dumps
+
+logger = logging.getLogger(__name__)
+
+EXPORT_RESOURCES = ("users", "scans", "transactions")
+EXPORT_FORMATS = ("csv", "jsonl")
+
+
+class ExportError(Exception):
+    """Raised when a page cannot be loaded after retries."""
+
+
+@dataclass
+class ExportResult:
+    path: str
+    filename: str
+    rows: int
+    pages: int
+    elapsed: float
+
+
+class _RowWriter:
+    """Writes rows to an open text stream as CSV or JSON Lines."""
+
+    def __init__(self, fh: TextIO, fmt: str):
+        self.fh = fh
+        self.fmt = fmt
+        self._csv: Optional[csv.DictWriter] = None
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        if self.fmt == "jsonl":
+            self.fh.writelines(compact_dumps(row) + "\n" for row in rows)
+            return
+        if self._csv is None:
+            # Columns come from the first page; later extra keys are dropped
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+            self._csv = csv.DictWriter(self.fh, fieldnames=columns, extrasaction="ignore")
+            self._csv.writeheader()
+        self._csv.writerows(
+            {
+                key: compact_dumps(value) if isinstance(value, (dict, list)) else value
+                for key, value in row.items()
+            }
+            for row in rows
+        )
+
+
+class Exporter:
+    """Streams an admin list from the backend into a temporary ``.gz`` file."""
+
+    def __init__(self, api_service, *, page_size: int = 500, lookahead: int = 4, attempts: int = 3):
+        self.api_service = api_service
+        self.page_size = page_size
+        self.lookahead = lookahead
+        self.attempts = attempts
+
+    async def _fetch(self, resource: str, page: int, telegram_id: Optional[int]):
+        for attempt in range(self.attempts):
+            result = await self.api_service.get_admin_page(
+                resource,
+                page=page,
+                limit=self.page_size,
+                telegram_id=telegram_id,
+            )
+            if result is not None:
+                return result
+            await asyncio.sleep(2 ** attempt)
+        raise ExportError(f"Could not load {resource} page {page}")
+
+    async def export(self, resource: str, fmt: str = "csv", *, telegram_id: Optional[int] = None) -> ExportResult:
+        """Write every row of ``resource`` to a temp file; the caller deletes it."""
+        if resource not in EXPORT_RESOURCES:
+            raise ValueError(f"Unknown export resource: {resource}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+        started = time.monotonic()
+        filename = f"{resource}-{time.strftime('%Y%m%d-%H%M%S')}.{fmt}.gz"
+        fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt}.gz")
+        os.close(fd)
+
+        loop = asyncio.get_running_loop()
+        pending: Dict[int, asyncio.Task] = {}
+        next_page = 1
+        rows = pages = 0
+        try:
+            with gzip.open(path, "wt", encoding="utf-8", newline="") as fh:
+                writer = _RowWriter(fh, fmt)
+                page = 1
+                while True:
+                    # Keep up to `lookahead` pages in flight ahead of the writer
+                    while len(pending) < self.lookahead:
+                        pending[next_page] = asyncio.create_task(self._fetch(resource, next_page, telegram_id))
+                        next_page += 1
+                    batch, has_more = await pending.pop(page)
+                    if batch:
+                        # Compression is CPU work; keep it off the event loop
+                        await loop.run_in_executor(None, writer.write, batch)
+                        rows += len(batch)
+                    pages += 1
+                    if not has_more or not batch:
+                        break
+                    page += 1
+        except BaseException:
+            os.remove(path)
+            raise
+        finally:
+            for task in pending.values():
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending.values(), return_exceptions=True)
+
+        elapsed = time.monotonic() - started
+        logger.info("Exported %d %s rows (%d pages) in %.1fs", rows, resource, pages, elapsed)
+        return ExportResult(path=path, filename=filename, rows=rows, pages=pages, elapsed=elapsed)
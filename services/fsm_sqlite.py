@@ -0,0 +1,271 @@
+"""SQLite FSM storage with a write-behind buffer and per-state-group TTLs.
+
+Writes land in memory first and are committed in batches by a background task,
+so handlers never wait on disk. Every conversation carries an expiry based on
+its state group (``RegisterStates``, ``ScanStates``...), refreshed on each
+write; expired rows are purged on every flush, so abandoned flows do not pile
+up. Sensitive fields (passwords) are kept only in a small in-memory map with
+the same expiry and are never written to disk.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from services.shared_state import compact_dumps
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at);
+"""
+
+
+@dataclass
+class _Entry:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """Persistent, memory-bounded FSM storage backed by SQLite in WAL mode."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        default_ttl: float = 3600.0,
+        ttl_by_group: Optional[Mapping[str, float]] = None,
+        sensitive_fields: Iterable[str] = ("password", "confirm_password"),
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_cached: int = 10_000,
+    ):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.ttl_by_group = dict(ttl_by_group or {})
+        self.sensitive_fields: FrozenSet[str] = frozenset(sensitive_fields)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_cached = max_cached
+
+        # One thread owns the connection; SQLite calls never run on the event loop
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._dirty: Dict[str, _Entry] = {}
+        self._flushing: Dict[str, _Entry] = {}
+        self._secrets: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ------------------------------------------------------------------
+    # SQLite (runs on the I/O thread)
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _load(self, key: str) -> Optional[_Entry]:
+        row = self._connect().execute(
+            "SELECT state, data, expires_at FROM fsm WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return _Entry(state=row[0], data=json.loads(row[1]), expires_at=row[2])
+
+    def _commit(self, batch: Dict[str, _Entry], now: float) -> int:
+        conn = self._connect()
+        upserts = [
+            (key, entry.state, compact_dumps(entry.data), entry.expires_at)
+            for key, entry in batch.items()
+            if not entry.empty
+        ]
+        deletes = [(key,) for key, entry in batch.items() if entry.empty]
+        conn.execute("BEGIN")
+        try:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO fsm (key, state, data, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+                    "data = excluded.data, expires_at = excluded.expires_at",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+            purged = conn.execute("DELETE FROM fsm WHERE expires_at < ?", (now,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return purged
+
+    async def _run_io(self, fn, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+    # ------------------------------------------------------------------
+    # Write-behind buffer
+    # ------------------------------------------------------------------
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:  # noqa: BLE001
+                logger.exception("FSM flush failed; will retry")
+
+    async def flush(self) -> None:
+        """Commit buffered writes and purge expired conversations."""
+        now = time.time()
+        self._evict_expired(now)
+        batch, self._dirty = self._dirty, {}
+        self._flushing = batch
+        try:
+            purged = await self._run_io(self._commit, batch, now)
+        except Exception:
+            # Put the batch back unless a newer write superseded it
+            self._dirty = {**batch, **self._dirty}
+            raise
+        finally:
+            self._flushing = {}
+        if batch or purged:
+            logger.debug("FSM flush: %d written, %d expired rows purged", len(batch), purged)
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [key for key, entry in self._cache.items() if entry.expires_at < now]
+        for key in expired:
+            del self._cache[key]
+        self._secrets = {key: value for key, value in self._secrets.items() if value[1] >= now}
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    def _write(self, key: str, entry: _Entry) -> None:
+        self._ensure_flusher()
+        self._remember(key, entry)
+        self._dirty[key] = entry
+        if len(self._dirty) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    def _ttl(self, state: Optional[str]) -> float:
+        if state:
+            return self.ttl_by_group.get(state.split(":", 1)[0], self.default_ttl)
+        return self.default_ttl
+
+    async def _get(self, key: str) -> _Entry:
+        now = time.time()
+        entry = self._dirty.get(key) or self._flushing.get(key) or self._cache.get(key)
+        if entry is None:
+            entry = await self._run_io(self._load, key) or _Entry()
+            if key in self._dirty:  # written while we were reading
+                entry = self._dirty[key]
+            self._remember(key, entry)
+        if not entry.empty and entry.expires_at < now:
+            return _Entry()
+        return entry
+
+    # ------------------------------------------------------------------
+    # BaseStorage API
+    # ------------------------------------------------------------------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        skey = self._key(key)
+        current = await self._get(skey)
+        value = state.state if isinstance(state, State) else state
+        entry = _Entry(state=value, data=current.data, expires_at=time.time() + self._ttl(value))
+        self._write(skey, entry)
+        if skey in self._secrets:
+            self._secrets[skey] = (self._secrets[skey][0], entry.expires_at)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        skey = self._key(key)
+        current = await self._get(skey)
+        expires_at = time.time() + self._ttl(current.state)
+        secrets = {name: value for name, value in data.items() if name in self.sensitive_fields}
+        public = {name: value for name, value in data.items() if name not in self.sensitive_fields}
+        if secrets:
+            self._secrets[skey] = (secrets, expires_at)
+        else:
+            self._secrets.pop(skey, None)
+        self._write(skey, _Entry(state=current.state, data=public, expires_at=expires_at))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        skey = self._key(key)
+        entry = await self._get(skey)
+        data = dict(entry.data)
+        secret = self._secrets.get(skey)
+        if secret is not None and secret[1] >= time.time():
+            data.update(secret[0])
+        return data
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self._conn is not None:
+            await self._run_io(self._conn.close)
+            self._conn = None
+        self._io.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes of the in-memory structures."""
+        return {
+            "cached": len(self._cache),
+            "dirty": len(self._dirty),
+            "secrets": len(self._secrets),
+        }
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """In-memory structures, for /memprof sizing."""
+        return self._cache, self._dirty, self._flushing, self._secrets
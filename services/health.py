@@ -0,0 +1,188 @@
+"""Liveness and readiness endpoints, plus timed start-up phases.
+
+``GET /livez`` answers from the event loop itself, so a wedged loop makes it
+time out. It also fails when the loop-lag heartbeat has stopped running (a
+loop that still serves sockets but has not run a timer for seconds is
+wedged too). ``GET /readyz`` runs the registered readiness checks: Telegram
+(a recent successful ``getUpdates``, or the webhook registered) and the
+backend (a recent response, or a fresh probe). Both return a JSON body and 200
+or 503.
+
+:class:`StartupTimer` logs how long each start-up phase took and exports the
+timings as ``splshield_startup_phase_seconds``, so cold start can be tracked
+across deploys.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import GetUpdates, Response, SetWebhook, TelegramMethod
+
+from services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    "splshield_startup_phase_seconds",
+    "Duration of each start-up phase of the current process ('ready' is the total).",
+    ["phase"],
+    max_series=16,
+)
+
+Check = Callable[[], Awaitable[Tuple[bool, str]]]
+
+
+# ----------------------------------------------------------------------
+# Start-up phases
+# ----------------------------------------------------------------------
+class StartupTimer:
+    """Times start-up phases from ``started`` (a ``time.perf_counter()`` value)."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.phases: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = seconds
+        STARTUP_SECONDS.labels(phase).set(seconds)
+        logger.info("Startup phase %s took %.0f ms", phase, seconds * 1000)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    async def timed(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Await ``awaitable`` as phase ``name``; lets phases run concurrently."""
+        with self.phase(name):
+            return await awaitable
+
+    def ready(self) -> None:
+        """Mark the process ready (first time only) and log the total."""
+        if self.ready_after is not None:
+            return
+        self.ready_after = time.perf_counter() - self.started
+        STARTUP_SECONDS.labels("ready").set(self.ready_after)
+        logger.info("Ready %.0f ms after start", self.ready_after * 1000)
+
+
+# ----------------------------------------------------------------------
+# Telegram
+# ----------------------------------------------------------------------
+class TelegramProbe(BaseRequestMiddleware):
+    """Bot session middleware watching the update source for readiness.
+
+    Polling is ready while ``getUpdates`` keeps succeeding: a long poll returns
+    every few seconds even without updates, so no success for ``stale_after``
+    means polling is stuck or failing. Webhook mode is ready once
+    ``setWebhook`` has succeeded.
+    """
+
+    def __init__(self, *, stale_after: float = 60.0, on_ready: Optional[Callable[[], None]] = None):
+        self.stale_after = stale_after
+        self.on_ready = on_ready
+        self.last_poll = 0.0
+        self.webhook_set = False
+
+    def _mark_ready(self) -> None:
+        if self.on_ready is not None:
+            self.on_ready()
+            self.on_ready = None
+
+    def poll_succeeded(self) -> None:
+        self.last_poll = time.monotonic()
+        self._mark_ready()
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        result = await make_request(bot, method)
+        if isinstance(method, GetUpdates):
+            self.poll_succeeded()
+        elif isinstance(method, SetWebhook):
+            self.webhook_set = True
+            self._mark_ready()
+        return result
+
+    async def check(self) -> Tuple[bool, str]:
+        if self.webhook_set:
+            return True, "webhook registered"
+        if not self.last_poll:
+            return False, "no successful getUpdates yet"
+        age = time.monotonic() - self.last_poll
+        if age > self.stale_after:
+            return False, f"last successful getUpdates {age:.0f}s ago"
+        return True, f"last successful getUpdates {age:.1f}s ago"
+
+
+# ----------------------------------------------------------------------
+# HTTP endpoints
+# ----------------------------------------------------------------------
+class HealthServer:
+    """Serves ``/livez`` and ``/readyz`` on its own port."""
+
+    def __init__(self, *, loop_watchdog=None, max_heartbeat_age: float = 10.0, check_timeout: float = 5.0):
+        self.loop_watchdog = loop_watchdog
+        self.max_heartbeat_age = max_heartbeat_age
+        self.check_timeout = check_timeout
+        self.checks: Dict[str, Check] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_check(self, name: str, check: Check) -> None:
+        """Register a readiness check returning ``(ok, detail)``."""
+        self.checks[name] = check
+
+    async def livez(self, request: web.Request) -> web.Response:
+        # Answering at all means the loop is running callbacks
+        age = self.loop_watchdog.heartbeat_age() if self.loop_watchdog is not None else None
+        if age is not None and age > self.max_heartbeat_age:
+            return web.json_response({"status": "stalled", "heartbeat_age_s": round(age, 1)}, status=503)
+        body = {"status": "ok"}
+        if age is not None:
+            body["heartbeat_age_s"] = round(age, 3)
+        return web.json_response(body)
+
+    async def _run_check(self, name: str, check: Check) -> Tuple[str, bool, str]:
+        try:
+            ok, detail = await asyncio.wait_for(check(), self.check_timeout)
+        except asyncio.TimeoutError:
+            ok, detail = False, f"timed out after {self.check_timeout:.0f}s"
+        except Exception as exc:  # noqa: BLE001
+            ok, detail = False, f"{type(exc).__name__}: {exc}"
+        return name, ok, detail
+
+    async def readyz(self, request: web.Request) -> web.Response:
+        results = await asyncio.gather(*(self._run_check(name, check) for name, check in self.checks.items()))
+        ready = all(ok for _, ok, _ in results)
+        body = {
+            "status": "ready" if ready else "not ready",
+            "checks": {name: {"ok": ok, "detail": detail} for name, ok, detail in results},
+        }
+        return web.json_response(body, status=200 if ready else 503)
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get("/livez", self.livez)
+        app.router.add_get("/readyz", self.readyz)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info("Health checks listening on http://%s:%s/livez and /readyz", host, port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,115 @@
+"""Background mirrors of admin lists, pulled incrementally by a cursor field.
+
+Each sync asks the backend only for rows whose cursor field (``updated_at``,
+``created_at``...) is at or after the newest value already seen, pages
+through them and hands every page to :meth:`IncrementalSync.apply`.
+Backends that ignore the filter simply return everything, and because
+subclasses apply rows idempotently the result stays correct.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalSync:
+    """Base class: cursor bookkeeping, paging and the periodic sync loop."""
+
+    resource = ""
+    cursor_field = "updated_at"
+    cursor_param = "updated_since"
+
+    def __init__(self, api_service, *, interval: float = 60.0, page_size: int = 500):
+        self.api_service = api_service
+        self.interval = interval
+        self.page_size = page_size
+        self.cursor: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        self.syncs = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def apply(self, rows: List[Dict[str, Any]]) -> None:
+        """Merge one page of rows into the local copy."""
+        raise NotImplementedError
+
+    async def flush(self) -> None:
+        """Persist what :meth:`apply` merged; called after each page, under the sync lock."""
+
+    @property
+    def ready(self) -> bool:
+        return self.last_sync is not None
+
+    async def sync(self, telegram_id: Optional[int]) -> Optional[int]:
+        """Pull changes since the cursor; returns rows applied, ``None`` on error."""
+        async with self._lock:
+            params = {self.cursor_param: self.cursor} if self.cursor else None
+            cursor = self.cursor
+            applied = 0
+            page = 1
+            while True:
+                result = await self.api_service.get_admin_page(
+                    self.resource,
+                    page=page,
+                    limit=self.page_size,
+                    telegram_id=telegram_id,
+                    params=params,
+                )
+                if result is None:
+                    logger.warning("%s sync stopped at page %d", self.resource, page)
+                    return None
+                rows, has_more = result
+                if rows:
+                    self.apply(rows)
+                    await self.flush()
+                    applied += len(rows)
+                    newest = max((str(row[self.cursor_field]) for row in rows if row.get(self.cursor_field)), default=None)
+                    if newest and (cursor is None or newest > cursor):
+                        cursor = newest
+                if not has_more or not rows:
+                    break
+                page += 1
+            # Only move the cursor once every page made it
+            self.cursor = cursor
+            self.last_sync = time.time()
+            self.syncs += 1
+            if applied:
+                logger.info("%s sync applied %d rows (cursor %s)", self.resource, applied, self.cursor)
+            return applied
+
+    async def ensure_synced(self, telegram_id: Optional[int]) -> bool:
+        """Run a first sync on demand when the background loop has not yet."""
+        if not self.ready:
+            await self.sync(telegram_id)
+        return self.ready
+
+    # ------------------------------------------------------------------
+    # Background loop
+    # ------------------------------------------------------------------
+    async def _run(self, admin_ids: Iterable[int]) -> None:
+        admin_ids = list(admin_ids)
+        while True:
+            try:
+                # Admin endpoints need an admin's token; use whoever is logged in
+                telegram_id = await self.api_service.first_logged_in(admin_ids)
+                if telegram_id is not None:
+                    await self.sync(telegram_id)
+            except Exception:  # noqa: BLE001
+                logger.exception("%s sync failed", self.resource)
+            await asyncio.sleep(self.interval)
+
+    def start(self, admin_ids: Iterable[int]) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(admin_ids))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,202 @@
+"""Local transaction ledger with rolling revenue aggregates.
+
+Transactions are pulled incrementally from ``/api/admin/dashboard/transactions``
+and every new or changed version is appended to a JSON Lines file, which is
+replayed on start-up. Aggregates (by status, by tier, confirmed TDL per hour
+and per day) are updated as rows arrive; a status change first retracts the
+transaction's previous contribution. Revenue queries read the aggregates
+instead of scanning the history.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from services.incremental_sync import IncrementalSync
+from services.shared_state import compact_dumps
+
+logger = logging.getLogger(__name__)
+
+CONFIRMED_STATUSES = frozenset({"confirmed", "completed", "success", "verified"})
+
+HOURLY_BUCKETS = 48
+DAILY_BUCKETS = 90
+
+# (status, amount, tier, timestamp)
+_TxState = Tuple[str, float, str, float]
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class Ledger(IncrementalSync):
+    """Append-only transaction mirror with O(1) revenue queries."""
+
+    resource = "transactions"
+    cursor_field = "updated_at"
+    cursor_param = "updated_since"
+
+    def __init__(self, api_service, path: str, *, recent: int = 15, **kwargs: Any):
+        super().__init__(api_service, **kwargs)
+        self.path = path
+        self._tx: Dict[Any, _TxState] = {}
+        self._file = None
+        self._unwritten: List[Dict[str, Any]] = []
+        self._writing: Optional[asyncio.Future] = None
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=recent)
+        self.by_status: Dict[str, List[float]] = {}  # status -> [count, tdl]
+        self.by_tier: Dict[str, float] = {}  # confirmed TDL per tier
+        self.hourly: Dict[int, float] = {}  # confirmed TDL per hour since epoch
+        self.daily: Dict[int, float] = {}  # confirmed TDL per day since epoch
+
+    # ------------------------------------------------------------------
+    # Aggregates
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _tx_id(row: Dict[str, Any]) -> Any:
+        return next((row[name] for name in ("id", "_id", "tx_signature", "signature") if row.get(name) is not None), None)
+
+    @staticmethod
+    def _state(row: Dict[str, Any]) -> _TxState:
+        return (
+            str(row.get("status", "confirmed")).lower(),
+            float(row.get("amount_tdl", row.get("amount", 0)) or 0),
+            str(row.get("tier") or "unknown").lower(),
+            _timestamp(row.get("created_at", row.get("timestamp"))),
+        )
+
+    def _contribute(self, state: _TxState, sign: int) -> None:
+        status, amount, tier, ts = state
+        totals = self.by_status.setdefault(status, [0, 0.0])
+        totals[0] += sign
+        totals[1] += sign * amount
+        if status not in CONFIRMED_STATUSES:
+            return
+        self.by_tier[tier] = self.by_tier.get(tier, 0.0) + sign * amount
+        hour, day = int(ts // 3600), int(ts // 86400)
+        self.hourly[hour] = self.hourly.get(hour, 0.0) + sign * amount
+        self.daily[day] = self.daily.get(day, 0.0) + sign * amount
+
+    def _prune(self, now: float) -> None:
+        oldest_hour = int(now // 3600) - HOURLY_BUCKETS
+        oldest_day = int(now // 86400) - DAILY_BUCKETS
+        self.hourly = {hour: tdl for hour, tdl in self.hourly.items() if hour > oldest_hour}
+        self.daily = {day: tdl for day, tdl in self.daily.items() if day > oldest_day}
+
+    def _merge(self, row: Dict[str, Any]) -> bool:
+        """Fold one row into the aggregates; ``False`` if nothing changed."""
+        tx_id = self._tx_id(row)
+        if tx_id is None:
+            return False
+        state = self._state(row)
+        previous = self._tx.get(tx_id)
+        if previous == state:
+            return False
+        if previous is not None:
+            self._contribute(previous, -1)
+        self._contribute(state, +1)
+        self._tx[tx_id] = state
+        self.recent.appendleft(row)
+        return True
+
+    def apply(self, rows: List[Dict[str, Any]]) -> None:
+        self._unwritten.extend(row for row in rows if self._merge(row))
+        self._prune(time.time())
+
+    # ------------------------------------------------------------------
+    # Ledger file
+    # ------------------------------------------------------------------
+    async def flush(self) -> None:
+        rows, self._unwritten = self._unwritten, []
+        if rows:
+            self._writing = asyncio.get_running_loop().run_in_executor(None, self._append, rows)
+            await self._writing
+
+    def _append(self, rows: List[Dict[str, Any]]) -> None:
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.writelines(compact_dumps(row) + "\n" for row in rows)
+        self._file.flush()
+
+    def _replay(self) -> int:
+        replayed = 0
+        try:
+            fh = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return 0
+        with fh:
+            for line in fh:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                self._merge(row)
+                cursor = row.get(self.cursor_field)
+                if cursor and (self.cursor is None or str(cursor) > self.cursor):
+                    self.cursor = str(cursor)
+                replayed += 1
+        self._prune(time.time())
+        return replayed
+
+    async def load(self) -> None:
+        """Rebuild aggregates and the sync cursor from the ledger file."""
+        replayed = await asyncio.get_running_loop().run_in_executor(None, self._replay)
+        if replayed:
+            logger.info("Ledger replayed %d rows from %s (cursor %s)", replayed, self.path, self.cursor)
+
+    async def close(self) -> None:
+        await super().close()
+        if self._writing is not None:
+            # A cancelled sync does not stop a write already running in the executor
+            await asyncio.gather(self._writing, return_exceptions=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def revenue(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Confirmed TDL for today, the last 24 hours and the last 7 days."""
+        now = time.time() if now is None else now
+        hour, day = int(now // 3600), int(now // 86400)
+        return {
+            "today": self.daily.get(day, 0.0),
+            "last_24h": sum(self.hourly.get(h, 0.0) for h in range(hour - 23, hour + 1)),
+            "last_7d": sum(self.daily.get(d, 0.0) for d in range(day - 6, day + 1)),
+        }
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """Per-transaction state, recent rows, aggregates and rows waiting to be written."""
+        return self._tx, self.recent, self.by_status, self.by_tier, self.hourly, self.daily, self._unwritten
+
+    def summary(self) -> Dict[str, Any]:
+        confirmed = [0, 0.0]
+        for status, (count, tdl) in self.by_status.items():
+            if status in CONFIRMED_STATUSES:
+                confirmed[0] += count
+                confirmed[1] += tdl
+        pending = self.by_status.get("pending", [0, 0.0])
+        return {
+            "transactions": len(self._tx),
+            "confirmed": {"count": confirmed[0], "tdl": confirmed[1]},
+            "pending": {"count": pending[0], "tdl": pending[1]},
+            "by_tier": dict(self.by_tier),
+            **self.revenue(),
+        }
@@ -0,0 +1,231 @@
+"""Queue-based structured logging.
+
+On the calling thread (usually the event loop), a log call only builds the
+``LogRecord``, stamps the current ``trace_id``, passes a per-call-site rate
+limit and puts the record on a bounded queue. A listener thread does the rest:
+it renders the %-style message (so arguments are formatted lazily, off the
+loop), redacts secrets and writes one JSON object per line.
+
+Redaction covers bot tokens, JWTs, bearer tokens, ``password`` / ``token``
+style key-value pairs and email addresses, in the message, the exception text
+and ``extra`` fields.
+
+Rate limiting is a token bucket per call site (file and line). Past the burst,
+records from that line are dropped, and the next one let through carries
+``suppressed``: how many were dropped. CRITICAL records are never limited. If
+the queue is full (the writer cannot keep up), records are dropped and counted
+rather than blocking the loop.
+
+Because formatting is deferred, a mutable argument changed right after the
+log call may be rendered with its new value.
+"""
+
+import json
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Tuple
+
+from services.metrics import register_stats
+from services.tracing import TraceLogFilter
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s"
+
+SENSITIVE_KEYS = frozenset({
+    "password", "confirm_password", "token", "access_token", "refresh_token",
+    "authorization", "secret", "api_key", "email",
+})
+_REDACTIONS = (
+    (re.compile(r"\b\d{6,12}:[A-Za-z0-9_-]{30,}"), "<bot-token>"),
+    (re.compile(r"\beyJ[\w-]+\.[\w-]+\.[\w-]*"), "<jwt>"),
+    (
+        re.compile(
+            r"(?i)(['\"]?\b(?:access_token|refresh_token|token|password|confirm_password|secret|api_key|authorization)\b"
+            r"['\"]?\s*[:=]\s*)(?:'[^']*'|\"[^\"]*\"|[^\s,;&}\]]+)"
+        ),
+        r"\1<redacted>",
+    ),
+    (re.compile(r"(?i)\bbearer\s+[\w.~+/=-]+"), "Bearer <redacted>"),
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+)
+# Attributes every LogRecord has; anything else came from ``extra=``
+_RECORD_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "trace_id", "suppressed"}
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+# ----------------------------------------------------------------------
+# Calling thread
+# ----------------------------------------------------------------------
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site: ``rate`` records/s sustained, ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: int, *, max_sites: int = 4096, exempt_level: int = logging.CRITICAL):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.max_sites = max_sites
+        self.exempt_level = exempt_level
+        self.suppressed = 0
+        # (pathname, lineno) -> [tokens, last refill, suppressed since last emitted]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= self.exempt_level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self.max_sites:
+                    self._sites.clear()
+                site = self._sites[key] = [float(self.burst), now, 0]
+            site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+            site[1] = now
+            if site[0] < 1:
+                site[2] += 1
+                self.suppressed += 1
+                return False
+            site[0] -= 1
+            if site[2]:
+                record.suppressed = site[2]
+                site[2] = 0
+        return True
+
+
+class LazyQueueHandler(QueueHandler):
+    """Enqueues records unformatted; drops (and counts) them when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener shares this process, so msg/args stay as they are
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+# ----------------------------------------------------------------------
+# Listener thread
+# ----------------------------------------------------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with secrets redacted."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage()),
+        }
+        trace_id = getattr(record, "trace_id", "-")
+        if trace_id != "-":
+            entry["trace_id"] = trace_id
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        for key, value in record.__dict__.items():
+            if key in _RECORD_ATTRS or key.startswith("_"):
+                continue
+            if key.lower() in SENSITIVE_KEYS:
+                value = "<redacted>"
+            elif isinstance(value, str):
+                value = redact(value)
+            entry[key] = value
+        if record.exc_info:
+            entry["exc"] = redact(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RedactingFormatter(logging.Formatter):
+    """Plain-text lines (``LOG_FORMAT=text``), with secrets redacted."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "trace_id"):
+            record.trace_id = "-"
+        line = redact(super().format(record))
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{line} (+{suppressed} suppressed)" if suppressed else line
+
+
+class LogPipeline:
+    """Root logging through a bounded queue to a writer thread."""
+
+    def __init__(
+        self,
+        *,
+        level: str = "INFO",
+        fmt: str = "json",
+        queue_size: int = 10_000,
+        rate: float = 10.0,
+        burst: int = 50,
+        stream=None,
+    ):
+        self.level = level
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == "json" else RedactingFormatter(TEXT_FORMAT))
+        self.handler = LazyQueueHandler(self.queue)
+        self.handler.addFilter(TraceLogFilter())
+        self.rate_limit = RateLimitFilter(rate, burst)
+        self.handler.addFilter(self.rate_limit)
+        self.listener = QueueListener(self.queue, output, respect_handler_level=True)
+        self._started = False
+
+    def start(self) -> "LogPipeline":
+        """Route the root logger through the queue and start the writer thread."""
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level.upper())
+        self.listener.start()
+        self._started = True
+        return self
+
+    def stop(self) -> None:
+        """Write out whatever is queued and stop the writer thread."""
+        if self._started:
+            self.listener.stop()
+            self._started = False
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "rate_limited": self.rate_limit.suppressed,
+        }
+
+
+def start_logging(settings) -> LogPipeline:
+    """Start the pipeline configured by ``LOG_*`` settings and export its counters."""
+    pipeline = LogPipeline(
+        level=settings.LOG_LEVEL,
+        fmt=settings.LOG_FORMAT,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        rate=settings.LOG_RATE_PER_SECOND,
+        burst=settings.LOG_RATE_BURST,
+    ).start()
+    register_stats("splshield_logging", "Log pipeline", pipeline.stats, counters=("dropped", "rate_limited"))
+    return pipeline
@@ -0,0 +1,166 @@
+"""Event-loop lag watchdog.
+
+A heartbeat task sleeps for ``interval`` and measures how late it wakes up;
+that lateness is the time every other coroutine on the loop also waited.
+A monitor thread watches the heartbeat, and when the loop has not come back
+for ``threshold`` seconds it captures the loop thread's stack while the
+blocking code is still running, logs it once per stall and keeps the latest
+stalls for the admin panel. Optionally asyncio's debug mode flags every
+callback that runs longer than ``slow_callback`` seconds.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from services.metrics import REGISTRY
+from services.perf import KIND_LOOP, PERF
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "splshield_event_loop_lag_seconds",
+    "How late the event loop ran a heartbeat scheduled every interval.",
+    buckets=LAG_BUCKETS,
+)
+LOOP_STALLS = REGISTRY.counter(
+    "splshield_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than the stall threshold.",
+)
+
+
+class LoopWatchdog:
+    """Measures loop lag and captures the stack of whatever blocks the loop."""
+
+    def __init__(
+        self,
+        *,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        slow_callback: float = 0.0,
+        history: int = 10,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.slow_callback = slow_callback
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.stall_count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._captured_beat = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if self.slow_callback > 0:
+            # asyncio logs "Executing <handle> took N seconds" for each slow callback
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.slow_callback
+            logger.warning("Asyncio debug mode on: flagging callbacks slower than %.0f ms", self.slow_callback * 1000)
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    # ------------------------------------------------------------------
+    # Heartbeat (loop thread)
+    # ------------------------------------------------------------------
+    async def _beat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            previous, self._last_beat = self._last_beat, time.monotonic()
+            LOOP_LAG_SECONDS.observe(lag)
+            PERF.record(KIND_LOOP, "lag", lag)
+            if lag >= self.threshold:
+                self.stall_count += 1
+                LOOP_STALLS.inc()
+                if self.stalls and self.stalls[-1]["beat"] == previous:
+                    # The monitor captured this stall; record how long it really lasted
+                    self.stalls[-1]["lag_ms"] = lag * 1000
+                else:
+                    # Stalled and recovered between two monitor checks
+                    self._remember(previous, lag, None, "")
+
+    # ------------------------------------------------------------------
+    # Monitor (background thread)
+    # ------------------------------------------------------------------
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == self._captured_beat:
+                continue
+            self._captured_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            try:
+                task = asyncio.current_task(self._loop)
+            except RuntimeError:
+                task = None
+            task_name = task.get_name() if task is not None else None
+            self._remember(beat, blocked, task_name, stack)
+            logger.warning(
+                "Event loop blocked for %.0f ms (task %s); blocking stack:\n%s",
+                blocked * 1000,
+                task_name or "-",
+                stack.rstrip(),
+            )
+
+    def _remember(self, beat: float, lag: float, task_name: Optional[str], stack: str) -> None:
+        self.stalls.append({
+            "beat": beat,
+            "at": time.time(),
+            "lag_ms": lag * 1000,
+            "task": task_name,
+            "stack": stack,
+        })
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+    def heartbeat_age(self) -> Optional[float]:
+        """Seconds since the heartbeat last ran, or ``None`` when not running."""
+        if self._task is None:
+            return None
+        return time.monotonic() - self._last_beat
+
+    def summary(self, minutes: int = 5) -> Dict[str, Any]:
+        """Lag percentiles over the last ``minutes`` and the latest stall."""
+        histogram = PERF.window(minutes).get((KIND_LOOP, "lag"))
+        p50, p99 = histogram.percentiles((0.5, 0.99)) if histogram else (0.0, 0.0)
+        last = self.stalls[-1] if self.stalls else None
+        return {
+            "running": self._task is not None,
+            "p50_ms": p50 * 1000,
+            "p99_ms": p99 * 1000,
+            "max_ms": (histogram.max if histogram else 0.0) * 1000,
+            "stalls": self.stall_count,
+            "last_stall": last,
+        }
@@ -0,0 +1,233 @@
+"""Memory accounting for /memprof and the metrics endpoint.
+
+Three views of memory:
+
+* a periodic sample of process RSS, Python heap blocks, traced bytes and
+  pending asyncio tasks, exported as gauges and kept for an hour of trend;
+* tracemalloc snapshots diffed against a baseline, grouped by allocation
+  site, to find what keeps growing;
+* approximate retained size of each registered subsystem (FSM storage,
+  caches, session registry, local mirrors), measured by walking the
+  containers its ``memory_targets()`` returns.
+
+tracemalloc slows allocation noticeably, so it only runs between
+``/memprof start`` and ``/memprof stop``.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from services.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):  # pragma: no cover - non-POSIX
+    _PAGE_SIZE = 4096
+
+RSS_BYTES = REGISTRY.gauge("splshield_process_resident_memory_bytes", "Resident set size, sampled periodically.")
+HEAP_BLOCKS = REGISTRY.gauge("splshield_python_allocated_blocks", "Memory blocks allocated by the Python allocator.")
+TRACED_BYTES = REGISTRY.gauge("splshield_tracemalloc_traced_bytes", "Bytes traced by tracemalloc (0 when not tracing).")
+PENDING_TASKS = REGISTRY.gauge("splshield_asyncio_tasks", "Pending asyncio tasks.")
+SUBSYSTEM_BYTES = REGISTRY.gauge(
+    "splshield_subsystem_bytes",
+    "Approximate retained size of in-process structures, by subsystem.",
+    ["subsystem"],
+    max_series=32,
+)
+
+# Containers never worth descending into when sizing a subsystem
+_SKIP_TYPES = (type, type(sys), type(len), type(lambda: None), asyncio.AbstractEventLoop)
+
+
+def read_rss() -> int:
+    """Current resident set size in bytes (0 if unavailable)."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return 0
+    # Peak, not current, but better than nothing on macOS/BSD
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def deep_size(root: Any, *, max_objects: int = 500_000) -> Tuple[int, int]:
+    """``(bytes, objects)`` reachable from ``root`` through containers and attributes."""
+    seen = set()
+    stack = [root]
+    size = 0
+    while stack and len(seen) < max_objects:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIP_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj, 0)
+        if isinstance(obj, dict):
+            # Keys and values separately: temporary item tuples would recycle ids
+            stack.extend(list(obj))
+            stack.extend(list(obj.values()))
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(list(obj))
+        elif isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        else:
+            attrs = getattr(obj, "__dict__", None)
+            if attrs is not None:
+                stack.append(attrs)
+            for slot in getattr(type(obj), "__slots__", ()):
+                value = getattr(obj, slot, None)
+                if value is not None:
+                    stack.append(value)
+    return size, len(seen)
+
+
+class MemoryProfiler:
+    """Periodic memory samples, tracemalloc diffs and per-subsystem sizes."""
+
+    def __init__(self, *, interval: float = 30.0, frames: int = 10, history: int = 120):
+        self.interval = interval
+        self.frames = frames
+        self.samples: Deque[Dict[str, float]] = deque(maxlen=history)
+        self._subsystems: Dict[str, Callable[[], Any]] = {}
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # ------------------------------------------------------------------
+    # Periodic sampling
+    # ------------------------------------------------------------------
+    def sample(self) -> Dict[str, float]:
+        traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+        sample = {
+            "at": time.time(),
+            "rss": read_rss(),
+            "blocks": sys.getallocatedblocks(),
+            "traced": traced,
+            "tasks": len(asyncio.all_tasks()),
+        }
+        RSS_BYTES.set(sample["rss"])
+        HEAP_BLOCKS.set(sample["blocks"])
+        TRACED_BYTES.set(traced)
+        PENDING_TASKS.set(sample["tasks"])
+        self.samples.append(sample)
+        return sample
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception:  # noqa: BLE001
+                logger.exception("Memory sample failed")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.stop_tracing()
+
+    # ------------------------------------------------------------------
+    # tracemalloc
+    # ------------------------------------------------------------------
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+
+    async def start_tracing(self) -> None:
+        """Start tracemalloc (if needed) and take a new baseline."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            logger.warning("tracemalloc started with %d frames; allocations are slower until /memprof stop", self.frames)
+        self._baseline = await asyncio.to_thread(self._snapshot)
+        self._baseline_at = time.time()
+
+    def stop_tracing(self) -> None:
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+
+    def _diff(self, limit: int) -> Dict[str, Any]:
+        snapshot = self._snapshot()
+        stats = snapshot.compare_to(self._baseline, "lineno")
+        growth = [stat for stat in stats if stat.size_diff > 0][:limit]
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "since": self._baseline_at,
+            "traced": current,
+            "peak": peak,
+            "growth": sum(stat.size_diff for stat in stats),
+            "top": [
+                {
+                    "site": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "size": stat.size,
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in growth
+            ],
+        }
+
+    async def diff(self, limit: int = 10) -> Optional[Dict[str, Any]]:
+        """Top allocation sites that grew since the baseline, or ``None`` if not tracing."""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            return None
+        return await asyncio.to_thread(self._diff, limit)
+
+    # ------------------------------------------------------------------
+    # Subsystems
+    # ------------------------------------------------------------------
+    def register(self, name: str, target: Callable[[], Any]) -> None:
+        """Account ``target()`` (the structures a subsystem owns) under ``name``."""
+        self._subsystems[name] = target
+
+    def _size_subsystems(self, targets: Dict[str, Any]) -> List[Tuple[str, int, int]]:
+        rows = []
+        for name, target in targets.items():
+            try:
+                size, objects = deep_size(target)
+            except Exception:  # noqa: BLE001
+                logger.exception("Sizing subsystem %s failed", name)
+                continue
+            SUBSYSTEM_BYTES.labels(name).set(size)
+            rows.append((name, size, objects))
+        return rows
+
+    async def subsystems(self) -> List[Tuple[str, int, int]]:
+        """``(name, bytes, objects)`` per subsystem, largest first.
+
+        Walking large mirrors takes a while, so it runs in a worker thread.
+        Each container is copied in one C call under the GIL, so concurrent
+        updates can skew the total slightly but never break the walk.
+        """
+        targets = {name: target() for name, target in self._subsystems.items()}
+        rows = await asyncio.to_thread(self._size_subsystems, targets)
+        tasks = asyncio.all_tasks()
+        rows.append(("pending tasks", sum(sys.getsizeof(task) for task in tasks), len(tasks)))
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows
@@ -0,0 +1,278 @@
+"""Prometheus metrics for the bot process, in the text exposition format.
+
+A small, dependency-free registry: counters, gauges and histograms with a
+fixed label set, plus callback metrics read from existing ``stats()``
+methods at scrape time. Every labelled metric caps its number of series;
+label values beyond the cap are folded into a single ``other`` series, so a
+bad label source cannot grow memory or the scrape without bound. Recording is
+a dict lookup and a few float additions.
+"""
+
+import logging
+import math
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+OTHER = "other"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+CallbackResult = Union[float, Dict[LabelValues, float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), *, max_series: int = 100):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._series: Dict[LabelValues, Any] = {}
+
+    def _new_series(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            if len(self._series) >= self.max_series:
+                values = (OTHER,) * len(self.labelnames)
+                series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = self._new_series()
+        return series
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_series(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(series.value)}"
+            for values, series in self._series.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float, buckets: Sequence[float]) -> None:
+        self.counts[bisect_left(buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), *, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs: Any):
+        super().__init__(name, documentation, labelnames, **kwargs)
+        self.buckets = tuple(buckets)
+
+    def _new_series(self) -> _HistogramSeries:
+        return _HistogramSeries(len(self.buckets) + 1)
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.labels(*labels).observe(value, self.buckets)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), series.counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(series.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {series.count}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose value is read from ``fn`` at scrape time."""
+
+    def __init__(self, name: str, documentation: str, type: str, fn: Callable[[], CallbackResult], labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.type = type
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            result = self.fn()
+        except Exception:  # noqa: BLE001
+            logger.exception("Metric callback %s failed", self.name)
+            return []
+        if not isinstance(result, dict):
+            result = {(): result}
+        return [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"
+            for values, value in list(result.items())[:self.max_series]
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name replaces it (callbacks are rebound per bot instance)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs: Any) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs: Any) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, **kwargs))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs: Any) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def callback(self, name: str, documentation: str, type: str, fn: Callable[[], CallbackResult], labelnames: Sequence[str] = ()) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, type, fn, labelnames))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            samples = metric.render()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# ----------------------------------------------------------------------
+# Metrics recorded across the bot
+# ----------------------------------------------------------------------
+UPDATES = REGISTRY.counter("splshield_updates_total", "Updates received, by update type.", ["type"], max_series=32)
+HANDLER_SECONDS = REGISTRY.histogram(
+    "splshield_handler_seconds",
+    "Handler wall time, by router module and handler.",
+    ["router", "handler"],
+    max_series=200,
+)
+BACKEND_REQUESTS = REGISTRY.counter(
+    "splshield_backend_requests_total",
+    "Backend API requests, by method, endpoint and HTTP status (0 = transport error).",
+    ["method", "endpoint", "status"],
+    max_series=200,
+)
+BACKEND_SECONDS = REGISTRY.histogram(
+    "splshield_backend_request_seconds",
+    "Backend API request latency, by method and endpoint.",
+    ["method", "endpoint"],
+    max_series=100,
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "splshield_cache_lookups_total",
+    "Shared cache lookups, by cache namespace and result (hit/miss).",
+    ["cache", "result"],
+    max_series=64,
+)
+
+
+def endpoint_label(endpoint: str) -> str:
+    """Path without query string; numeric segments collapsed to ``:id``."""
+    path = endpoint.split("?", 1)[0]
+    return "/".join(":id" if part.isdigit() else part for part in path.split("/"))
+
+
+def register_stats(prefix: str, documentation: str, stats: Callable[[], Dict[str, Any]], counters: Iterable[str] = ()) -> None:
+    """Expose the numeric fields of a ``stats()`` method, one metric per field."""
+    counters = set(counters)
+    for field, value in stats().items():
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            continue
+        kind = "counter" if field in counters else "gauge"
+        name = f"{prefix}_{field}_total" if kind == "counter" else f"{prefix}_{field}"
+        REGISTRY.callback(
+            name,
+            f"{documentation} ({field}).",
+            kind,
+            lambda field=field: stats().get(field, 0) or 0,
+        )
+
+
+# ----------------------------------------------------------------------
+# HTTP endpoint
+# ----------------------------------------------------------------------
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(
+        body=REGISTRY.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Serve ``GET /metrics`` on its own port; returns the runner to clean up."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics listening on http://%s:%s/metrics", host, port)
+    return runner
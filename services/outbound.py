@@ -0,0 +1,278 @@
+"""Outbound Telegram send pipeline with flood-limit aware scheduling.
+
+Registered as a request middleware on the bot session, so every
+``message.answer`` / ``edit_text`` / ``bot.send_*`` call goes through it
+without handler changes. It enforces Telegram's limits with token buckets
+(global, per private chat, per group), honours ``retry_after``, merges queued
+edits of the same message and lets interactive replies overtake bulk sends.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageReplyMarkup, EditMessageText, Response, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+_MERGEABLE_EDITS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)
+
+
+@contextmanager
+def bulk_sends() -> Iterator[None]:
+    """Mark sends made inside the block as bulk (broadcasts, notifications)."""
+    token = send_priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket kept as a theoretical arrival time (GCRA)."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = self.interval * (burst - 1)
+        self.tat = 0.0
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return how long to wait before using it."""
+        start = max(self.tat, now)
+        self.tat = start + self.interval
+        return max(0.0, start - self.tolerance - now)
+
+    def delay(self, now: float) -> float:
+        """How long until a token is available, without taking it."""
+        return max(0.0, max(self.tat, now) - self.tolerance - now)
+
+    def take(self, now: float) -> None:
+        self.tat = max(self.tat, now) + self.interval
+
+    def pause(self, until: float) -> None:
+        self.tat = max(self.tat, until + self.tolerance)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class _PendingEdit:
+    method: TelegramMethod
+    future: asyncio.Future
+    merged: int = 0
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Bot session middleware that schedules outbound calls within flood limits."""
+
+    def __init__(
+        self,
+        *,
+        global_rate: float = 30.0,
+        private_rate: float = 1.0,
+        private_burst: int = 3,
+        group_per_minute: float = 20.0,
+        max_retries: int = 3,
+        idle_chat_ttl: float = 300.0,
+    ):
+        self.global_bucket = TokenBucket(global_rate, burst=max(1, int(global_rate)))
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_per_minute / 60.0
+        self.max_retries = max_retries
+        self.idle_chat_ttl = idle_chat_ttl
+
+        self._chats: Dict[Union[int, str], TokenBucket] = {}
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._pump: Optional[asyncio.Task] = None
+        self._pending_edits: Dict[Tuple[Any, Any], _PendingEdit] = {}
+        self._last_prune = time.monotonic()
+
+        self.sent = 0
+        self.retried = 0
+        self.merged_edits = 0
+
+    # ------------------------------------------------------------------
+    # Buckets
+    # ------------------------------------------------------------------
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (
+                TokenBucket(self.group_rate, burst=3)
+                if is_group
+                else TokenBucket(self.private_rate, burst=self.private_burst)
+            )
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune_chats(self, now: float) -> None:
+        if now - self._last_prune < self.idle_chat_ttl:
+            return
+        self._last_prune = now
+        self._chats = {
+            chat_id: bucket
+            for chat_id, bucket in self._chats.items()
+            if bucket.tat + self.idle_chat_ttl > now
+        }
+
+    async def _acquire(self, chat_id: Union[int, str]) -> None:
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        self._prune_chats(now)
+
+        # Reserve the chat slot on arrival so one chat's messages keep their order
+        chat_wait = self._chat_bucket(chat_id).reserve(now)
+        if chat_wait:
+            await asyncio.sleep(chat_wait)
+
+        # The global bucket is shared, so waiters are served by priority lane
+        waiter = _Waiter(send_priority.get(), next(self._seq), loop.create_future())
+        heapq.heappush(self._waiters, waiter)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.create_task(self._run_pump())
+        await waiter.future
+
+    async def _run_pump(self) -> None:
+        while self._waiters:
+            delay = self.global_bucket.delay(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():  # caller was cancelled
+                continue
+            self.global_bucket.take(time.monotonic())
+            waiter.future.set_result(None)
+
+    # ------------------------------------------------------------------
+    # Middleware
+    # ------------------------------------------------------------------
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, (int, str)):
+            return await make_request(bot, method)
+
+        if isinstance(method, _MERGEABLE_EDITS) and method.message_id is not None:
+            return await self._send_edit(make_request, bot, method, chat_id)
+        return await self._send(make_request, bot, method, chat_id)
+
+    def _back_off(self, method: TelegramMethod, chat_id: Union[int, str], exc: TelegramRetryAfter) -> None:
+        """Pause every send until ``retry_after`` expires.
+
+        Telegram's flood wait applies to the whole bot, so other chats sending
+        into it would only collect more 429s and use up their retries.
+        """
+        self.retried += 1
+        until = time.monotonic() + exc.retry_after
+        self._chat_bucket(chat_id).pause(until)
+        self.global_bucket.pause(until)
+        logger.warning(
+            "Flood limit on %s for chat %s, pausing all sends for %ss",
+            type(method).__name__,
+            chat_id,
+            exc.retry_after,
+        )
+
+    async def _send(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        chat_id: Union[int, str],
+    ) -> Response:
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                if attempt >= self.max_retries:
+                    raise
+                self._back_off(method, chat_id, exc)
+                continue
+            self.sent += 1
+            return response
+        raise AssertionError("unreachable")
+
+    async def _send_edit(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+        chat_id: Union[int, str],
+    ) -> Response:
+        key = (chat_id, method.message_id)
+        pending = self._pending_edits.get(key)
+        if pending is not None and type(pending.method) is type(method):
+            # An edit of this message is still queued: send our content instead
+            pending.method = method
+            pending.merged += 1
+            self.merged_edits += 1
+            return await asyncio.shield(pending.future)
+
+        pending = _PendingEdit(method, asyncio.get_running_loop().create_future())
+        self._pending_edits[key] = pending
+        try:
+            await self._acquire(chat_id)
+        except BaseException as exc:
+            self._pending_edits.pop(key, None)
+            if not pending.future.done():
+                pending.future.set_exception(exc)
+                pending.future.exception()  # mark retrieved if nobody merged into it
+            raise
+        if self._pending_edits.get(key) is pending:
+            del self._pending_edits[key]
+
+        try:
+            # The slot is already ours; later retries go through _send
+            response = await make_request(bot, pending.method)
+            self.sent += 1
+        except TelegramRetryAfter as exc:
+            self._back_off(pending.method, chat_id, exc)
+            try:
+                response = await self._send(make_request, bot, pending.method, chat_id)
+            except BaseException as exc:
+                pending.future.set_exception(exc)
+                pending.future.exception()
+                raise
+        except BaseException as exc:
+            pending.future.set_exception(exc)
+            pending.future.exception()
+            raise
+        pending.future.set_result(response)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "merged_edits": self.merged_edits,
+            "queued": len(self._waiters),
+            "tracked_chats": len(self._chats),
+        }
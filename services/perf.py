@@ -0,0 +1,137 @@
+"""Rolling latency percentiles for handlers and backend calls.
+
+Durations go into log-linear histograms in the style of HdrHistogram: each
+power of two is split into 16 sub-buckets, so any reported percentile is
+within about 6% of the true value, and a histogram never holds more than a
+few hundred buckets however many samples it sees. Histograms are kept per
+minute in a 60-slot ring and merged on demand, which gives p50/p95/p99 over
+the last 1, 5 or 60 minutes without keeping individual samples.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUB_BITS = 5
+HALF = 1 << (SUB_BITS - 1)
+MAX_MICROS = 3600 * 1_000_000
+WINDOW_MINUTES = 60
+
+KIND_HANDLER = "handler"
+KIND_BACKEND = "backend"
+KIND_LOOP = "loop"
+OTHER = "other"
+
+Key = Tuple[str, str]
+
+
+def _bucket(micros: int) -> int:
+    if micros < 2 * HALF:
+        return micros
+    shift = micros.bit_length() - SUB_BITS
+    return shift * HALF + (micros >> shift)
+
+
+def _bucket_value(index: int) -> float:
+    """Midpoint of a bucket, in microseconds."""
+    if index < 2 * HALF:
+        return float(index)
+    shift = index // HALF - 1
+    lower = (index - shift * HALF) << shift
+    return lower + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """Mergeable log-linear histogram of durations (sparse bucket counts)."""
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        micros = min(max(int(seconds * 1_000_000), 0), MAX_MICROS)
+        index = _bucket(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentiles(self, quantiles: Iterable[float]) -> List[float]:
+        """Values in seconds at each quantile (0..1, ascending)."""
+        quantiles = list(quantiles)
+        results = [0.0] * len(quantiles)
+        if not self.count:
+            return results
+        targets = [max(1, round(q * self.count)) for q in quantiles]
+        position = seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while position < len(targets) and seen >= targets[position]:
+                results[position] = min(_bucket_value(index) / 1_000_000, self.max)
+                position += 1
+            if position == len(targets):
+                break
+        return results
+
+
+class PerfRecorder:
+    """Per-minute histograms keyed by ``(kind, name)`` for the last hour."""
+
+    def __init__(self, *, max_keys: int = 200):
+        self.max_keys = max_keys
+        self._minutes: Deque[Tuple[int, Dict[Key, LatencyHistogram]]] = deque(maxlen=WINDOW_MINUTES)
+
+    def record(self, kind: str, name: str, seconds: float) -> None:
+        minute = int(time.time() // 60)
+        if not self._minutes or self._minutes[-1][0] != minute:
+            self._minutes.append((minute, {}))
+        histograms = self._minutes[-1][1]
+        key = (kind, name)
+        histogram = histograms.get(key)
+        if histogram is None:
+            if len(histograms) >= self.max_keys:
+                key = (kind, OTHER)
+                histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = LatencyHistogram()
+        histogram.record(seconds)
+
+    def window(self, minutes: int, now: Optional[float] = None) -> Dict[Key, LatencyHistogram]:
+        """Histograms merged over the last ``minutes`` minutes, including the current one."""
+        current = int((time.time() if now is None else now) // 60)
+        merged: Dict[Key, LatencyHistogram] = {}
+        for minute, histograms in list(self._minutes):
+            if minute <= current - minutes:
+                continue
+            for key, histogram in histograms.items():
+                merged.setdefault(key, LatencyHistogram()).merge(histogram)
+        return merged
+
+    def report(self, minutes: int, kind: Optional[str] = None, limit: int = 10) -> List[Tuple[str, int, List[float]]]:
+        """``(name, count, [p50, p95, p99])`` for the busiest keys, most samples first."""
+        rows = [
+            (name, histogram.count, histogram.percentiles((0.5, 0.95, 0.99)))
+            for (key_kind, name), histogram in self.window(minutes).items()
+            if kind is None or key_kind == kind
+        ]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit]
+
+    def memory_targets(self) -> Deque[Tuple[int, Dict[Key, LatencyHistogram]]]:
+        """The per-minute histograms, for /memprof sizing."""
+        return self._minutes
+
+
+PERF = PerfRecorder()
@@ -0,0 +1,117 @@
+"""On-demand sampling profiler for the running bot.
+
+A background thread reads every thread's current Python stack with
+``sys._current_frames()`` at a fixed interval while the bot keeps serving.
+Because asyncio runs all tasks on the loop thread, sampling that thread's stack
+covers whichever task is executing at each moment. Samples where the loop is
+waiting in the selector are counted as idle. The result is a collapsed-stack
+file (one ``frame;frame;frame count`` line per unique stack, the input format
+of flamegraph.pl and speedscope) plus self and inclusive sample counts per
+function for a short summary.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Tuple
+
+IDLE_FUNCTIONS = frozenset({("selectors.py", "select")})
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already running."""
+
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    interval: float
+    samples: int = 0
+    loop_samples: int = 0
+    idle_samples: int = 0
+    stacks: Counter = field(default_factory=Counter)
+    self_counts: Counter = field(default_factory=Counter)
+    total_counts: Counter = field(default_factory=Counter)
+
+    def collapsed(self) -> bytes:
+        """Stacks in collapsed format, most frequent first."""
+        lines = [f"{stack} {count}\n" for stack, count in self.stacks.most_common()]
+        return "".join(lines).encode()
+
+    def top(self, limit: int = 10) -> List[Tuple[str, int, int]]:
+        """``(function, self samples, inclusive samples)`` on the loop thread, by self time."""
+        return [
+            (name, count, self.total_counts[name])
+            for name, count in self.self_counts.most_common(limit)
+        ]
+
+
+class SamplingProfiler:
+    """Samples all thread stacks every ``interval`` seconds; one run at a time."""
+
+    def __init__(self, *, interval: float = 0.005, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._lock = asyncio.Lock()
+        self._labels: Dict[CodeType, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def _stack(self, frame: Optional[FrameType]) -> List[FrameType]:
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        return frames
+
+    def _sample(self, seconds: float, loop_thread: int) -> ProfileResult:
+        result = ProfileResult(seconds=seconds, interval=self.interval)
+        own = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        names: Dict[int, str] = {}
+        while time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                frames = self._stack(frame)
+                if not frames:
+                    continue
+                labels = [self._label(f.f_code) for f in frames]
+                thread_name = "loop" if thread_id == loop_thread else names.get(thread_id, str(thread_id))
+                result.stacks[";".join([thread_name, *labels])] += 1
+                result.samples += 1
+                if thread_id != loop_thread:
+                    continue
+                result.loop_samples += 1
+                leaf = frames[-1].f_code
+                if (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_FUNCTIONS:
+                    result.idle_samples += 1
+                    continue
+                result.self_counts[labels[-1]] += 1
+                result.total_counts.update(set(labels))
+            time.sleep(self.interval)
+        return result
+
+    async def profile(self, seconds: float) -> ProfileResult:
+        """Sample for ``seconds`` without blocking the loop; raises :class:`ProfilerBusy`."""
+        if self._lock.locked():
+            raise ProfilerBusy("A profile is already running")
+        async with self._lock:
+            loop_thread = threading.get_ident()
+            return await asyncio.to_thread(self._sample, seconds, loop_thread)
@@ -0,0 +1,325 @@
+"""Multi-process sharding: one supervisor routes raw updates to N bot workers.
+
+Updates are routed by chat id, so every update for a chat lands on the same
+worker and its FSM state never leaves that process. The supervisor only
+decodes JSON to find the chat; pydantic validation, handlers and rendering run
+in the workers, one core each.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing as mp
+import os
+import queue
+import secrets
+import time
+from contextlib import suppress
+from multiprocessing.context import SpawnProcess
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.telegram import TelegramAPIServer, PRODUCTION
+from aiogram.types import Update
+
+from services.update_executor import OrderedDispatcher
+
+logger = logging.getLogger(__name__)
+
+WorkerTarget = Callable[[int, Any, Any], None]
+
+
+def raw_update_key(update: Dict[str, Any]) -> int:
+    """Routing key for a raw update dict: chat id, else user id, else update id."""
+    for field, event in update.items():
+        if field == "update_id" or not isinstance(event, dict):
+            continue
+        chat = event.get("chat") or (event.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+        user = event.get("from") or event.get("user")
+        if user and "id" in user:
+            return int(user["id"])
+    return int(update.get("update_id", 0))
+
+
+def shard_path(path: str, shard: Optional[int] = None) -> str:
+    """Per-shard variant of a file path, so shard processes never share a file."""
+    if shard is None:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard}{ext}"
+
+
+class ShardSupervisor:
+    """Start, route to, watch and restart shard worker processes."""
+
+    def __init__(
+        self,
+        num_workers: int,
+        target: WorkerTarget,
+        *,
+        queue_size: int = 1024,
+        check_interval: float = 1.0,
+    ):
+        if num_workers < 1:
+            raise ValueError("num_workers must be at least 1")
+        self.num_workers = num_workers
+        self.target = target
+        self.check_interval = check_interval
+        self._ctx = mp.get_context("spawn")
+        self._inboxes = [self._ctx.Queue(maxsize=queue_size) for _ in range(num_workers)]
+        self._stats_queue = self._ctx.Queue()
+        self._processes: List[Optional[SpawnProcess]] = [None] * num_workers
+        self._shard_stats: Dict[int, Dict[str, Any]] = {}
+        self.restarts = [0] * num_workers
+        self.routed = [0] * num_workers
+        self._closing = False
+
+    # ------------------------------------------------------------------
+    # Process lifecycle
+    # ------------------------------------------------------------------
+    def _spawn(self, shard: int) -> None:
+        process = self._ctx.Process(
+            target=self.target,
+            args=(shard, self._inboxes[shard], self._stats_queue),
+            name=f"bot-shard-{shard}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[shard] = process
+        logger.info("Started shard %d (pid %s)", shard, process.pid)
+
+    def start(self) -> None:
+        for shard in range(self.num_workers):
+            self._spawn(shard)
+
+    async def watch(self) -> None:
+        """Restart crashed workers and collect their stats until closed."""
+        while not self._closing:
+            self._collect_stats()
+            for shard, process in enumerate(self._processes):
+                if process is not None and not process.is_alive() and not self._closing:
+                    logger.error("Shard %d (pid %s) exited with code %s, restarting", shard, process.pid, process.exitcode)
+                    self.restarts[shard] += 1
+                    self._spawn(shard)
+            await asyncio.sleep(self.check_interval)
+
+    @staticmethod
+    def _put_stop(inbox, process: SpawnProcess, deadline: float) -> bool:
+        """Queue the stop sentinel, giving a saturated shard until ``deadline`` to make room."""
+        while process.is_alive():
+            try:
+                inbox.put(None, timeout=min(0.5, max(0.0, deadline - time.monotonic())))
+                return True
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    return False
+        return True  # it exited on its own; nothing left to stop
+
+    async def close(self, timeout: float = 30.0) -> None:
+        """Ask every worker to drain and exit, then reap them."""
+        self._closing = True
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for shard, (inbox, process) in enumerate(zip(self._inboxes, self._processes)):
+            if process is None or not process.is_alive():
+                continue  # nobody reads this inbox any more
+            if not await loop.run_in_executor(None, self._put_stop, inbox, process, deadline):
+                logger.warning("Shard %d inbox still full at shutdown; terminating it", shard)
+        for shard, process in enumerate(self._processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+            if process.exitcode != 0:
+                # Don't block interpreter exit flushing updates nobody will read
+                self._inboxes[shard].cancel_join_thread()
+        self._collect_stats()
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+    def shard_for(self, update: Dict[str, Any]) -> int:
+        return raw_update_key(update) % self.num_workers
+
+    async def route(self, update: Dict[str, Any]) -> None:
+        """Hand a raw update to its shard, waiting if that shard is saturated."""
+        shard = self.shard_for(update)
+        inbox = self._inboxes[shard]
+        try:
+            inbox.put_nowait(update)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, inbox.put, update)
+        self.routed[shard] += 1
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+    def _collect_stats(self) -> None:
+        while True:
+            try:
+                snapshot = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+            self._shard_stats[snapshot["shard"]] = snapshot
+
+    def signal_shards(self, signum: int) -> None:
+        """Forward a signal (e.g. SIGHUP to reload settings) to every running shard."""
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                with suppress(ProcessLookupError):
+                    os.kill(process.pid, signum)
+
+    async def check(self) -> Tuple[bool, str]:
+        """Readiness: every shard process is running."""
+        alive = sum(1 for process in self._processes if process is not None and process.is_alive())
+        return alive == self.num_workers, f"{alive}/{self.num_workers} shards alive"
+
+    def shard_values(self, field: str) -> Dict[Tuple[str], float]:
+        """``field`` from each shard's latest snapshot, keyed by shard label."""
+        self._collect_stats()
+        return {
+            (str(shard),): snapshot[field]
+            for shard, snapshot in self._shard_stats.items()
+            if isinstance(snapshot.get(field), (int, float))
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Totals across shards plus the latest snapshot of each shard."""
+        self._collect_stats()
+        totals: Dict[str, Any] = {}
+        for snapshot in self._shard_stats.values():
+            for name, value in snapshot.items():
+                if name in {"shard", "pid"} or not isinstance(value, (int, float)):
+                    continue
+                if name.endswith("_max") or name.startswith("max_"):
+                    totals[name] = max(totals.get(name, 0), value)
+                elif name.endswith("_avg"):
+                    continue
+                else:
+                    totals[name] = totals.get(name, 0) + value
+        totals["routed"] = sum(self.routed)
+        totals["restarts"] = sum(self.restarts)
+        return {
+            "workers": self.num_workers,
+            "totals": totals,
+            "shards": [
+                {
+                    "shard": shard,
+                    "alive": bool(process and process.is_alive()),
+                    "pid": process.pid if process else None,
+                    "routed": self.routed[shard],
+                    "restarts": self.restarts[shard],
+                    **self._shard_stats.get(shard, {}),
+                }
+                for shard, process in enumerate(self._processes)
+            ],
+        }
+
+    # ------------------------------------------------------------------
+    # Update sources
+    # ------------------------------------------------------------------
+    async def poll(
+        self,
+        token: str,
+        *,
+        api: TelegramAPIServer = PRODUCTION,
+        polling_timeout: int = 10,
+        allowed_updates: Optional[List[str]] = None,
+        on_poll: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Long-poll Telegram for raw updates and route them to shards.
+
+        ``on_poll`` is called after every successful ``getUpdates`` (readiness).
+        """
+        url = api.api_url(token=token, method="getUpdates")
+        offset = 0
+        client_timeout = aiohttp.ClientTimeout(total=polling_timeout + 30)
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
+            while not self._closing:
+                payload = {"offset": offset, "timeout": polling_timeout}
+                if allowed_updates is not None:
+                    payload["allowed_updates"] = allowed_updates
+                try:
+                    async with session.post(url, json=payload) as response:
+                        body = await response.json(loads=json.loads)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("Failed to fetch updates: %s", exc)
+                    await asyncio.sleep(1)
+                    continue
+                if not body.get("ok"):
+                    logger.error("getUpdates failed: %s", body.get("description"))
+                    await asyncio.sleep(1)
+                    continue
+                if on_poll is not None:
+                    on_poll()
+                for update in body.get("result", []):
+                    await self.route(update)
+                    offset = update["update_id"] + 1
+
+    def webhook_app(self, path: str, secret_token: str) -> web.Application:
+        """aiohttp app that routes webhook deliveries to shards."""
+
+        async def handle(request: web.Request) -> web.Response:
+            header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not secrets.compare_digest(header, secret_token):
+                return web.Response(body="Unauthorized", status=401)
+            await self.route(await request.json())
+            return web.Response(status=200)
+
+        app = web.Application()
+        app.router.add_post(path, handle)
+        return app
+
+
+async def serve_shard(
+    dp: OrderedDispatcher,
+    bot: Bot,
+    shard: int,
+    inbox: Any,
+    stats_queue: Any,
+    *,
+    stats_interval: float = 5.0,
+    **workflow_data: Any,
+) -> None:
+    """Worker side: feed updates from ``inbox`` into ``dp`` until a ``None`` arrives."""
+    loop = asyncio.get_running_loop()
+    received = 0
+    last_report = loop.time()
+
+    def report() -> None:
+        stats_queue.put({"shard": shard, "pid": os.getpid(), "received": received, **dp.executor.stats()})
+
+    workflow_data = {"dispatcher": dp, "bots": (bot,), **dp.workflow_data, **workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+    try:
+        while True:
+            try:
+                raw = await loop.run_in_executor(None, inbox.get, True, stats_interval)
+            except queue.Empty:
+                last_report = loop.time()
+                report()
+                continue
+            batch = [raw]
+            while raw is not None:
+                try:
+                    raw = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(raw)
+            for raw in batch:
+                if raw is None:
+                    return
+                update = Update.model_validate(raw, context={"bot": bot})
+                await dp.dispatch(bot, update, **workflow_data)
+                received += 1
+            if loop.time() - last_report >= stats_interval:
+                last_report = loop.time()
+                report()
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        report()
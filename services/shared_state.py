@@ -0,0 +1,262 @@
+"""Shared state backends: FSM storage, user sessions, scan cache and locks.
+
+The in-memory backend keeps today's single-process behaviour. Setting
+``REDIS_URL`` switches everything to a Redis-compatible server so several bot
+replicas can share FSM state, logins, cached results and single-flight locks.
+Any ``redis.asyncio``-compatible client works, including ``fakeredis``.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage
+from aiogram.fsm.storage.memory import DisabledEventIsolation, MemoryStorage
+
+from services.metrics import CACHE_LOOKUPS
+from services.sharding import shard_path
+
+logger = logging.getLogger(__name__)
+
+compact_dumps = partial(json.dumps, separators=(",", ":"), ensure_ascii=False)
+
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _record_lookup(key: str, result: str) -> None:
+    # Namespace only ("scan", "users_page"...), never the full key
+    CACHE_LOOKUPS.labels(key.split(":", 1)[0], result).inc()
+
+
+class SharedState:
+    """In-process backend for sessions, cached results and single-flight locks."""
+
+    max_cache_entries = 4096
+
+    def __init__(self, *, session_ttl: int = 86400):
+        self.session_ttl = session_ttl
+        self._sessions: Dict[int, Tuple[str, float]] = {}
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        # key -> (lock, callers holding or waiting for it); dropped when the last one leaves
+        self._locks: Dict[str, Tuple[asyncio.Lock, List[int]]] = {}
+
+    # ------------------------------------------------------------------
+    # Session registry (telegram id -> backend access token)
+    # ------------------------------------------------------------------
+    async def get_session(self, telegram_id: int) -> Optional[str]:
+        entry = self._sessions.get(telegram_id)
+        if entry is None:
+            return None
+        token, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._sessions[telegram_id]
+            return None
+        return token
+
+    async def save_session(self, telegram_id: int, token: str) -> None:
+        self._sessions[telegram_id] = (token, time.monotonic() + self.session_ttl)
+
+    async def drop_session(self, telegram_id: int) -> None:
+        self._sessions.pop(telegram_id, None)
+
+    # ------------------------------------------------------------------
+    # Result cache
+    # ------------------------------------------------------------------
+    async def get_cached(self, key: str) -> Optional[Any]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        raw, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        return json.loads(raw)
+
+    async def set_cached(self, key: str, value: Any, ttl: float) -> None:
+        now = time.monotonic()
+        if len(self._cache) >= self.max_cache_entries:
+            self._cache = {k: v for k, v in self._cache.items() if v[1] >= now}
+        self._cache[key] = (compact_dumps(value), now + ttl)
+
+    # ------------------------------------------------------------------
+    # Single flight
+    # ------------------------------------------------------------------
+    async def single_flight(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        *,
+        ttl: float,
+        lock_timeout: float = 60.0,  # noqa: ARG002 - a local lock cannot be orphaned
+        should_cache: Callable[[Any], bool] = bool,
+    ) -> Any:
+        """Run ``compute`` once per ``key``; concurrent callers share its result."""
+        cached = await self.get_cached(key)
+        if cached is not None:
+            _record_lookup(key, "hit")
+            return cached
+        lock, users = self._locks.setdefault(key, (asyncio.Lock(), [0]))
+        users[0] += 1
+        try:
+            async with lock:
+                cached = await self.get_cached(key)
+                if cached is not None:
+                    _record_lookup(key, "hit")
+                    return cached
+                _record_lookup(key, "miss")
+                result = await compute()
+                if should_cache(result):
+                    await self.set_cached(key, result, ttl)
+                return result
+        finally:
+            # lock.locked() is briefly false while a woken waiter is pending,
+            # so only the last caller may drop the lock
+            users[0] -= 1
+            if not users[0]:
+                del self._locks[key]
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """Sessions, cached results and single-flight locks held in this process."""
+        return self._sessions, self._cache, self._locks
+
+    async def close(self) -> None:
+        self._sessions.clear()
+        self._cache.clear()
+
+
+class RedisSharedState(SharedState):
+    """Redis-compatible backend shared by every bot replica."""
+
+    def __init__(self, redis: Any, *, session_ttl: int = 86400, prefix: str = "splshield"):
+        super().__init__(session_ttl=session_ttl)
+        self.redis = redis
+        self.prefix = prefix
+        self._release = redis.register_script(_RELEASE_LOCK)
+
+    def _key(self, *parts: Any) -> str:
+        return ":".join((self.prefix, *map(str, parts)))
+
+    async def get_session(self, telegram_id: int) -> Optional[str]:
+        key = self._key("session", telegram_id)
+        # Read and slide the expiry in one round trip
+        async with self.redis.pipeline(transaction=False) as pipe:
+            token, _ = await pipe.get(key).expire(key, self.session_ttl).execute()
+        return token.decode() if isinstance(token, bytes) else token
+
+    async def save_session(self, telegram_id: int, token: str) -> None:
+        await self.redis.set(self._key("session", telegram_id), token, ex=self.session_ttl)
+
+    async def drop_session(self, telegram_id: int) -> None:
+        await self.redis.delete(self._key("session", telegram_id))
+
+    async def get_cached(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(self._key("cache", key))
+        return json.loads(raw) if raw is not None else None
+
+    async def set_cached(self, key: str, value: Any, ttl: float) -> None:
+        await self.redis.set(self._key("cache", key), compact_dumps(value), px=int(ttl * 1000))
+
+    async def single_flight(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        *,
+        ttl: float,
+        lock_timeout: float = 60.0,
+        should_cache: Callable[[Any], bool] = bool,
+    ) -> Any:
+        cache_key = self._key("cache", key)
+        lock_key = self._key("lock", key)
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + lock_timeout
+        delay = 0.05
+
+        while True:
+            # Cache lookup and lock attempt share one round trip
+            async with self.redis.pipeline(transaction=False) as pipe:
+                raw, acquired = await (
+                    pipe.get(cache_key)
+                    .set(lock_key, owner, nx=True, px=int(lock_timeout * 1000))
+                    .execute()
+                )
+            if raw is not None:
+                if acquired:
+                    await self._release(keys=[lock_key], args=[owner])
+                _record_lookup(key, "hit")
+                return json.loads(raw)
+            if acquired:
+                _record_lookup(key, "miss")
+                break
+            if time.monotonic() >= deadline:
+                logger.warning("Single-flight wait for %s timed out; computing locally", key)
+                return await compute()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        try:
+            result = await compute()
+        except BaseException:
+            await self._release(keys=[lock_key], args=[owner])
+            raise
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if should_cache(result):
+                pipe.set(cache_key, compact_dumps(result), px=int(ttl * 1000))
+            await self._release(keys=[lock_key], args=[owner], client=pipe)
+            await pipe.execute()
+        return result
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def _local_fsm_storage(settings, shard: Optional[int] = None) -> BaseStorage:
+    if settings.FSM_STORAGE != "sqlite":
+        return MemoryStorage()
+
+    from services.fsm_sqlite import SQLiteStorage
+
+    # Each shard owns its chats, so it keeps their state in its own database
+    path = shard_path(settings.FSM_SQLITE_PATH, shard)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return SQLiteStorage(
+        path,
+        default_ttl=settings.FSM_DEFAULT_TTL_SECONDS,
+        ttl_by_group=settings.fsm_state_ttls,
+        sensitive_fields=settings.fsm_sensitive_fields,
+    )
+
+
+def create_backends(settings, shard: Optional[int] = None) -> Tuple[BaseStorage, BaseEventIsolation, SharedState]:
+    """Build FSM storage, event isolation and shared state from settings (for shard ``shard``, if any)."""
+    if not settings.REDIS_URL:
+        return (
+            _local_fsm_storage(settings, shard),
+            DisabledEventIsolation(),
+            SharedState(session_ttl=settings.SESSION_TTL_SECONDS),
+        )
+
+    from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisEventIsolation, RedisStorage
+    from redis.asyncio import Redis
+
+    redis = Redis.from_url(settings.REDIS_URL)
+    storage = RedisStorage(
+        redis,
+        key_builder=DefaultKeyBuilder(prefix="splshield:fsm", with_destiny=True),
+        json_dumps=compact_dumps,
+    )
+    # Keep one chat's updates serialised across replicas, not only within one
+    isolation = RedisEventIsolation(redis, key_builder=storage.key_builder)
+    return storage, isolation, RedisSharedState(redis, session_ttl=settings.SESSION_TTL_SECONDS)
@@ -0,0 +1,300 @@
+"""Per-update traces with correlation ids, from update to backend.
+
+Every update opens a root span carrying ``update_id`` and the user id. The
+current span lives in a context variable, so it follows the handler into
+``APIService._request`` and the Telegram session without changing handler
+signatures. Backend calls send a W3C ``traceparent`` header (plus
+``X-Request-ID``), so backend logs can be joined on the same trace id. Log
+records get ``trace_id`` through :class:`TraceLogFilter`.
+
+Completed traces are tail-sampled: per export window the tracer keeps every
+failed trace, the ``keep_slowest`` slowest and a small random share of the
+rest, then writes them as OTLP-shaped JSON lines. Memory stays fixed however
+busy the window is.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Coroutine, Dict, Iterator, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+MAX_SPANS_PER_TRACE = 256
+MAX_KEPT = 100
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attributes", "start_ns", "end_ns", "error")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Union[BaseException, str, None] = None) -> None:
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if isinstance(error, BaseException):
+            self.error = f"{type(error).__name__}: {error}"
+        elif error:
+            self.error = error
+        if self is self.trace.root:
+            self.trace.tracer._finish(self.trace)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id or "",
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class Trace:
+    __slots__ = ("tracer", "trace_id", "root", "spans", "dropped")
+
+    def __init__(self, tracer: "Tracer"):
+        self.tracer = tracer
+        self.trace_id = _new_id(16)
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.dropped = 0
+
+    def _span(self, name: str, parent: Optional[Span], attributes: Dict[str, Any]) -> Optional[Span]:
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped += 1
+            return None
+        span = Span(self, name, parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    @property
+    def failed(self) -> bool:
+        return any(span.error for span in self.spans)
+
+
+# ----------------------------------------------------------------------
+# Spans inside a trace
+# ----------------------------------------------------------------------
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace.trace_id if span is not None else None
+
+
+def start_span(name: str, **attributes: Any) -> Optional[Span]:
+    """Child of the current span, not made current (for leaf calls); ``None`` outside a trace."""
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return parent.trace._span(name, parent, attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current one for the duration of the block."""
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.end(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def detached_task(coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+    """``asyncio.create_task`` outside the current trace.
+
+    Tasks copy the caller's context, so background work started by a handler
+    would keep adding spans (and sending ``traceparent``) to an update's trace
+    long after it finished, and keep that trace in memory.
+    """
+    context = copy_context()
+    context.run(_current_span.set, None)
+    return asyncio.create_task(coro, context=context)
+
+
+def outbound_headers(span: Optional[Span]) -> Dict[str, str]:
+    """Correlation headers for a backend request made within ``span``."""
+    if span is None:
+        return {}
+    return {
+        "traceparent": f"00-{span.trace.trace_id}-{span.span_id}-01",
+        "X-Request-ID": span.trace.trace_id,
+    }
+
+
+class TraceLogFilter(logging.Filter):
+    """Adds ``trace_id`` to every log record (``-`` outside a trace)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id() or "-"
+        return True
+
+
+# ----------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------
+class JsonlSpanExporter:
+    """Appends spans as JSON lines; rotates to ``<path>.1`` past ``max_bytes``."""
+
+    def __init__(self, path: str, *, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def export(self, traces: List[Trace]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        with open(self.path, "a", encoding="utf-8") as fh:
+            for trace in traces:
+                fh.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in trace.spans)
+
+
+class Tracer:
+    """Creates root spans and exports a tail-sampled selection of finished traces."""
+
+    def __init__(
+        self,
+        exporter: Optional[JsonlSpanExporter] = None,
+        *,
+        keep_slowest: int = 20,
+        sample_rate: float = 0.01,
+        interval: float = 10.0,
+    ):
+        self.exporter = exporter
+        self.keep_slowest = keep_slowest
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.finished = 0
+        self.exported = 0
+        self._slowest: List[Any] = []  # min-heap of (duration, seq, trace)
+        self._failed: List[Trace] = []
+        self._sampled: List[Trace] = []
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Root span of a new trace, current for the duration of the block."""
+        trace = Trace(self)
+        root = trace.root = trace._span(name, None, attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as exc:
+            root.end(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
+
+    def _finish(self, trace: Trace) -> None:
+        self.finished += 1
+        if trace.failed:
+            if len(self._failed) < MAX_KEPT:
+                self._failed.append(trace)
+            return
+        entry = (trace.root.duration, next(self._seq), trace)
+        if len(self._slowest) < self.keep_slowest:
+            heapq.heappush(self._slowest, entry)
+            return
+        evicted = heapq.heappushpop(self._slowest, entry)[2]
+        if len(self._sampled) < MAX_KEPT and random.random() < self.sample_rate:
+            self._sampled.append(evicted)
+
+    def _drain(self) -> List[Trace]:
+        traces = self._failed + [entry[2] for entry in self._slowest] + self._sampled
+        self._failed, self._slowest, self._sampled = [], [], []
+        return traces
+
+    async def flush(self) -> None:
+        traces = self._drain()
+        if not traces or self.exporter is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.exporter.export, traces)
+            self.exported += len(traces)
+        except Exception:  # noqa: BLE001
+            logger.exception("Trace export failed; dropped %d traces", len(traces))
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {"finished": self.finished, "exported": self.exported}
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Bot session middleware recording each Telegram API call as a span."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        with span(f"telegram.{type(method).__name__}", chat_id=getattr(method, "chat_id", None)):
+            return await make_request(bot, method)
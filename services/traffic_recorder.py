@@ -0,0 +1,250 @@
+"""Opt-in recording of production traffic for replay.
+
+Incoming updates and backend response timings are written as gzip-compressed
+JSON lines, so real traffic shapes (bursts of ``/scan``, login waves) can be
+replayed against a stand-in backend with ``python -m benchmarks.replay``.
+
+Records are anonymised as they are taken, and only an allow-list of fields
+is kept:
+
+* users become sequential pseudonyms (``1, 2, ...`` per recorder run, named
+  by the ``run`` id in the meta line); the mapping lives in memory only and is
+  never written;
+* commands keep the command and drop their arguments;
+* free text is replaced by a placeholder of the same shape. Addresses become
+  stable fake addresses, emails become ``userN@example.com`` and anything else
+  (passwords included) becomes ``x`` characters of the same length;
+* callback data keeps the action and short enum-like values (tiers, page
+  numbers), never ids.
+
+Line format (one JSON object per line, ``t`` in unix seconds)::
+
+    {"kind": "meta", "t": ..., "writer": "main", "run": "9f2c...", "version": 1}
+    {"kind": "update", "t": ..., "user": 7, "type": "message", "text": "/scan", "label": "/scan", "ms": 12.4}
+    {"kind": "backend", "t": ..., "endpoint": "POST /api/scan", "status": 200, "ms": 402.1}
+
+Files rotate past ``max_bytes`` of compressed output, and the oldest are
+removed beyond ``keep_files``.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MAX_TEXT = 256
+
+_BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_ADDRESS = re.compile(r"^[1-9A-HJ-NP-Za-km-z]{32,44}$")
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_CALLBACK_VALUE = re.compile(r"^[a-z_]{1,16}$|^\d{1,4}$")
+
+
+def update_label(update_type: str, text: Optional[str] = None, data: Optional[str] = None) -> str:
+    """Grouping key for latency reports: ``/command``, ``cb:action``, ``text`` or the update type."""
+    if update_type == "message":
+        if text and text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+        return "text"
+    if update_type == "callback_query":
+        return f"cb:{(data or '').split(':', 1)[0]}"
+    return update_type
+
+
+class TrafficRecorder:
+    """Buffers anonymised updates and backend timings; flushes them in a worker thread."""
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        writer: str = "main",
+        flush_interval: float = 5.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        keep_files: int = 20,
+        max_buffer: int = 100_000,
+    ):
+        self.directory = directory
+        self.writer = writer
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.max_buffer = max_buffer
+        self.recorded = 0
+        self.dropped = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._users: Dict[int, int] = {}
+        self._salt = os.urandom(16)
+        self.run = os.urandom(6).hex()
+        self._path: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # Anonymisation
+    # ------------------------------------------------------------------
+    def _user(self, user_id: Optional[int]) -> int:
+        if not user_id:
+            return 0
+        pseudonym = self._users.get(user_id)
+        if pseudonym is None:
+            pseudonym = self._users[user_id] = len(self._users) + 1
+        return pseudonym
+
+    def _digest(self, value: str) -> bytes:
+        return hashlib.blake2b(value.encode(), key=self._salt, digest_size=32).digest()
+
+    def _text(self, text: str) -> str:
+        text = text.strip()
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0]
+        if _ADDRESS.match(text):
+            digest = self._digest(text)
+            return "".join(_BASE58[byte % 58] for byte in (digest + digest)[:len(text)])
+        if _EMAIL.match(text):
+            return f"user{int.from_bytes(self._digest(text.lower())[:4], 'big')}@example.com"
+        return "x" * min(len(text), MAX_TEXT)
+
+    @staticmethod
+    def _callback(data: str) -> str:
+        action, _, value = data.partition(":")
+        return f"{action}:{value}" if value and _CALLBACK_VALUE.match(value) else action
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+    def _append(self, record: Dict[str, Any]) -> None:
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(record)
+        self.recorded += 1
+
+    def update(self, update_type: str, user_id: Optional[int], *, text: Optional[str] = None,
+               data: Optional[str] = None, seconds: float = 0.0, started: Optional[float] = None) -> None:
+        record: Dict[str, Any] = {
+            "kind": "update",
+            "t": round(started if started is not None else time.time(), 3),
+            "user": self._user(user_id),
+            "type": update_type,
+            "label": update_label(update_type, text, data),
+            "ms": round(seconds * 1000, 2),
+        }
+        if text is not None:
+            record["text"] = self._text(text)
+        if data is not None:
+            record["data"] = self._callback(data)
+        self._append(record)
+
+    def backend(self, endpoint: str, status: int, seconds: float) -> None:
+        self._append({
+            "kind": "backend",
+            "t": round(time.time(), 3),
+            "endpoint": endpoint,
+            "status": status,
+            "ms": round(seconds * 1000, 2),
+        })
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+    def _new_path(self) -> str:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        return os.path.join(self.directory, f"traffic-{self.writer}-{stamp}-{os.getpid()}.jsonl.gz")
+
+    def _prune(self) -> None:
+        """Make room for one new file within ``keep_files`` (0 keeps everything)."""
+        if not self.keep_files:
+            return
+        prefix = f"traffic-{self.writer}-"
+        files = sorted(name for name in os.listdir(self.directory) if name.startswith(prefix))
+        for name in files[:max(0, len(files) - self.keep_files + 1)]:
+            os.remove(os.path.join(self.directory, name))
+
+    def _write(self, records: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if self._path is None or (os.path.exists(self._path) and os.path.getsize(self._path) >= self.max_bytes):
+            self._prune()
+            self._path = self._new_path()
+            meta = {"kind": "meta", "t": round(time.time(), 3), "writer": self.writer, "run": self.run, "version": FORMAT_VERSION}
+            records = [meta, *records]
+        # Each flush appends one gzip member; readers see a single stream
+        with gzip.open(self._path, "at", encoding="utf-8", compresslevel=6) as fh:
+            fh.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, records)
+            except Exception:  # noqa: BLE001
+                logger.exception("Traffic recording failed; dropped %d records", len(records))
+                self.dropped += len(records)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            logger.warning("Recording anonymised traffic to %s", self.directory)
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """Buffered records and the in-memory pseudonym map."""
+        return self._buffer, self._users
+
+    def stats(self) -> Dict[str, int]:
+        return {"recorded": self.recorded, "dropped": self.dropped, "buffered": len(self._buffer)}
+
+
+def read_recording(path: str) -> List[Dict[str, Any]]:
+    """Update and backend records from one ``.jsonl.gz`` file, or every recording in a directory, in time order.
+
+    Each record gets the ``run`` of its file, since pseudonyms are only unique
+    within a recorder run.
+    """
+    if os.path.isdir(path):
+        files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.startswith("traffic-") and name.endswith(".jsonl.gz")
+        )
+    else:
+        files = [path]
+    records = []
+    for file in files:
+        run = os.path.basename(file)
+        try:
+            with gzip.open(file, "rt", encoding="utf-8") as fh:
+                for line in fh:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if record.get("kind") == "meta":
+                        run = record.get("run", run)
+                        continue
+                    record["run"] = run
+                    records.append(record)
+        except (EOFError, gzip.BadGzipFile, json.JSONDecodeError):
+            # A crash mid-flush leaves a torn final member; keep what was read
+            logger.warning("Recording %s is truncated", file)
+    records.sort(key=lambda record: record.get("t", 0))
+    return records
@@ -0,0 +1,148 @@
+"""Per-chat ordered, globally bounded execution of incoming updates."""
+
+import asyncio
+import logging
+from collections import deque
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Set, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+JobFactory = Callable[[], Awaitable[Any]]
+
+
+class KeyedExecutor:
+    """Run jobs concurrently across keys and strictly in order within a key.
+
+    Every submitted job holds one of ``max_in_flight`` slots from the moment it
+    is queued until it finishes, so the number of buffered updates (and the
+    memory they pin) never exceeds the cap. ``submit`` waits for a free slot,
+    which pushes back on whoever is producing updates.
+    """
+
+    def __init__(self, max_in_flight: int = 256, slow_wait: float = 5.0):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.slow_wait = slow_wait
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._queues: Dict[Hashable, Deque[Tuple[JobFactory, float]]] = {}
+        self._workers: Set[asyncio.Task] = set()
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs currently queued or running."""
+        return self.submitted - self.completed
+
+    async def submit(self, key: Hashable, factory: JobFactory) -> None:
+        """Queue ``factory()`` behind earlier jobs with the same key."""
+        loop = asyncio.get_running_loop()
+        enqueued_at = loop.time()
+        await self._slots.acquire()
+        self.submitted += 1
+
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            worker = asyncio.create_task(self._drain(key, queue))
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+        queue.append((factory, enqueued_at))
+        if len(queue) > self.max_queue_depth:
+            self.max_queue_depth = len(queue)
+
+    async def _drain(self, key: Hashable, queue: Deque[Tuple[JobFactory, float]]) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while queue:
+                factory, enqueued_at = queue[0]
+                waited = loop.time() - enqueued_at
+                self.wait_total += waited
+                if waited > self.wait_max:
+                    self.wait_max = waited
+                if waited > self.slow_wait:
+                    logger.warning(
+                        "Update for key %s waited %.2fs (queue depth %d, in flight %d)",
+                        key,
+                        waited,
+                        len(queue),
+                        self.in_flight,
+                    )
+                try:
+                    await factory()
+                except Exception:  # noqa: BLE001
+                    self.failed += 1
+                    logger.exception("Job for key %s failed", key)
+                finally:
+                    queue.popleft()
+                    self.completed += 1
+                    self._slots.release()
+        finally:
+            self._queues.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of queue depth and wait time counters."""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "active_keys": len(self._queues),
+            "max_queue_depth": self.max_queue_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_avg": self.wait_total / self.completed if self.completed else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+    async def close(self) -> None:
+        """Wait for every queued job to finish."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers), return_exceptions=True)
+        logger.info("Update executor drained: %s", self.stats())
+
+
+def update_key(update: Update) -> Hashable:
+    """Ordering key for an update: its chat, else its user, else itself."""
+    chat, user, _ = UserContextMiddleware.resolve_event_context(event=update)
+    if chat is not None:
+        return chat.id
+    if user is not None:
+        return user.id
+    return ("update", update.update_id)
+
+
+class OrderedDispatcher(Dispatcher):
+    """Dispatcher that hands each update to a :class:`KeyedExecutor`.
+
+    Use with ``start_polling(..., handle_as_tasks=False)`` so the polling loop
+    only waits for a free slot instead of for the handler to finish.
+    """
+
+    def __init__(self, *args: Any, executor: KeyedExecutor, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.executor = executor
+
+    async def dispatch(self, bot: Bot, update: Update, **kwargs: Any) -> None:
+        """Queue an update for processing in its chat's order."""
+        process = partial(super()._process_update, bot, update, **kwargs)
+        await self.executor.submit(update_key(update), process)
+
+    async def _process_update(self, bot: Bot, update: Update, call_answer: bool = True, **kwargs: Any) -> bool:
+        await self.dispatch(bot, update, call_answer=call_answer, **kwargs)
+        return True
+
+    async def emit_shutdown(self, *args: Any, **kwargs: Any) -> None:
+        # Drain queued handlers before shutdown hooks close FSM storage and sessions
+        await self.executor.close()
+        await super().emit_shutdown(*args, **kwargs)
@@ -0,0 +1,154 @@
+"""Local user directory with a prefix index for instant admin lookups.
+
+Users are mirrored from ``/api/admin/dashboard/users`` by an incremental
+``updated_at`` sync. Lowercased usernames and emails are indexed in a trie,
+so ``/user <query>`` is answered from memory without a backend request.
+"""
+
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from services.incremental_sync import IncrementalSync
+
+logger = logging.getLogger(__name__)
+
+# Fields kept per user; the rest of the admin payload is dropped
+_KEPT_FIELDS = (
+    "id",
+    "username",
+    "email",
+    "tier",
+    "credits",
+    "total_spent_tdl",
+    "telegram_id",
+    "is_verified",
+    "updated_at",
+)
+
+
+class _Node:
+    __slots__ = ("children", "ids")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.ids: Set[Any] = set()
+
+
+class PrefixIndex:
+    """Trie mapping string keys to ids; ids are stored on the key's last node."""
+
+    def __init__(self):
+        self._root = _Node()
+
+    def add(self, key: str, item_id: Any) -> None:
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+        node.ids.add(item_id)
+
+    def remove(self, key: str, item_id: Any) -> None:
+        path = [self._root]
+        for char in key:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].ids.discard(item_id)
+        # Prune branches that no longer lead to any id
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.ids or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    def _walk(self, node: _Node) -> Iterator[Any]:
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield from node.ids
+            stack.extend(node.children[char] for char in sorted(node.children, reverse=True))
+
+    def search(self, prefix: str, limit: int) -> List[Any]:
+        """Up to ``limit`` ids whose key starts with ``prefix``, in key order."""
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        found = []
+        for item_id in self._walk(node):
+            found.append(item_id)
+            if len(found) >= limit:
+                break
+        return found
+
+
+class UserDirectory(IncrementalSync):
+    """In-memory mirror of the admin user list, searchable by prefix."""
+
+    resource = "users"
+    cursor_field = "updated_at"
+    cursor_param = "updated_since"
+
+    def __init__(self, api_service, **kwargs: Any):
+        super().__init__(api_service, **kwargs)
+        self.users: Dict[Any, Dict[str, Any]] = {}
+        self._by_telegram_id: Dict[int, Any] = {}
+        self._names = PrefixIndex()
+        self._emails = PrefixIndex()
+
+    @staticmethod
+    def _user_id(row: Dict[str, Any]) -> Any:
+        return next((row[name] for name in ("id", "_id", "email", "username") if row.get(name) is not None), None)
+
+    def _unindex(self, user_id: Any, user: Dict[str, Any]) -> None:
+        if user.get("username"):
+            self._names.remove(user["username"].lower(), user_id)
+        if user.get("email"):
+            self._emails.remove(user["email"].lower(), user_id)
+        if user.get("telegram_id"):
+            self._by_telegram_id.pop(int(user["telegram_id"]), None)
+
+    def _index(self, user_id: Any, user: Dict[str, Any]) -> None:
+        if user.get("username"):
+            self._names.add(user["username"].lower(), user_id)
+        if user.get("email"):
+            self._emails.add(user["email"].lower(), user_id)
+        if user.get("telegram_id"):
+            self._by_telegram_id[int(user["telegram_id"])] = user_id
+
+    def apply(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            user_id = self._user_id(row)
+            if user_id is None:
+                continue
+            previous = self.users.get(user_id)
+            if previous is not None:
+                self._unindex(user_id, previous)
+            user = {name: row[name] for name in _KEPT_FIELDS if name in row}
+            self.users[user_id] = user
+            self._index(user_id, user)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Users whose username or email starts with ``query``; digits also match Telegram ids."""
+        query = query.strip().lstrip("@").lower()
+        if not query:
+            return []
+        ids: Dict[Any, None] = {}
+        if query.isdigit() and int(query) in self._by_telegram_id:
+            ids[self._by_telegram_id[int(query)]] = None
+        for index in (self._names, self._emails):
+            for user_id in index.search(query, limit):
+                ids.setdefault(user_id, None)
+        return [self.users[user_id] for user_id in list(ids)[:limit]]
+
+    def get_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        user_id = self._by_telegram_id.get(telegram_id)
+        return self.users.get(user_id) if user_id is not None else None
+
+    def memory_targets(self) -> Tuple[Any, ...]:
+        """The user mirror and its indexes."""
+        return self.users, self._by_telegram_id, self._names, self._emails
+
+    def stats(self) -> Dict[str, Any]:
+        return {"users": len(self.users), "cursor": self.cursor, "last_sync": self.last_sync}
@@ -0,0 +1,97 @@
+"""Webhook transport: an embedded aiohttp server feeding the dispatcher."""
+
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+from typing import Any, List, Optional
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from services.update_executor import OrderedDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorRequestHandler(SimpleRequestHandler):
+    """Webhook handler that queues updates on the dispatcher's executor.
+
+    The HTTP response is sent as soon as the update is queued, so Telegram gets
+    its 200 without waiting for the handler. A request is only held while the
+    executor is at its in-flight cap, which is the backpressure Telegram should
+    see.
+    """
+
+    dispatcher: OrderedDispatcher
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        payload = await request.json(loads=bot.session.json_loads)
+        update = Update.model_validate(payload, context={"bot": bot})
+        await self.dispatcher.dispatch(bot, update, **self.data)
+        return web.Response(status=200)
+
+
+def build_webhook_app(
+    dp: OrderedDispatcher,
+    bot: Bot,
+    *,
+    path: str,
+    secret_token: Optional[str],
+    **data: Any,
+) -> web.Application:
+    """Create the aiohttp application serving updates for ``bot`` on ``path``."""
+    app = web.Application()
+    # Startup/shutdown hooks first: on shutdown the executor must drain before
+    # the request handler closes the bot session.
+    setup_application(app, dp, bot=bot, bots=(bot,), **data)
+    ExecutorRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=secret_token,
+        bots=(bot,),
+        **data,
+    ).register(app, path=path)
+    return app
+
+
+async def run_webhook(
+    dp: OrderedDispatcher,
+    bot: Bot,
+    *,
+    base_url: str,
+    path: str,
+    secret_token: str,
+    host: str,
+    port: int,
+    allowed_updates: Optional[List[str]] = None,
+) -> None:
+    """Register the webhook with Telegram and serve until SIGINT/SIGTERM."""
+    app = build_webhook_app(dp, bot, path=path, secret_token=secret_token)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info("Webhook server listening on %s:%s%s", host, port, path)
+
+    await bot.set_webhook(
+        url=f"{base_url.rstrip('/')}{path}",
+        secret_token=secret_token,
+        allowed_updates=allowed_updates,
+    )
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Stopping webhook server")
+        # on_shutdown runs the dispatcher shutdown hooks and closes the bot session
+        await runner.cleanup()
@@ -41,10 +41,17 @@ HELP_MESSAGE = """
 /verify_payment &lt;tx&gt; [tier] – Confirm a TDL purchase
 
 <b>🛠️ Admin Commands (admin only)</b>
-/admin – High level dashboard  
+/admin – High level dashboard (pin / unpin)  
 /stats – Credit & usage breakdown  
-/users – Recent users snapshot  
+/users – Browse users page by page  
+/user &lt;query&gt; – Find a user by name, email or Telegram ID  
 /transactions – Payment activity summary
+/broadcast &lt;text&gt; – Message every user
+/analytics [hours] – Usage analytics from the bot event log
+/export users|scans|transactions – Download a compressed CSV/JSONL export
+/perf [1|5|60] – Handler and backend latency percentiles
+/profile [seconds] – Sampling profile of the live bot
+/memprof [start|reset|stop] – Memory by subsystem and allocation growth
 
 💡 Pro tips:
 • Inline buttons mirror the most common actions  